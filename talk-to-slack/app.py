@@ -1,12 +1,51 @@
 # app.py
+import asyncio
+import hashlib
+import json
 import logging
 import os
 import secrets
-
-import requests
-from flask import Flask, redirect, render_template, request, session
-from openai import OpenAI
-from provider import RememberizerSourceProvider
+import time
+
+import channel_prefetch
+import clients
+import context_builder
+import conversation
+import discussion_store
+import http_pool
+import local_index
+import rate_limiter
+import response_cache
+import router
+import semantic_cache
+import session_store
+import single_flight
+import sources
+import speculation
+import token_manager
+import tracing
+from async_provider import AsyncRememberizerSourceProvider
+from constants import (
+    REMEMBERIZER_AUTHORIZE_ENDPOINT,
+    REMEMBERIZER_ENDPOINT,
+    REMEMBERIZER_TOKEN_ENDPOINT,
+)
+from flask import (
+    Flask,
+    Response,
+    jsonify,
+    redirect,
+    render_template,
+    request,
+    session,
+    stream_with_context,
+)
+from provider import (
+    COMPLETION_OPTIONS,
+    PROMPT_PREFIX_ID,
+    RememberizerSourceProvider,
+    build_answer_messages,
+)
 
 logging.basicConfig(level=logging.DEBUG)
 
@@ -14,11 +53,151 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("APP_SECRET_KEY", "your-secret-key")
+session_interface = session_store.get_session_interface()
+if session_interface is not None:
+    app.session_interface = session_interface
 
 REMEMBERIZER_CLIENT_ID = os.environ.get("REMEMBERIZER_CLIENT_ID")
 REMEMBERIZER_CLIENT_SECRET = os.environ.get("REMEMBERIZER_CLIENT_SECRET")
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 GPT_MODEL = os.environ.get("GPT_FUNCTION_CALLING_MODEL", "gpt-4o")
+ASYNC_ASK = os.environ.get("ASYNC_ASK", "false").lower() == "true"
+STREAM_ASK = os.environ.get("STREAM_ASK", "false").lower() == "true"
+# Seconds /dashboard reuses the account info kept in the session.
+ACCOUNT_INFO_TTL = int(os.environ.get("SESSION_ACCOUNT_TTL", "300"))
+
+
+@app.context_processor
+def inject_ask_endpoint():
+    return {
+        "ask_endpoint": "/ask-async" if ASYNC_ASK else "/ask",
+        "stream_endpoint": "/ask-stream" if STREAM_ASK else None,
+        "conversation_enabled": conversation.get_conversation_store() is not None,
+    }
+
+
+def provider_collaborators():
+    """
+    Returns: the process-wide caches, stores and helpers every provider shares
+    """
+    return {
+        "cache": response_cache.get_cache(),
+        "semantic_cache": semantic_cache.get_semantic_cache(),
+        "router": router.get_router(),
+        "context_builder": context_builder.get_context_builder(),
+        "discussion_store": discussion_store.get_discussion_store(),
+        "local_index": local_index.get_local_index(),
+        "single_flight": single_flight.get_single_flight(),
+        "rate_limiter": rate_limiter.get_rate_limiter(),
+        "speculative_search": speculation.get_speculative_search(),
+        "sources": sources.get_source_registry(),
+    }
+
+
+def create_provider(access_token):
+    return RememberizerSourceProvider(
+        access_token=access_token, **provider_collaborators()
+    )
+
+
+def make_provider(access_token):
+    """
+    Returns: the access token's provider, reused across requests when the provider
+    registry is enabled
+    """
+    registry = clients.get_provider_registry()
+    if registry is None:
+        return create_provider(access_token)
+    return registry.get(access_token, lambda: create_provider(access_token))
+
+
+def make_async_provider(access_token):
+    """
+    Must be called on the event loop.
+    Returns: the access token's async provider on the loop's shared httpx client,
+    reused across requests when the provider registry is enabled
+    """
+    async_clients = clients.get_async_clients()
+
+    def create():
+        return AsyncRememberizerSourceProvider(
+            access_token=access_token,
+            client=async_clients.http,
+            **provider_collaborators(),
+        )
+
+    if async_clients.providers is None:
+        return create()
+    return async_clients.providers.get(access_token, create)
+
+
+def current_access_token():
+    """
+    Returns: the signed-in user's access token (refreshed ahead of expiry when the
+    token store is enabled), or None when they need to sign in again
+    """
+    manager = token_manager.get_token_manager()
+    token_id = session.get("rememberizer_token_id")
+    if manager is not None and token_id is not None:
+        return manager.access_token(token_id)
+    return session.get("rememberizer_access_token")
+
+
+def account_info(access_token):
+    """
+    Returns: the account info, cached in a server-side session for ACCOUNT_INFO_TTL
+    seconds, or None when Rememberizer rejects the token
+    """
+    cached = session.get("account_info")
+    if cached is not None and time.time() < cached["expires_at"]:
+        return cached["data"]
+    response = http_pool.get_session().get(
+        f"{REMEMBERIZER_ENDPOINT}/account",
+        headers={"Authorization": f"Bearer {access_token}"},
+    )
+    if response.status_code != 200:
+        return None
+    data = response.json()
+    # A cookie session would carry the account JSON on every request.
+    if session_interface is not None:
+        session["account_info"] = {
+            "data": data,
+            "expires_at": time.time() + ACCOUNT_INFO_TTL,
+        }
+    return data
+
+
+def current_conversation():
+    """
+    Returns: the session's conversation (started on its first question), or None
+    when CONVERSATION_BACKEND=none
+    """
+    store = conversation.get_conversation_store()
+    if store is None:
+        return None
+    if "conversation_id" not in session:
+        session["conversation_id"] = store.new_id()
+    return store.get(session["conversation_id"])
+
+
+def save_turn(chat, question, answer, client=None):
+    """
+    Record the answered turn and store the conversation. Once the history outgrows
+    its token budget, old turns are folded into the summary after the response.
+    """
+    chat.add_turn(question, answer)
+
+    def summarize(summary, turns):
+        # Only called when over budget; /ask-async passes no sync client.
+        summarize_turns = conversation.summarizer(client or clients.get_openai_client())
+        return summarize_turns(summary, turns)
+
+    conversation.get_conversation_store().save(chat, summarize)
+
+
+def sse_event(data, event=None):
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
 
 
 @app.route("/")
@@ -36,7 +215,7 @@ def auth_rememberizer():
 
     # Redirect to Rememberizer's authorization URL
     auth_url = (
-        f"https://api.rememberizer.ai/api/v1/auth/oauth2/authorize?client_id={REMEMBERIZER_CLIENT_ID}"
+        f"{REMEMBERIZER_AUTHORIZE_ENDPOINT}?client_id={REMEMBERIZER_CLIENT_ID}"
         f"&response_type=code"
         f"&redirect_uri={redirect_uri}"
         f"&scope=offline_access"
@@ -49,7 +228,7 @@ def auth_rememberizer():
 def auth_rememberizer_callback():
     # Exchange authorization code for access token
     auth_code = request.args.get("code")
-    token_url = "https://api.rememberizer.ai/api/v1/auth/oauth2/token/"
+    token_url = REMEMBERIZER_TOKEN_ENDPOINT
     redirect_uri = request.url_root + "auth/rememberizer/callback"
 
     # Heroku setup
@@ -61,10 +240,15 @@ def auth_rememberizer_callback():
         "client_secret": REMEMBERIZER_CLIENT_SECRET,
     }
     try:
-        response = requests.post(token_url, data=data)
+        response = http_pool.get_session().post(token_url, data=data)
         tokens = response.json()
-        session["rememberizer_access_token"] = tokens.get("access_token")
-        session["rememberizer_refresh_token"] = tokens.get("refresh_token")
+        session.pop("account_info", None)
+        manager = token_manager.get_token_manager()
+        if manager is not None:
+            session["rememberizer_token_id"] = manager.save(tokens)
+        else:
+            session["rememberizer_access_token"] = tokens.get("access_token")
+            session["rememberizer_refresh_token"] = tokens.get("refresh_token")
         return redirect("/dashboard")
     except Exception as e:
         logger.error(f"Error during token exchange: {e}")
@@ -75,63 +259,59 @@ def auth_rememberizer_callback():
 
 @app.route("/dashboard")
 def dashboard():
-    if "rememberizer_access_token" not in session:
+    access_token = current_access_token()
+    if access_token is None:
         return redirect("/auth/rememberizer")
-    headers = {"Authorization": f'Bearer {session["rememberizer_access_token"]}'}
-    response = requests.get(
-        "https://api.rememberizer.ai/api/v1/account", headers=headers
-    )
-    if response.status_code != 200:
+    info = account_info(access_token)
+    if info is None:
         return redirect("/auth/rememberizer")
-    account_info = response.json()
 
-    return render_template("dashboard.html", account_info=account_info)
+    return render_template("dashboard.html", account_info=info)
+
+
+def slack_info_loader():
+    """
+    Returns: (user key, load) for the signed-in user, where load() fetches their
+    Slack info with a current access token and also works outside the request
+    """
+    manager = token_manager.get_token_manager()
+    token_id = session.get("rememberizer_token_id")
+    if manager is not None and token_id is not None:
+        user_key = token_id
+
+        def access_token():
+            return manager.access_token(token_id)
+
+    else:
+        token = session.get("rememberizer_access_token") or ""
+        user_key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+        def access_token():
+            return token
+
+    def load():
+        token = access_token()
+        if not token:
+            return None
+        return channel_prefetch.fetch_slack_info(make_provider(token))
+
+    return user_key, load
 
 
 @app.route("/slack-info")
 def slack_info():
-    if "rememberizer_access_token" not in session:
+    if current_access_token() is None:
         logger.debug("Access token not in session")
         return redirect("/auth/rememberizer")
-    headers = {"Authorization": f'Bearer {session["rememberizer_access_token"]}'}
 
     try:
-        response = requests.get(
-            "https://api.rememberizer.ai/api/v1/integrations", headers=headers
-        )
-        if response.status_code != 200:
+        user_key, load = slack_info_loader()
+        refresher = channel_prefetch.get_refresher()
+        info = refresher.snapshot(user_key, load) if refresher else load()
+        if info is None:
             return redirect("/auth/rememberizer")
 
-        slack_info = response.json()
-        slack_integration = None
-        for integration in slack_info["data"]:
-            if integration["integration_type"] == "slack":
-                slack_integration = integration
-                break
-
-        slack_channels = []
-        if slack_integration:
-            documents_response = requests.get(
-                f"https://api.rememberizer.ai/api/v1/documents?integration_type=slack",
-                headers=headers,
-            )
-            if documents_response.status_code != 200:
-                raise Exception(
-                    f"Failed to fetch documents: {documents_response.status_code}"
-                )
-            documents = documents_response.json()
-            if documents.get("error"):
-                raise Exception(f'Error in documents response: {documents["error"]}')
-            results = documents["results"]
-            for result in results:
-                if result["integration_type"] == "slack":
-                    slack_channels.append(result)
-
-        return render_template(
-            "slack_info.html",
-            slack_integration=slack_integration,
-            slack_channels=slack_channels,
-        )
+        return render_template("slack_info.html", **info)
     except Exception as e:
         logger.error(f"Error in slack-info route: {e}")
         return redirect(f"/error?message={e}")
@@ -139,29 +319,166 @@ def slack_info():
 
 @app.route("/ask", methods=["POST"])
 def ask():
-    if "rememberizer_access_token" not in session:
+    access_token = current_access_token()
+    if access_token is None:
         return redirect("/auth/rememberizer")
 
     question = request.form["question"]
 
-    client = OpenAI(api_key=OPENAI_API_KEY)
-    provider = RememberizerSourceProvider(
-        access_token=session["rememberizer_access_token"]
-    )
-    context = provider.handle(question, client)
-    prompt = f"Question: {question}\nContext: {context}\nFormat your answer in Markdown:\nAnswer:"
-    messages = [
-        {"role": "system", "content": "You are a friendly AI assistant."},
-        {"role": "user", "content": prompt},
-    ]
-    completion = client.chat.completions.create(
-        messages=messages,
-        model=GPT_MODEL,
-        temperature=0.7,
+    with tracing.span("ask"):
+        client = clients.get_openai_client()
+        provider = make_provider(access_token)
+        chat = current_conversation()
+        context = provider.handle(question, client, conversation=chat)
+        with tracing.span("build_prompt"):
+            messages = build_answer_messages(
+                question, context, chat.history_messages() if chat else ()
+            )
+        with tracing.span("answer_completion", model=GPT_MODEL) as span:
+            completion = client.chat.completions.create(
+                messages=messages,
+                model=GPT_MODEL,
+                temperature=0.7,
+                **COMPLETION_OPTIONS,
+            )
+            span.set_usage(completion.usage)
+        answer = completion.choices[0].message
+        turns = []
+        if chat is not None:
+            save_turn(chat, question, answer.content, client)
+            turns = chat.turns[:-1]
+
+        with tracing.span("render"):
+            return render_template(
+                "answer.html", question=question, answer=answer.content, turns=turns
+            )
+
+
+@app.route("/ask-stream", methods=["POST"])
+def ask_stream():
+    """
+    Stream the answer completion as server-sent events: one `data: {"delta": ...}`
+    event per token chunk, an `event: error` if the answer fails part way, then
+    always an `event: done` carrying the timings.
+    """
+    access_token = current_access_token()
+    if access_token is None:
+        return redirect("/auth/rememberizer")
+
+    started = time.perf_counter()
+    question = request.form["question"]
+    client = clients.get_openai_client()
+    provider = make_provider(access_token)
+    chat = current_conversation()
+
+    @stream_with_context
+    def generate():
+        # Flush the headers before the tool call so the client can start rendering.
+        yield ": started\n\n"
+        time_to_first_token = None
+        deltas = []
+        failed = False
+        try:
+            context = provider.handle(question, client, conversation=chat)
+            stream = client.chat.completions.create(
+                messages=build_answer_messages(
+                    question, context, chat.history_messages() if chat else ()
+                ),
+                model=GPT_MODEL,
+                temperature=0.7,
+                stream=True,
+                **COMPLETION_OPTIONS,
+            )
+            for chunk in stream:
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                deltas.append(chunk.choices[0].delta.content)
+                if time_to_first_token is None:
+                    time_to_first_token = time.perf_counter() - started
+                    logger.info(
+                        f"/ask-stream time to first token: {time_to_first_token:.3f}s"
+                    )
+                yield sse_event({"delta": chunk.choices[0].delta.content})
+        except Exception as ex:
+            # The 200 is already sent; report the failure in the stream instead.
+            logger.error(f"/ask-stream failed: {ex}")
+            failed = True
+            yield sse_event(
+                {"error": "The answer could not be completed. Please try again."},
+                event="error",
+            )
+        total = time.perf_counter() - started
+        logger.info(f"/ask-stream total latency: {total:.3f}s")
+        yield sse_event(
+            {"time_to_first_token": time_to_first_token, "total": total}, event="done"
+        )
+        if chat is not None and not failed:
+            save_turn(chat, question, "".join(deltas), client)
+
+    return Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    answer = completion.choices[0].message
 
-    return render_template("answer.html", question=question, answer=answer.content)
+
+@app.route("/ask-async", methods=["POST"])
+def ask_async():
+    # Under WSGI there is no event loop shared between requests to answer on, so
+    # this is /ask. The ASGI entry point (asgi.py) serves the route itself.
+    return ask()
+
+
+async def answer_async():
+    """
+    The /ask-async view for the ASGI entry point: the tool choice, Rememberizer
+    calls and answer completion run on the server's event loop with the process-wide
+    async clients, so a question in flight holds no thread. Session, token and
+    conversation store calls block and run in `asyncio.to_thread`.
+    """
+    access_token = await asyncio.to_thread(current_access_token)
+    if access_token is None:
+        return redirect("/auth/rememberizer")
+
+    question = request.form["question"]
+
+    with tracing.span("ask_async"):
+        chat = await asyncio.to_thread(current_conversation)
+        client = clients.get_async_clients().openai
+        provider = make_async_provider(access_token)
+        context = await provider.handle(question, client, conversation=chat)
+        with tracing.span("build_prompt"):
+            messages = build_answer_messages(
+                question, context, chat.history_messages() if chat else ()
+            )
+        with tracing.span("answer_completion", model=GPT_MODEL) as span:
+            completion = await client.chat.completions.create(
+                messages=messages,
+                model=GPT_MODEL,
+                temperature=0.7,
+                **COMPLETION_OPTIONS,
+            )
+            span.set_usage(completion.usage)
+        answer = completion.choices[0].message
+        turns = []
+        if chat is not None:
+            # The summary call (when the history is over budget) uses a sync client.
+            await asyncio.to_thread(save_turn, chat, question, answer.content)
+            turns = chat.turns[:-1]
+
+        with tracing.span("render"):
+            return render_template(
+                "answer.html", question=question, answer=answer.content, turns=turns
+            )
+
+
+@app.route("/conversation/new", methods=["POST"])
+def new_conversation():
+    store = conversation.get_conversation_store()
+    conversation_id = session.pop("conversation_id", None)
+    if store is not None and conversation_id is not None:
+        store.delete(conversation_id)
+    return redirect("/dashboard")
 
 
 @app.route("/error")
@@ -170,8 +487,84 @@ def error():
     return render_template("error.html", error_message=error_message)
 
 
+@app.route("/stats")
+def stats():
+    cache = response_cache.get_cache()
+    query_cache = semantic_cache.get_semantic_cache()
+    intent_router = router.get_router()
+    builder = context_builder.get_context_builder()
+    store = discussion_store.get_discussion_store()
+    index = local_index.get_local_index()
+    tracer = tracing.get_tracer()
+    deduplicator = single_flight.get_single_flight()
+    limiter = rate_limiter.get_rate_limiter()
+    tokens = token_manager.get_token_manager()
+    sessions = session_store.get_session_interface()
+    conversations = conversation.get_conversation_store()
+    refresher = channel_prefetch.get_refresher()
+    providers = clients.get_provider_registry()
+    speculator = speculation.get_speculative_search()
+    knowledge_sources = sources.get_source_registry()
+    return jsonify(
+        {
+            "http_pool": http_pool.stats(),
+            "response_cache": cache.stats() if cache else None,
+            "semantic_cache": query_cache.stats() if query_cache else None,
+            "router": intent_router.stats() if intent_router else None,
+            "context_builder": builder.stats() if builder else None,
+            "discussion_store": store.stats() if store else None,
+            "local_index": index.stats() if index else None,
+            "tracing": tracer.stats() if tracer else None,
+            "single_flight": deduplicator.stats() if deduplicator else None,
+            "rate_limiter": limiter.stats() if limiter else None,
+            "token_manager": tokens.stats() if tokens else None,
+            "session_store": sessions.stats() if sessions else None,
+            "conversation": conversations.stats() if conversations else None,
+            "slack_info": refresher.stats() if refresher else None,
+            "provider_registry": providers.stats() if providers else None,
+            "speculative_search": speculator.stats() if speculator else None,
+            "sources": knowledge_sources.stats() if knowledge_sources else None,
+            "openai_usage": {
+                "prompt_prefix": PROMPT_PREFIX_ID,
+                "stages": tracing.get_usage_meter().stats(),
+            },
+        }
+    )
+
+
+@app.route("/metrics")
+def metrics():
+    limiter = rate_limiter.get_rate_limiter()
+    body = tracing.render_metrics() + (limiter.render() if limiter else "")
+    return Response(body, mimetype="text/plain; version=0.0.4")
+
+
 @app.route("/logout")
 def logout():
+    manager = token_manager.get_token_manager()
+    token_id = session.get("rememberizer_token_id")
+    # The stored token as is: refreshing it only to drop its provider is wasted.
+    if manager is not None and token_id is not None:
+        access_token = manager.stored_access_token(token_id)
+    else:
+        access_token = session.get("rememberizer_access_token")
+    if access_token is not None:
+        for registry in (
+            clients.get_provider_registry(),
+            clients.get_async_provider_registry(),
+        ):
+            if registry is not None:
+                registry.forget(access_token)
+    if manager is not None and token_id is not None:
+        manager.forget(token_id)
+    store = conversation.get_conversation_store()
+    if store is not None and "conversation_id" in session:
+        store.delete(session["conversation_id"])
+    refresher = channel_prefetch.get_refresher()
+    if refresher is not None and (
+        "rememberizer_token_id" in session or "rememberizer_access_token" in session
+    ):
+        refresher.forget(slack_info_loader()[0])
     # Clear the session
     session.clear()
     # Redirect to the home page or login page
@@ -0,0 +1,128 @@
+import asyncio
+from io import BytesIO
+
+import clients
+from app import answer_async, app
+from asgiref.wsgi import WsgiToAsgi
+
+# Every other route: the Flask app, run in a thread per request by asgiref.
+flask_app = WsgiToAsgi(app)
+
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+def wsgi_environ(scope, body):
+    """
+    Returns: the WSGI environ of an ASGI http scope, so Flask can parse the request
+    and open its session
+    """
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", ""),
+        "PATH_INFO": scope["path"],
+        "QUERY_STRING": scope["query_string"].decode("latin1"),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "SERVER_NAME": scope["server"][0] if scope.get("server") else "localhost",
+        "SERVER_PORT": str(scope["server"][1]) if scope.get("server") else "80",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": BytesIO(body),
+        # The body is read in full, so it ends where the stream does.
+        "wsgi.input_terminated": True,
+        "wsgi.errors": BytesIO(),
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin1").upper().replace("-", "_")
+        if name not in ("CONTENT_LENGTH", "CONTENT_TYPE"):
+            name = f"HTTP_{name}"
+        value = value.decode("latin1")
+        if name in environ:
+            separator = "; " if name == "HTTP_COOKIE" else ","
+            value = f"{environ[name]}{separator}{value}"
+        environ[name] = value
+    return environ
+
+
+async def ask_async(scope, receive, send):
+    """
+    Serve POST /ask-async on the event loop. The Flask request context is pushed on
+    this task, so `request`, `session` and templates work as in a view; opening and
+    saving the session block and run in `asyncio.to_thread`.
+    """
+    body = await read_body(receive)
+    if body is None:
+        return
+    context = app.request_context(wsgi_environ(scope, body))
+    sessions = app.session_interface
+    context.session = await asyncio.to_thread(
+        sessions.open_session, app, context.request
+    ) or sessions.make_null_session(app)
+    context.push()
+    try:
+        # As Flask's own dispatch: errorhandlers first, then a 500.
+        try:
+            try:
+                result = await answer_async()
+            except Exception as ex:
+                result = app.handle_user_exception(ex)
+            response = app.make_response(result)
+        except Exception as ex:
+            response = app.handle_exception(ex)
+        # Runs the after-request hooks and saves the session.
+        response = await asyncio.to_thread(app.process_response, response)
+    finally:
+        context.pop()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": response.status_code,
+            "headers": [
+                (name.lower().encode("latin1"), value.encode("latin1"))
+                for name, value in response.headers.items()
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": response.get_data()})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await clients.close_async_clients()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    """
+    ASGI entry point, e.g. `uvicorn asgi:application` or gunicorn with
+    `-k uvicorn.workers.UvicornWorker`. /ask-async is answered on the server's event
+    loop, so a worker holds many questions in flight without a thread each.
+    """
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+    elif (
+        scope["type"] == "http"
+        and scope["path"] == "/ask-async"
+        and scope["method"] == "POST"
+    ):
+        await ask_async(scope, receive, send)
+    else:
+        await flask_app(scope, receive, send)
@@ -0,0 +1,505 @@
+import asyncio
+import hashlib
+import logging
+from contextlib import aclosing
+
+import http_pool
+import httpx
+import tracing
+from constants import (
+    REMEMBERIZER_ACCOUNT_ENDPOINT,
+    REMEMBERIZER_COMMON_KNOWLEDGE_ENDPOINT,
+    REMEMBERIZER_DISCUSSION_CONTENT_ENDPOINT,
+    REMEMBERIZER_DOCUMENTS_ENDPOINT,
+    REMEMBERIZER_SEARCH_ENDPOINT,
+    REMEMBERIZER_SLACK_INTEGRATIONS_ENDPOINT,
+)
+from discussion_store import format_timestamp, resolve_window
+from provider import (
+    COMPLETION_OPTIONS,
+    DISCUSSION_INTEGRATION_TYPE,
+    DOCUMENTS_PAGE_SIZE,
+    FUNCTION_CALLING_TOOLS,
+    FUNCTION_MAPPING,
+    GPT_MODEL,
+    LIST_CHANNELS_LIMIT,
+    SYSTEM_MESSAGE,
+    TOOL_CALL_TIMEOUT,
+    RememberizerSourceProvider,
+    parse_tool_calls,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _sync_only(name):
+    def unavailable(self, *args, **kwargs):
+        raise Exception(
+            f"[Rememberizer Source Error] {name} is only available on "
+            f"RememberizerSourceProvider"
+        )
+
+    unavailable.__name__ = name
+    return unavailable
+
+
+class AsyncRememberizerSourceProvider(RememberizerSourceProvider):
+    """
+    asyncio variant of RememberizerSourceProvider built on httpx.AsyncClient. The
+    SQLite-backed caches and stores and the local index block, so they are called
+    through `asyncio.to_thread` to keep the event loop free.
+    Use it as an async context manager so a client created here is closed on the
+    event loop it was opened on; pass `client` to share one across requests.
+    The batch, ingest and indexing pipelines are sync only and raise here.
+    """
+
+    # They would call the coroutines below without awaiting them.
+    iter_document_contents = _sync_only("iter_document_contents")
+    index_document = _sync_only("index_document")
+    answer = _sync_only("answer")
+    answer_batch = _sync_only("answer_batch")
+    memorize = _sync_only("memorize")
+    memorize_batch = _sync_only("memorize_batch")
+
+    def __init__(
+        self,
+        access_token,
+        client=None,
+        cache=None,
+        semantic_cache=None,
+        router=None,
+        context_builder=None,
+        discussion_store=None,
+        local_index=None,
+        single_flight=None,
+        rate_limiter=None,
+        speculative_search=None,
+        sources=None,
+    ):
+        self.access_token = access_token
+        self.cache = cache
+        self.semantic_cache = semantic_cache
+        self.router = router
+        self.context_builder = context_builder
+        self.discussion_store = discussion_store
+        self.local_index = local_index
+        self.single_flight = single_flight
+        self.rate_limiter = rate_limiter
+        self.speculative_search = speculative_search
+        self.sources = sources
+        self.retrieval_memo = None
+        self._scope = None
+        self._owns_client = client is None
+        self.client = client or http_pool.create_async_client()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def aclose(self):
+        if self._owns_client:
+            await self.client.aclose()
+
+    async def call_api(
+        self, url, params={}, method="get", retried=False, json_body=False
+    ):
+        if self.rate_limiter is None:
+            return await self._send(url, params, method, json_body)
+        attempt = 0
+        while True:
+            wait = self.rate_limiter.acquire(self.access_token, url)
+            try:
+                await asyncio.sleep(wait)
+                response = await self._send(url, params, method, json_body)
+            except httpx.TransportError:
+                delay = self.rate_limiter.complete(self.access_token, url, attempt)
+                if retried or delay is None:
+                    raise
+            except BaseException:
+                # Includes cancellation by asyncio.wait_for.
+                self.rate_limiter.abandon(url)
+                raise
+            else:
+                delay = self.rate_limiter.complete(
+                    self.access_token,
+                    url,
+                    attempt,
+                    response.status_code,
+                    response.headers.get("Retry-After"),
+                )
+                if retried or delay is None:
+                    return response
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _send(self, url, params, method, json_body=False):
+        headers = {"Authorization": f"Bearer {self.access_token}"}
+        with tracing.span("call_api", method=method, url=url) as span:
+            if method == "post":
+                body = {"json": params} if json_body else {"data": params}
+                response = await self.client.post(url, headers=headers, **body)
+            elif method == "get":
+                response = await self.client.get(url, headers=headers, params=params)
+            else:
+                raise Exception(
+                    f"[Rememberizer Source Error] Method not supported: {method}"
+                )
+            span.set("status_code", response.status_code)
+        return response
+
+    async def cached(self, endpoint, arguments, fetch):
+        if self.cache is None:
+            return await self.coalesced(endpoint, arguments, fetch)
+        data = await asyncio.to_thread(
+            self.cache.get, self.access_token, endpoint, arguments
+        )
+        if data is not None:
+            return data, True
+        data, success = await self.coalesced(endpoint, arguments, fetch)
+        if success:
+            await asyncio.to_thread(
+                self.cache.set, self.access_token, endpoint, arguments, data
+            )
+        return data, success
+
+    async def coalesced(self, endpoint, arguments, fetch):
+        if self.single_flight is None:
+            return await fetch()
+        return await self.single_flight.do_async(
+            self.access_token, endpoint, arguments, fetch
+        )
+
+    async def search(self, arguments):
+        if self.sources is not None:
+            return await self.sources.search_async(self, arguments)
+        return await self.search_rememberizer(arguments)
+
+    async def search_rememberizer(self, arguments):
+        if self.local_index is None:
+            return await self._remote_search(arguments)
+        scope = await self.scope()
+        local, answer = await asyncio.to_thread(
+            self.local_index.lookup, scope, arguments
+        )
+        if answer is not None:
+            return answer, True
+        try:
+            data, success = await self._remote_search(arguments)
+        except Exception as ex:
+            logger.error(f"Remote search failed: {ex}")
+            data, success = {"error": str(ex)}, False
+        return await asyncio.to_thread(
+            self.local_index.resolve, scope, arguments, local, data, success
+        )
+
+    async def _remote_search(self, arguments):
+        if self.semantic_cache is not None:
+            data = self.semantic_cache.get(self.access_token, arguments)
+            if data is not None:
+                return data, True
+        data, success = await self.cached(
+            "search", arguments, lambda: self._search(arguments)
+        )
+        if success and self.semantic_cache is not None:
+            self.semantic_cache.set(self.access_token, arguments, data)
+        return data, success
+
+    async def _search(self, arguments):
+        response = await self.call_api(
+            f"{REMEMBERIZER_SEARCH_ENDPOINT}", params=arguments
+        )
+        return self.format_response(response)
+
+    async def get_account(self, arguments):
+        return await self.cached(
+            "get_account", arguments, lambda: self._get_account(arguments)
+        )
+
+    async def _get_account(self, arguments):
+        response = await self.call_api(
+            f"{REMEMBERIZER_ACCOUNT_ENDPOINT}", params=arguments
+        )
+        return self.format_response(response)
+
+    async def get_common_knowledge(self, arguments):
+        async def fetch():
+            response = await self.call_api(
+                REMEMBERIZER_COMMON_KNOWLEDGE_ENDPOINT, params=arguments
+            )
+            return self.format_response(response)
+
+        return await self.cached("get_common_knowledge", arguments, fetch)
+
+    async def scope(self):
+        if self._scope is None:
+            account, success = await self.get_account({})
+            if success and account.get("id") is not None:
+                self._scope = f"account:{account['id']}"
+            else:
+                digest = hashlib.sha256(self.access_token.encode("utf-8")).hexdigest()
+                self._scope = f"token:{digest}"
+        return self._scope
+
+    async def get_discussion_content(self, arguments):
+        # A copy: the caller's arguments are the call the conversation remembers.
+        arguments = dict(arguments)
+        discussion_id = arguments.pop("discussion_id")
+        integration_type = arguments.pop(
+            "integration_type", DISCUSSION_INTEGRATION_TYPE
+        )
+        data, success = await self._mirrored_discussion_content(
+            discussion_id, arguments, integration_type
+        )
+        if success and self.local_index is not None:
+            await asyncio.to_thread(
+                self.local_index.add_response, await self.scope(), data
+            )
+        return data, success
+
+    async def _mirrored_discussion_content(
+        self, discussion_id, arguments, integration_type
+    ):
+        if self.discussion_store is None:
+            return await self._get_discussion_content(
+                discussion_id, arguments, integration_type
+            )
+
+        scope = await self.scope()
+        start, end = resolve_window(arguments)
+        missing = await asyncio.to_thread(
+            self.discussion_store.missing_ranges, scope, discussion_id, start, end
+        )
+        for missing_start, missing_end in missing:
+            data, success = await self._get_discussion_content(
+                discussion_id,
+                {
+                    "from": format_timestamp(missing_end),
+                    "to": format_timestamp(missing_start),
+                },
+                integration_type,
+            )
+            if not success:
+                return data, False
+            await asyncio.to_thread(
+                self.discussion_store.add,
+                scope,
+                discussion_id,
+                missing_start,
+                missing_end,
+                data,
+            )
+        return (
+            await asyncio.to_thread(
+                self.discussion_store.answer,
+                scope,
+                discussion_id,
+                start,
+                end,
+                len(missing),
+            ),
+            True,
+        )
+
+    async def _get_discussion_content(
+        self, discussion_id, arguments, integration_type=DISCUSSION_INTEGRATION_TYPE
+    ):
+        arguments = dict(arguments, integration_type=integration_type)
+
+        async def fetch():
+            response = await self.call_api(
+                REMEMBERIZER_DISCUSSION_CONTENT_ENDPOINT.format(discussion_id),
+                params=arguments,
+            )
+            return self.format_response(response)
+
+        return await self.coalesced(
+            "get_discussion_content",
+            dict(arguments, discussion_id=discussion_id),
+            fetch,
+        )
+
+    async def list_channels(self, arguments):
+        return await self.cached(
+            "list_channels", arguments, lambda: self._list_channels(arguments)
+        )
+
+    async def _list_channels(self, arguments):
+        channels = []
+        documents = self.iter_documents(
+            arguments, url=REMEMBERIZER_SLACK_INTEGRATIONS_ENDPOINT, prefetch=True
+        )
+        try:
+            async with aclosing(documents):
+                async for channel in documents:
+                    channels.append(channel)
+                    if len(channels) >= LIST_CHANNELS_LIMIT:
+                        break
+        except Exception as ex:
+            return {"error": str(ex)}, False
+        return {"count": len(channels), "results": channels}, True
+
+    async def fetch_page(self, url, params=None):
+        data, success = self.format_response(
+            await self.call_api(url, params=params or {})
+        )
+        if not success or data.get("error"):
+            raise Exception(
+                f"[Rememberizer Source Error] Failed to fetch {url}: {data}"
+            )
+        return data
+
+    async def iter_pages(self, url, params=None, prefetch=False):
+        page = await self.fetch_page(url, params)
+        while True:
+            next_url = page.get("next")
+            pending = None
+            if next_url and prefetch:
+                pending = asyncio.ensure_future(self.fetch_page(next_url))
+            try:
+                yield page
+            except GeneratorExit:
+                if pending:
+                    pending.cancel()
+                raise
+            if not next_url:
+                return
+            page = await pending if pending else await self.fetch_page(next_url)
+
+    async def iter_documents(
+        self,
+        params=None,
+        url=REMEMBERIZER_DOCUMENTS_ENDPOINT,
+        page_size=DOCUMENTS_PAGE_SIZE,
+        prefetch=False,
+    ):
+        params = dict(params or {}, page_size=page_size)
+        async for page in self.iter_pages(url, params, prefetch=prefetch):
+            for document in page.get("results", []):
+                yield document
+
+    async def call_function(self, function_name, arguments):
+        with tracing.span(f"tool.{function_name}"):
+            response, success = await getattr(self, function_name)(arguments)
+
+        if not success:
+            logger.error(f"Error calling function {function_name}")
+
+        return response
+
+    async def run_tool_calls(self, calls, timeout=TOOL_CALL_TIMEOUT):
+        results = await asyncio.gather(
+            *(
+                asyncio.wait_for(self.call_function(function_name, arguments), timeout)
+                for function_name, _, arguments in calls
+            ),
+            return_exceptions=True,
+        )
+
+        responses = []
+        for (function_name, _, _), result in zip(calls, results):
+            if isinstance(result, asyncio.TimeoutError):
+                logger.error(f"Function {function_name} timed out after {timeout}s")
+                responses.append({"error": f"{function_name} timed out"})
+            elif isinstance(result, Exception):
+                logger.error(f"Error calling function {function_name}: {result}")
+                responses.append({"error": f"{function_name} failed"})
+            else:
+                responses.append(result)
+        return responses
+
+    async def retrieve(self, calls, conversation=None, speculation=None):
+        responses = [
+            conversation.retrieval(*call) if conversation is not None else None
+            for call in calls
+        ]
+        missing = [
+            index for index, response in enumerate(responses) if response is None
+        ]
+        if speculation is not None:
+            claimed = await speculation.claim_async([calls[index] for index in missing])
+            if claimed is not None:
+                index, response = missing.pop(claimed[0]), claimed[1]
+                responses[index] = response
+                if conversation is not None:
+                    conversation.remember(*calls[index], response)
+        if missing:
+            fetched = await self.run_tool_calls([calls[index] for index in missing])
+            for index, response in zip(missing, fetched):
+                if conversation is not None:
+                    conversation.remember(*calls[index], response)
+                responses[index] = response
+        return responses
+
+    async def handle(
+        self,
+        message,
+        client,
+        gpt_model=GPT_MODEL,
+        function_calling_tools=FUNCTION_CALLING_TOOLS,
+        function_mapping=FUNCTION_MAPPING,
+        conversation=None,
+    ):
+        """
+        Same flow as RememberizerSourceProvider.handle; `client` is an AsyncOpenAI.
+        """
+        speculation = None
+        with tracing.span("handle") as span:
+            try:
+                with tracing.span("route_locally"):
+                    calls = self.route_locally(message, function_mapping)
+                if calls:
+                    span.set("routed_locally", True)
+                    responses = await self.retrieve(calls, conversation)
+                    return self.build_extra_knowledge(message, calls, responses)
+
+                if self.speculative_search is not None:
+                    speculation = self.speculative_search.start_async(self, message)
+
+                tool_choice_prompt = [
+                    SYSTEM_MESSAGE,
+                    *(conversation.history_messages() if conversation else []),
+                    {"role": "user", "content": message},
+                ]
+
+                with tracing.span("tool_choice", model=gpt_model) as choice_span:
+                    chat_response = await client.chat.completions.create(
+                        messages=tool_choice_prompt,
+                        model=gpt_model,
+                        tools=function_calling_tools,
+                        **COMPLETION_OPTIONS,
+                    )
+                    choice_span.set_usage(chat_response.usage)
+
+                if not chat_response.choices[0].message.tool_calls:
+                    if conversation is not None and conversation.last_calls():
+                        # A follow-up about the previous answer: reuse its context.
+                        calls = conversation.last_calls()
+                        responses = await self.retrieve(calls, conversation)
+                        return self.build_extra_knowledge(message, calls, responses)
+                    return "No context provided"
+
+                tools_response = chat_response.choices[0].message
+                with tracing.span("parse_tool_calls"):
+                    calls = parse_tool_calls(
+                        tools_response.tool_calls, function_mapping
+                    )
+                if not calls:
+                    return {}
+
+                responses = await self.retrieve(calls, conversation, speculation)
+                return self.build_extra_knowledge(message, calls, responses)
+
+            except Exception as ex:
+                span.fail(ex)
+                logger.error(
+                    f"Something went wrong while connecting with Rememberizer. {str(ex)}",
+                    exc_info=True,
+                )
+                return {}
+            finally:
+                if speculation is not None:
+                    speculation.discard()
+                    span.set("speculation", speculation.outcome)
+                    span.set("speculation_saved_ms", round(speculation.saved * 1000, 1))
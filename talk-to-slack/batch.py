@@ -0,0 +1,140 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import clients
+from provider import BATCH_CONCURRENCY, GPT_MODEL
+from single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+def read_questions(lines):
+    """
+    Parse questions JSONL: one {"question": ..., "id": ...} object per line. The id
+    defaults to the line number; blank lines are skipped.
+    Yields: (id, question)
+    """
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        yield str(record.get("id", number)), record["question"]
+
+
+def read_checkpoint(path):
+    """
+    Returns: the ids already answered in an earlier run's output file
+    """
+    answered = set()
+    if not os.path.exists(path):
+        return answered
+    with open(path) as output:
+        for line in output:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A line cut short when the previous run was killed.
+                continue
+            if "answer" in record:
+                answered.add(str(record["id"]))
+    return answered
+
+
+def run_batch(provider, client, questions, output, concurrency, gpt_model, skip=()):
+    """
+    Answer `questions` and write one JSON line per result to `output` as each
+    completes, flushing so the file doubles as the resume checkpoint.
+    Returns: the throughput report
+    """
+    memo = SingleFlight(retain=True)
+    report = {"questions": 0, "answered": 0, "errors": 0, "skipped": 0}
+
+    def pending():
+        for question_id, question in questions:
+            if question_id in skip:
+                report["skipped"] += 1
+                continue
+            yield question_id, question
+
+    started = time.perf_counter()
+    for result in provider.answer_batch(
+        pending(), client, concurrency=concurrency, gpt_model=gpt_model, memo=memo
+    ):
+        output.write(json.dumps(result) + "\n")
+        output.flush()
+        report["questions"] += 1
+        report["answered" if "answer" in result else "errors"] += 1
+    elapsed = time.perf_counter() - started
+
+    retrievals = memo.stats()
+    report.update(
+        {
+            "seconds": round(elapsed, 3),
+            "questions_per_second": (
+                round(report["questions"] / elapsed, 3) if elapsed else 0.0
+            ),
+            "retrievals": retrievals["calls"],
+            "retrievals_saved": retrievals["saved"],
+        }
+    )
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Answer a JSONL file of questions through the /ask pipeline and "
+        "write the answers as JSONL."
+    )
+    parser.add_argument("input", help='questions JSONL ("-" for stdin)')
+    parser.add_argument(
+        "-o",
+        "--output",
+        required=True,
+        help="answers JSONL; rerunning with the same file resumes the batch",
+    )
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--model", default=GPT_MODEL)
+    parser.add_argument(
+        "--access-token",
+        default=os.environ.get("REMEMBERIZER_ACCESS_TOKEN"),
+        help="Rememberizer access token (default: $REMEMBERIZER_ACCESS_TOKEN)",
+    )
+    args = parser.parse_args(argv)
+    if not args.access_token:
+        parser.error("--access-token or REMEMBERIZER_ACCESS_TOKEN is required")
+
+    # Imported here so --help works without the app's configuration.
+    from app import make_provider
+
+    logging.getLogger().setLevel(logging.INFO)
+    provider = make_provider(args.access_token)
+    client = clients.get_openai_client()
+    answered = read_checkpoint(args.output)
+    if answered:
+        logger.info(f"Resuming: {len(answered)} questions already answered")
+
+    source = sys.stdin if args.input == "-" else open(args.input)
+    try:
+        with open(args.output, "a") as output:
+            report = run_batch(
+                provider,
+                client,
+                read_questions(source),
+                output,
+                args.concurrency,
+                args.model,
+                skip=answered,
+            )
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    json.dump(report, sys.stderr, indent=2)
+    sys.stderr.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,624 @@
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import cycle
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import requests
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+API_PREFIX = "/api/v1"
+QUESTIONS = [
+    "How do we deploy the backend service?",
+    "What did we decide about the pricing change?",
+    "Who is responsible for the billing integration?",
+    "Why did the release get delayed?",
+]
+_WORDS = (
+    "release deploy billing pricing customer roadmap channel thread meeting "
+    "review incident migration backend frontend design budget"
+).split()
+
+
+class Distribution:
+    """
+    Random non-negative values parsed from a spec: "fixed:V", "uniform:LOW,HIGH",
+    "normal:MEAN,STDDEV" or "exponential:MEAN".
+    """
+
+    def __init__(self, spec):
+        self.spec = spec
+        kind, _, values = spec.partition(":")
+        try:
+            self.kind = kind
+            self.values = [float(value) for value in values.split(",")]
+        except ValueError:
+            raise Exception(f"[Benchmark Error] Invalid distribution: {spec}")
+        arity = {"fixed": 1, "uniform": 2, "normal": 2, "exponential": 1}
+        if arity.get(kind) != len(self.values):
+            raise Exception(f"[Benchmark Error] Invalid distribution: {spec}")
+
+    def sample(self, rng=random):
+        if self.kind == "fixed":
+            value = self.values[0]
+        elif self.kind == "uniform":
+            value = rng.uniform(*self.values)
+        elif self.kind == "normal":
+            value = rng.gauss(*self.values)
+        else:
+            value = rng.expovariate(1 / self.values[0]) if self.values[0] else 0.0
+        return max(value, 0.0)
+
+    def __repr__(self):
+        return self.spec
+
+
+def filler_text(size):
+    words = []
+    length = 0
+    while length <= size:
+        word = random.choice(_WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:size]
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def delay(self):
+        time.sleep(self.server.latency.sample() / 1000)
+
+
+class _RememberizerHandler(_MockHandler):
+    def do_POST(self):
+        self.read_body()
+        self.delay()
+        if urlsplit(self.path).path == f"{API_PREFIX}/auth/oauth2/token/":
+            self.send_json(
+                {
+                    "access_token": f"bench-{random.getrandbits(32):x}",
+                    "refresh_token": "bench-refresh",
+                }
+            )
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+    def do_GET(self):
+        self.delay()
+        url = urlsplit(self.path)
+        path = url.path[len(API_PREFIX) :].rstrip("/")
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        server = self.server
+
+        if path == "/account":
+            self.send_json({"id": 1, "name": "Bench", "email": "bench@example.com"})
+        elif path == "/integrations":
+            self.send_json(
+                {"data": [{"integration_type": "slack", "source": "bench-workspace"}]}
+            )
+        elif path == "/documents/search":
+            n = int(query.get("n") or 5)
+            self.send_json(
+                {
+                    "data": [
+                        {
+                            "matched_content": filler_text(
+                                int(server.payload_bytes.sample())
+                            ),
+                            "document": {
+                                "name": f"document-{i}",
+                                "modified_time": "2024-01-01T00:00:00Z",
+                            },
+                            "distance": 1 - i / (n + 1),
+                        }
+                        for i in range(n)
+                    ]
+                }
+            )
+        elif path == "/documents":
+            page = int(query.get("page") or 1)
+            page_size = int(query.get("page_size") or 100)
+            start = (page - 1) * page_size
+            end = min(start + page_size, server.channels)
+            next_url = None
+            if end < server.channels:
+                next_url = (
+                    f"{server.base_url}/documents/?integration_type=slack"
+                    f"&page={page + 1}&page_size={page_size}"
+                )
+            self.send_json(
+                {
+                    "count": server.channels,
+                    "next": next_url,
+                    "results": [
+                        {"id": i, "name": f"channel-{i}", "integration_type": "slack"}
+                        for i in range(start, end)
+                    ],
+                }
+            )
+        elif re.fullmatch(r"/discussions/[^/]+/contents", path):
+            self.send_json(
+                {
+                    "discussion_content": [
+                        {
+                            "ts": str(1700000000 + i * 60),
+                            "text": filler_text(int(server.payload_bytes.sample())),
+                        }
+                        for i in range(10)
+                    ],
+                    "thread_contents": {},
+                }
+            )
+        elif re.fullmatch(r"/documents/[^/]+/contents", path):
+            start = int(query.get("start_chunk") or 0)
+            end = int(query.get("end_chunk") or start + 20)
+            self.send_json(
+                {
+                    "content": filler_text(int(server.payload_bytes.sample())),
+                    "end_chunk": min(end, 60) if start < 60 else start,
+                }
+            )
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+
+class _OpenAIHandler(_MockHandler):
+    def do_POST(self):
+        request = json.loads(self.read_body() or b"{}")
+        self.delay()
+        if not urlsplit(self.path).path.endswith("/chat/completions"):
+            self.send_json({"error": {"message": "not found"}}, 404)
+            return
+
+        model = request.get("model", "gpt-4o")
+        if request.get("tools"):
+            question = request["messages"][-1]["content"]
+            message = {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [
+                    {
+                        "id": "call_bench",
+                        "type": "function",
+                        "function": {
+                            "name": "search",
+                            "arguments": json.dumps({"q": question, "n": 5}),
+                        },
+                    }
+                ],
+            }
+            finish_reason = "tool_calls"
+        else:
+            answer = filler_text(int(self.server.payload_bytes.sample()))
+            if request.get("stream"):
+                self.stream(model, answer)
+                return
+            message = {"role": "assistant", "content": answer}
+            finish_reason = "stop"
+
+        self.send_json(
+            {
+                "id": "chatcmpl-bench",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {"index": 0, "message": message, "finish_reason": finish_reason}
+                ],
+                "usage": {
+                    "prompt_tokens": 100,
+                    "completion_tokens": 50,
+                    "total_tokens": 150,
+                },
+            }
+        )
+
+    def stream(self, model, answer):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for word in answer.split(" "):
+            chunk = {
+                "id": "chatcmpl-bench",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "delta": {"content": word + " "},
+                        "finish_reason": None,
+                    }
+                ],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+
+class MockServer:
+    """
+    Stand-in Rememberizer ("rememberizer") or OpenAI ("openai") API on a local port,
+    answering after a latency sampled from `latency` (milliseconds) with text
+    payloads whose size is sampled from `payload_bytes`.
+    """
+
+    handlers = {"rememberizer": _RememberizerHandler, "openai": _OpenAIHandler}
+
+    def __init__(
+        self, kind, latency="fixed:0", payload_bytes="fixed:500", channels=300
+    ):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handlers[kind])
+        self.server.daemon_threads = True
+        self.server.latency = Distribution(latency)
+        self.server.payload_bytes = Distribution(payload_bytes)
+        self.server.channels = channels
+        prefix = API_PREFIX if kind == "rememberizer" else "/v1"
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}{prefix}"
+        self.server.base_url = self.base_url
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def summarize(latencies, errors, duration):
+    """
+    Returns: request count, error count, requests/second and latency percentiles (ms)
+    """
+    summary = {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / duration if duration else 0.0,
+    }
+    if latencies:
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+        summary["latency_ms"] = {
+            "p50": round(float(p50), 2),
+            "p95": round(float(p95), 2),
+            "p99": round(float(p99), 2),
+            "mean": round(float(np.mean(latencies)) * 1000, 2),
+            "max": round(float(np.max(latencies)) * 1000, 2),
+        }
+    return summary
+
+
+def rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def child_pids(pid):
+    children = []
+    for entry in os.listdir("/proc") if os.path.isdir("/proc") else []:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as stat:
+                fields = stat.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(entry))
+    return children
+
+
+class MemorySampler:
+    """
+    Tracks the peak resident memory of each worker process while the load runs.
+    """
+
+    def __init__(self, pids_fn, interval=0.5):
+        self.pids_fn = pids_fn
+        self.interval = interval
+        self.peaks = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.sample()
+            self._stop.wait(self.interval)
+
+    def sample(self):
+        for pid in self.pids_fn():
+            rss = rss_mb(pid)
+            if rss is not None:
+                self.peaks[pid] = max(self.peaks.get(pid, 0.0), rss)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+
+    def report(self):
+        peaks = [round(peak, 1) for peak in self.peaks.values()]
+        return {
+            "workers": len(peaks),
+            "peak_rss_mb": peaks,
+            "mean_peak_rss_mb": round(sum(peaks) / len(peaks), 1) if peaks else None,
+        }
+
+
+def login(app_url):
+    """
+    Open a user session through the OAuth callback (served by the mock API).
+    """
+    client = requests.Session()
+    response = client.get(
+        f"{app_url}/auth/rememberizer/callback",
+        params={"code": "bench"},
+        allow_redirects=False,
+    )
+    if response.status_code != 302 or "session" not in client.cookies:
+        raise Exception(
+            f"[Benchmark Error] Login failed with status {response.status_code}"
+        )
+    return client
+
+
+def send(client, app_url, scenario):
+    if scenario.startswith("/ask"):
+        response = client.post(
+            f"{app_url}{scenario}",
+            data={"question": random.choice(QUESTIONS)},
+            allow_redirects=False,
+        )
+    else:
+        response = client.get(f"{app_url}{scenario}", allow_redirects=False)
+    response.content
+    return response.status_code == 200
+
+
+def run_load(app_url, scenarios, concurrency, duration, warmup=0.0):
+    """
+    Closed-loop load: `concurrency` users, each logged in once and cycling through
+    `scenarios` back to back. Requests that finish during the warmup are discarded.
+    Returns: {scenario: summary}
+    """
+    results = {scenario: ([], [0]) for scenario in scenarios}
+    lock = threading.Lock()
+    started = time.perf_counter()
+    measure_from = started + warmup
+    deadline = measure_from + duration
+
+    def user(offset):
+        client = login(app_url)
+        order = cycle(
+            scenarios[offset % len(scenarios) :] + scenarios[: offset % len(scenarios)]
+        )
+        for scenario in order:
+            request_started = time.perf_counter()
+            if request_started >= deadline:
+                break
+            try:
+                ok = send(client, app_url, scenario)
+            except requests.RequestException:
+                ok = False
+            finished = time.perf_counter()
+            if finished < measure_from or finished > deadline:
+                continue
+            latencies, errors = results[scenario]
+            with lock:
+                latencies.append(finished - request_started)
+                errors[0] += not ok
+
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {
+        scenario: summarize(latencies, errors[0], duration)
+        for scenario, (latencies, errors) in results.items()
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=APP_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def start_app(port, workers, threads, rememberizer_url, openai_url, log_file):
+    env = dict(
+        os.environ,
+        REMEMBERIZER_API_URL=rememberizer_url,
+        OPENAI_BASE_URL=openai_url,
+        OPENAI_API_KEY="bench",
+    )
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "--workers",
+            str(workers),
+            "--threads",
+            str(threads),
+            "--bind",
+            f"127.0.0.1:{port}",
+            "app:app",
+        ],
+        cwd=APP_DIR,
+        env=env,
+        stdout=log_file,
+        stderr=log_file,
+    )
+    app_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        if process.poll() is not None:
+            raise Exception("[Benchmark Error] App server exited during startup")
+        try:
+            requests.get(f"{app_url}/", timeout=1)
+            return process, app_url
+        except requests.RequestException:
+            time.sleep(0.1)
+    process.terminate()
+    raise Exception("[Benchmark Error] App server did not start")
+
+
+def compare(baseline, current):
+    """
+    Returns: per-scenario percentage change of p95 latency and requests/second
+    """
+    changes = {}
+    for scenario, result in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(scenario)
+        if not before or not before.get("latency_ms") or not result.get("latency_ms"):
+            continue
+        changes[scenario] = {
+            "p95_change_pct": round(
+                100 * (result["latency_ms"]["p95"] / before["latency_ms"]["p95"] - 1), 1
+            ),
+            "rps_change_pct": (
+                round(100 * (result["rps"] / before["rps"] - 1), 1)
+                if before["rps"]
+                else None
+            ),
+        }
+    return changes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the app against local stand-in Rememberizer and "
+        "OpenAI servers and write the results as JSON."
+    )
+    parser.add_argument(
+        "--scenarios",
+        default="/ask,/slack-info,/dashboard",
+        help="comma-separated routes to drive",
+    )
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("--threads", type=int, default=8, help="threads per worker")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--app-url", help="benchmark a running app instead of starting gunicorn"
+    )
+    parser.add_argument("--rememberizer-latency", default="uniform:20,80", help="ms")
+    parser.add_argument("--openai-latency", default="uniform:300,900", help="ms")
+    parser.add_argument("--payload-bytes", default="normal:800,200")
+    parser.add_argument("--channels", type=int, default=300)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--compare", help="baseline JSON report to compare against")
+    parser.add_argument("--app-log", default=os.devnull)
+    args = parser.parse_args(argv)
+
+    scenarios = [scenario for scenario in args.scenarios.split(",") if scenario]
+    with (
+        MockServer(
+            "rememberizer",
+            args.rememberizer_latency,
+            args.payload_bytes,
+            args.channels,
+        ) as rememberizer,
+        MockServer("openai", args.openai_latency, args.payload_bytes) as openai,
+        open(args.app_log, "ab") as log_file,
+    ):
+        process = None
+        app_url = args.app_url
+        if app_url is None:
+            process, app_url = start_app(
+                args.port,
+                args.workers,
+                args.threads,
+                rememberizer.base_url,
+                openai.base_url,
+                log_file,
+            )
+        try:
+            with MemorySampler(
+                lambda: child_pids(process.pid) if process else []
+            ) as memory:
+                scenario_results = run_load(
+                    app_url, scenarios, args.concurrency, args.duration, args.warmup
+                )
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "workers": args.workers,
+            "threads": args.threads,
+            "rememberizer_latency_ms": args.rememberizer_latency,
+            "openai_latency_ms": args.openai_latency,
+            "payload_bytes": args.payload_bytes,
+            "channels": args.channels,
+        },
+        "scenarios": scenario_results,
+        "memory": memory.report(),
+    }
+    if args.compare:
+        with open(args.compare) as baseline:
+            report["compared_to"] = args.compare
+            report["changes"] = compare(json.load(baseline), report)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
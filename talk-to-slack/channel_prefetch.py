@@ -0,0 +1,260 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from constants import REMEMBERIZER_INTEGRATIONS_ENDPOINT
+from provider import LIST_CHANNELS_LIMIT
+from single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+SLACK_INFO_PREFETCH_ENABLED = (
+    os.environ.get("SLACK_INFO_PREFETCH_ENABLED", "true").lower() == "true"
+)
+# Seconds a snapshot is served as fresh; the refresher renews it within this time.
+SLACK_INFO_REFRESH_INTERVAL = float(os.environ.get("SLACK_INFO_REFRESH_INTERVAL", "60"))
+# Oldest snapshot served (and revalidated in the background) instead of waiting.
+SLACK_INFO_MAX_STALE = float(os.environ.get("SLACK_INFO_MAX_STALE", "3600"))
+# Stop prefetching for users who have not opened the page for this many seconds.
+SLACK_INFO_IDLE_TIMEOUT = float(os.environ.get("SLACK_INFO_IDLE_TIMEOUT", "1800"))
+SLACK_INFO_MAX_USERS = int(os.environ.get("SLACK_INFO_MAX_USERS", "1000"))
+
+_fanout_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="slack-info")
+# Refreshes wait on fan-out calls, so they run in a pool of their own.
+_refresh_executor = ThreadPoolExecutor(
+    max_workers=4, thread_name_prefix="slack-info-refresh"
+)
+
+
+def fetch_slack_info(provider):
+    """
+    Fetch `/integrations` and the Slack channel listing at the same time and keep
+    only what /slack-info shows: at most LIST_CHANNELS_LIMIT channels, so a large
+    workspace is not paged through in full.
+    Returns: {"slack_integration", "slack_channels"}, or None when Rememberizer
+    rejects the token
+    """
+    integrations = _fanout_executor.submit(
+        provider.call_api, REMEMBERIZER_INTEGRATIONS_ENDPOINT
+    )
+    documents = _fanout_executor.submit(
+        lambda: [
+            {"name": document["name"]}
+            for document in islice(
+                (
+                    document
+                    for document in provider.iter_documents(
+                        {"integration_type": "slack"}, prefetch=True
+                    )
+                    if document.get("integration_type") == "slack"
+                ),
+                LIST_CHANNELS_LIMIT,
+            )
+        ]
+    )
+    response = integrations.result()
+    if response.status_code != 200:
+        documents.cancel()
+        return None
+    data, _ = provider.format_response(response)
+    slack_integration = next(
+        (
+            integration
+            for integration in data["data"]
+            if integration["integration_type"] == "slack"
+        ),
+        None,
+    )
+    if slack_integration is None:
+        documents.cancel()
+        return {"slack_integration": None, "slack_channels": []}
+    return {
+        "slack_integration": slack_integration,
+        "slack_channels": documents.result(),
+    }
+
+
+class SlackInfoRefresher:
+    """
+    Keeps a snapshot of each recent user's Slack integration and channels, renewed
+    by a background thread every `interval / 2` seconds, so /slack-info renders
+    without calling Rememberizer. A snapshot older than `interval` is still served,
+    up to `max_stale` seconds, while it is refreshed in the background; only a user
+    without one waits for the fetch. Users idle for `idle_timeout` are dropped.
+    """
+
+    def __init__(
+        self,
+        interval=SLACK_INFO_REFRESH_INTERVAL,
+        max_stale=SLACK_INFO_MAX_STALE,
+        idle_timeout=SLACK_INFO_IDLE_TIMEOUT,
+        max_users=SLACK_INFO_MAX_USERS,
+        start=True,
+    ):
+        self.interval = interval
+        self.max_stale = max_stale
+        self.idle_timeout = idle_timeout
+        self.max_users = max_users
+        self._users = OrderedDict()
+        self._refreshing = set()
+        self._flight = SingleFlight()
+        self._lock = threading.Lock()
+        self._counters = {
+            "fresh": 0,
+            "stale": 0,
+            "misses": 0,
+            "refreshes": 0,
+            "background_refreshes": 0,
+            "refresh_errors": 0,
+        }
+        if start:
+            threading.Thread(target=self._run, daemon=True).start()
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def snapshot(self, user_key, load, now=None):
+        """
+        `load()` fetches the user's Slack info and must work outside the request.
+        Returns: the user's snapshot, or None when they need to sign in again
+        """
+        now = now if now is not None else time.time()
+        with self._lock:
+            entry = self._users.get(user_key)
+            if entry is None:
+                entry = self._users[user_key] = {"snapshot": None, "fetched_at": 0}
+            entry["load"] = load
+            entry["viewed_at"] = now
+            self._users.move_to_end(user_key)
+            snapshot, age = entry["snapshot"], now - entry["fetched_at"]
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        if snapshot is not None and age <= self.interval:
+            self._count("fresh")
+            return snapshot
+        if snapshot is not None and age <= self.max_stale:
+            self._count("stale")
+            self.revalidate(user_key)
+            return snapshot
+        self._count("misses")
+        return self.refresh(user_key)
+
+    def refresh(self, user_key):
+        """
+        Fetch the user's snapshot now, sharing the fetch with concurrent refreshes
+        of the same user.
+        Returns: the new snapshot, or None when they need to sign in again
+        """
+        with self._lock:
+            entry = self._users.get(user_key)
+        if entry is None:
+            return None
+        try:
+            snapshot = self._flight.do(user_key, "slack_info", {}, entry["load"])
+        except Exception:
+            self._count("refresh_errors")
+            raise
+        with self._lock:
+            self._counters["refreshes"] += 1
+            if snapshot is None:
+                self._users.pop(user_key, None)
+            elif user_key in self._users:
+                entry["snapshot"] = snapshot
+                entry["fetched_at"] = time.time()
+        return snapshot
+
+    def revalidate(self, user_key):
+        """
+        Refresh the user's snapshot in the background, unless that is already under
+        way; failures keep the old snapshot.
+        """
+        with self._lock:
+            if user_key in self._refreshing:
+                return
+            self._refreshing.add(user_key)
+
+        def run():
+            try:
+                self.refresh(user_key)
+            except Exception as ex:
+                logger.error(f"Slack info refresh failed: {ex}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(user_key)
+
+        _refresh_executor.submit(run)
+
+    def refresh_due(self, now=None):
+        """
+        Drop idle users and refresh every snapshot older than `interval / 2`.
+        Returns: number of refreshes started
+        """
+        now = now if now is not None else time.time()
+        due = []
+        with self._lock:
+            for user_key, entry in list(self._users.items()):
+                if now - entry["viewed_at"] > self.idle_timeout:
+                    del self._users[user_key]
+                elif now - entry["fetched_at"] >= self.interval / 2:
+                    due.append(user_key)
+            self._counters["background_refreshes"] += len(due)
+        for user_key in due:
+            self.revalidate(user_key)
+        return len(due)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval / 2)
+            try:
+                self.refresh_due()
+            except Exception as ex:
+                logger.error(f"Slack info refresher failed: {ex}")
+
+    def forget(self, user_key):
+        with self._lock:
+            self._users.pop(user_key, None)
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            counters = dict(self._counters)
+            ages = [
+                now - entry["fetched_at"]
+                for entry in self._users.values()
+                if entry["snapshot"] is not None
+            ]
+        served = counters["fresh"] + counters["stale"]
+        return dict(
+            counters,
+            users=len(ages),
+            max_age=max(ages, default=0.0),
+            warm_rate=served / (served + counters["misses"]) if served else 0.0,
+        )
+
+
+def create_refresher(enabled=SLACK_INFO_PREFETCH_ENABLED):
+    if not enabled:
+        return None
+    return SlackInfoRefresher()
+
+
+_refresher = None
+_refresher_lock = threading.Lock()
+
+
+def get_refresher():
+    """
+    Return the process-wide Slack info refresher, or None when
+    SLACK_INFO_PREFETCH_ENABLED=false (every page load fetches).
+    """
+    global _refresher
+    if _refresher is None:
+        with _refresher_lock:
+            if _refresher is None:
+                _refresher = create_refresher()
+    return _refresher
@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import http_pool
+from openai import AsyncOpenAI, OpenAI
+
+logger = logging.getLogger(__name__)
+
+OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+OPENAI_TIMEOUT = float(os.environ.get("OPENAI_TIMEOUT", "60"))
+OPENAI_MAX_RETRIES = int(os.environ.get("OPENAI_MAX_RETRIES", "2"))
+# Providers kept for reuse across requests, one per access token; 0 disables.
+PROVIDER_REGISTRY_SIZE = int(os.environ.get("PROVIDER_REGISTRY_SIZE", "256"))
+
+
+class ProviderRegistry:
+    """
+    Process-lifetime providers keyed on access token, least recently used first
+    out. A provider only holds shared, thread-safe collaborators and the user's
+    resolved scope, so concurrent requests of one user can share it.
+    """
+
+    def __init__(self, max_size=PROVIDER_REGISTRY_SIZE):
+        self.max_size = max_size
+        self._providers = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, access_token, create):
+        """
+        Returns: the provider registered for `access_token`, registering `create()`
+        on first use
+        """
+        with self._lock:
+            provider = self._providers.get(access_token)
+            if provider is not None:
+                self._providers.move_to_end(access_token)
+                self._counters["hits"] += 1
+                return provider
+        provider = create()
+        with self._lock:
+            # Another request may have registered one meanwhile; keep the first.
+            provider = self._providers.setdefault(access_token, provider)
+            self._providers.move_to_end(access_token)
+            self._counters["misses"] += 1
+            while len(self._providers) > self.max_size:
+                self._providers.popitem(last=False)
+                self._counters["evictions"] += 1
+        return provider
+
+    def forget(self, access_token):
+        with self._lock:
+            self._providers.pop(access_token, None)
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters, size=len(self._providers))
+        lookups = counters["hits"] + counters["misses"]
+        return dict(counters, hit_rate=counters["hits"] / lookups if lookups else 0.0)
+
+
+def create_openai_client():
+    return OpenAI(
+        api_key=OPENAI_API_KEY, timeout=OPENAI_TIMEOUT, max_retries=OPENAI_MAX_RETRIES
+    )
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_openai_client():
+    """
+    Return the process-wide OpenAI client. It is thread-safe and keeps its HTTP
+    connections open between requests.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = create_openai_client()
+    return _client
+
+
+def create_async_openai_client():
+    return AsyncOpenAI(
+        api_key=OPENAI_API_KEY, timeout=OPENAI_TIMEOUT, max_retries=OPENAI_MAX_RETRIES
+    )
+
+
+class AsyncClients:
+    """
+    The AsyncOpenAI client, httpx.AsyncClient and async provider registry shared by
+    every request on one event loop. Async clients are bound to the loop they are
+    used on; under the ASGI entry point that is the server's single loop.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.openai = create_async_openai_client()
+        self.http = http_pool.create_async_client()
+        self.providers = create_provider_registry()
+
+    async def aclose(self):
+        await self.openai.close()
+        await self.http.aclose()
+
+
+_async_clients = None
+
+
+def get_async_clients():
+    """
+    Return the async clients of the running event loop, replacing those of a loop
+    that is no longer running. Must be called on the loop; no lock is needed since
+    nothing awaits between the check and the assignment.
+    """
+    global _async_clients
+    loop = asyncio.get_running_loop()
+    if _async_clients is None or _async_clients.loop is not loop:
+        _async_clients = AsyncClients(loop)
+    return _async_clients
+
+
+def get_async_provider_registry():
+    """
+    Return the async provider registry of the current async clients, or None. Safe
+    to call from any thread, e.g. to forget a provider on logout.
+    """
+    async_clients = _async_clients
+    return async_clients.providers if async_clients is not None else None
+
+
+async def close_async_clients():
+    global _async_clients
+    if _async_clients is not None:
+        async_clients, _async_clients = _async_clients, None
+        await async_clients.aclose()
+
+
+def create_provider_registry(max_size=PROVIDER_REGISTRY_SIZE):
+    if max_size <= 0:
+        return None
+    return ProviderRegistry(max_size)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_provider_registry():
+    """
+    Return the process-wide provider registry, or None when
+    PROVIDER_REGISTRY_SIZE=0 (a provider is built per request).
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = create_provider_registry()
+    return _registry
@@ -1,9 +1,25 @@
-REMEMBERIZER_ENDPOINT = "https://api.rememberizer.ai/api/v1"
+import os
+
+# Overridable so the app can be pointed at a stand-in server (see benchmark.py).
+REMEMBERIZER_ENDPOINT = os.environ.get(
+    "REMEMBERIZER_API_URL", "https://api.rememberizer.ai/api/v1"
+)
+REMEMBERIZER_AUTHORIZE_ENDPOINT = f"{REMEMBERIZER_ENDPOINT}/auth/oauth2/authorize"
+REMEMBERIZER_TOKEN_ENDPOINT = f"{REMEMBERIZER_ENDPOINT}/auth/oauth2/token/"
+REMEMBERIZER_INTEGRATIONS_ENDPOINT = f"{REMEMBERIZER_ENDPOINT}/integrations"
 REMEMBERIZER_SEARCH_ENDPOINT = f"{REMEMBERIZER_ENDPOINT}/documents/search/"
 REMEMBERIZER_ACCOUNT_ENDPOINT = f"{REMEMBERIZER_ENDPOINT}/account/"
 REMEMBERIZER_SLACK_INTEGRATIONS_ENDPOINT = (
     f"{REMEMBERIZER_ENDPOINT}/documents?integration_type=slack"
 )
 REMEMBERIZER_DISCUSSION_CONTENT_ENDPOINT = (
-    f"{REMEMBERIZER_ENDPOINT}/discussions/{{}}/contents?integration_type=slack"
+    f"{REMEMBERIZER_ENDPOINT}/discussions/{{}}/contents"
+)
+REMEMBERIZER_COMMON_KNOWLEDGE_ENDPOINT = (
+    f"{REMEMBERIZER_ENDPOINT}/common-knowledge/subscribed-list/"
+)
+REMEMBERIZER_DOCUMENTS_ENDPOINT = f"{REMEMBERIZER_ENDPOINT}/documents/"
+REMEMBERIZER_MEMORIZE_ENDPOINT = f"{REMEMBERIZER_ENDPOINT}/documents/memorize/"
+REMEMBERIZER_DOCUMENT_CONTENTS_ENDPOINT = (
+    f"{REMEMBERIZER_ENDPOINT}/documents/{{}}/contents/"
 )
@@ -0,0 +1,200 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+
+import fast_json
+from results import Passage, parse_results
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_BUILDER_ENABLED = (
+    os.environ.get("CONTEXT_BUILDER_ENABLED", "true").lower() == "true"
+)
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "3000"))
+CONTEXT_DEDUP_SIMILARITY = float(os.environ.get("CONTEXT_DEDUP_SIMILARITY", "0.8"))
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_WORD_RE = re.compile(r"\w+")
+
+try:
+    import tiktoken
+
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+
+def count_tokens(text):
+    """
+    Count tokens with tiktoken when it is installed, otherwise approximate with
+    one token per word or punctuation mark.
+    """
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return len(_TOKEN_RE.findall(text))
+
+
+def truncate_to_tokens(text, max_tokens):
+    if max_tokens <= 0:
+        return ""
+    if _encoding is not None:
+        tokens = _encoding.encode(text, disallowed_special=())
+        return _encoding.decode(tokens[:max_tokens])
+    matches = list(_TOKEN_RE.finditer(text))
+    if len(matches) <= max_tokens:
+        return text
+    return text[: matches[max_tokens - 1].end()]
+
+
+def extract_passages(response):
+    """
+    Pull the useful fields out of a Rememberizer payload (see results.parse_results):
+    search matches keep their chunk text, document name, modified time and score;
+    discussion and document contents are split per message; anything else is kept
+    as compact JSON.
+    """
+    passages = parse_results(response)
+    if passages is not None:
+        return passages
+    if not isinstance(response, dict):
+        return [Passage(str(response))]
+    return [Passage(fast_json.dumps(response))]
+
+
+def _shingles(text, size=5):
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i : i + size]) for i in range(len(words) - size + 1)}
+
+
+def deduplicate(passages, similarity=CONTEXT_DEDUP_SIMILARITY):
+    """
+    Drop exact duplicates and chunks that mostly overlap an earlier (better ranked)
+    chunk, measured by containment of word 5-shingles.
+    """
+    seen = set()
+    kept = []
+    kept_shingles = []
+    for passage in passages:
+        normalized = " ".join(_WORD_RE.findall(passage.text.lower()))
+        digest = hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+        if digest in seen:
+            continue
+        shingles = _shingles(passage.text)
+        if any(
+            len(shingles & other) / len(shingles) >= similarity
+            for other in kept_shingles
+            if shingles
+        ):
+            continue
+        seen.add(digest)
+        kept.append(passage)
+        kept_shingles.append(shingles)
+    return kept
+
+
+def rank(passages):
+    """
+    Highest match score first; unscored passages keep their original order after them.
+    """
+    return sorted(
+        passages,
+        key=lambda passage: (
+            passage.score is None,
+            -(passage.score or 0),
+            passage.order,
+        ),
+    )
+
+
+class ContextBuilder:
+    """
+    Turns tool responses into a compact knowledge block that fits a token budget.
+    """
+
+    def __init__(
+        self, token_budget=CONTEXT_TOKEN_BUDGET, similarity=CONTEXT_DEDUP_SIMILARITY
+    ):
+        self.token_budget = token_budget
+        self.similarity = similarity
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+
+    def build(self, user_message, responses):
+        """
+        Returns: (text, report) where report holds the tokens before/after compaction
+        """
+        passages = []
+        for response in responses:
+            passages += extract_passages(response)
+        for order, passage in enumerate(passages):
+            passage.order = order
+        passages = deduplicate(rank(passages), self.similarity)
+
+        lines = []
+        remaining = self.token_budget
+        for passage in passages:
+            line = passage.render()
+            tokens = count_tokens(line)
+            if tokens > remaining:
+                line = truncate_to_tokens(line, remaining)
+                if line:
+                    lines.append(line)
+                break
+            lines.append(line)
+            remaining -= tokens
+
+        text = "Knowledge source: Rememberizer\n"
+        text += f"\tUser: {user_message}\n"
+        text += "\tResponse:\n" + "\n".join(lines) + "\n\n"
+
+        before = sum(count_tokens(fast_json.dumps(response)) for response in responses)
+        after = count_tokens("\n".join(lines))
+        report = {
+            "tokens_before": before,
+            "tokens_after": after,
+            "tokens_saved": max(before - after, 0),
+            "passages": len(lines),
+        }
+        with self._lock:
+            self.requests += 1
+            self.tokens_before += before
+            self.tokens_after += after
+        logger.debug(
+            f"Context builder kept {report['passages']} passages, "
+            f"{after}/{before} tokens ({report['tokens_saved']} saved)"
+        )
+        return text, report
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "token_budget": self.token_budget,
+                "tokens_before": self.tokens_before,
+                "tokens_after": self.tokens_after,
+                "tokens_saved": max(self.tokens_before - self.tokens_after, 0),
+            }
+
+
+_context_builder = None
+_context_builder_lock = threading.Lock()
+
+
+def get_context_builder():
+    """
+    Return the process-wide context builder, or None when CONTEXT_BUILDER_ENABLED=false.
+    """
+    global _context_builder
+    if not CONTEXT_BUILDER_ENABLED:
+        return None
+    if _context_builder is None:
+        with _context_builder_lock:
+            if _context_builder is None:
+                _context_builder = ContextBuilder()
+    return _context_builder
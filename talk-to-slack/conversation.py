@@ -0,0 +1,393 @@
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import fast_json
+import tracing
+from context_builder import count_tokens, truncate_to_tokens
+from redis_store import RedisBackend
+from response_cache import MemoryBackend, SQLiteBackend, make_key
+
+logger = logging.getLogger(__name__)
+
+CONVERSATION_BACKEND = os.environ.get("CONVERSATION_BACKEND", "none")
+CONVERSATION_STORE_PATH = os.environ.get(
+    "CONVERSATION_STORE_PATH", "conversation_store.sqlite3"
+)
+CONVERSATION_STORE_MAX_BYTES = int(
+    os.environ.get("CONVERSATION_STORE_MAX_BYTES", str(64 * 1024 * 1024))
+)
+# Idle seconds after which a conversation is forgotten.
+CONVERSATION_TTL = int(os.environ.get("CONVERSATION_TTL", str(24 * 3600)))
+# Tokens of summary plus prior turns sent with each question.
+CONVERSATION_TOKEN_BUDGET = int(os.environ.get("CONVERSATION_TOKEN_BUDGET", "1500"))
+CONVERSATION_KEEP_TURNS = int(os.environ.get("CONVERSATION_KEEP_TURNS", "2"))
+CONVERSATION_MAX_RETRIEVALS = int(os.environ.get("CONVERSATION_MAX_RETRIEVALS", "20"))
+# Seconds a retrieval stays fresh enough to answer follow-ups with.
+CONVERSATION_RETRIEVAL_TTL = int(os.environ.get("CONVERSATION_RETRIEVAL_TTL", "900"))
+CONVERSATION_SUMMARY_MODEL = os.environ.get("CONVERSATION_SUMMARY_MODEL", "gpt-4o-mini")
+CONVERSATION_SUMMARY_TIMEOUT = float(
+    os.environ.get("CONVERSATION_SUMMARY_TIMEOUT", "20")
+)
+
+# Summaries are written after the answer is returned, never on the request path.
+_summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="summary")
+
+
+def _turn_text(turn):
+    return f"User: {turn['question']}\nAssistant: {turn['answer']}"
+
+
+def summarizer(
+    client, model=CONVERSATION_SUMMARY_MODEL, timeout=CONVERSATION_SUMMARY_TIMEOUT
+):
+    """
+    Returns: a summarize(summary, turns) callable that folds turns into the running
+    summary with a (sync) OpenAI client
+    """
+
+    def summarize(summary, turns):
+        transcript = "\n\n".join(_turn_text(turn) for turn in turns)
+        completion = client.chat.completions.create(
+            messages=[
+                {
+                    "role": "system",
+                    "content": "Condense the conversation into a short summary that "
+                    "keeps names, dates, decisions and open questions.",
+                },
+                {
+                    "role": "user",
+                    "content": f"Summary so far: {summary or 'none'}\n\n"
+                    f"New turns:\n{transcript}",
+                },
+            ],
+            model=model,
+            temperature=0,
+            timeout=timeout,
+        )
+        return completion.choices[0].message.content
+
+    return summarize
+
+
+class Conversation:
+    """
+    One chat's prior turns, a running summary of the turns folded out of them, and
+    the tool responses fetched so far keyed on the normalized call. `folded` counts
+    the turns ever folded out, so writers can tell whether the turns moved under
+    them. `fetched` and `reused` count this request's retrievals and are not
+    persisted.
+    """
+
+    def __init__(
+        self, conversation_id, turns=None, summary="", retrievals=None, folded=0
+    ):
+        self.conversation_id = conversation_id
+        self.turns = turns or []
+        self.summary = summary
+        self.retrievals = OrderedDict(retrievals or {})
+        self.folded = folded
+        self._added = []
+        self.fetched = 0
+        self.reused = 0
+        self.summarized = 0
+        self.evicted = 0
+        self._calls = []
+
+    @classmethod
+    def from_dict(cls, conversation_id, data):
+        return cls(
+            conversation_id,
+            data["turns"],
+            data["summary"],
+            [(record["key"], record) for record in data["retrievals"]],
+            data.get("folded", 0),
+        )
+
+    def to_dict(self):
+        return {
+            "turns": self.turns,
+            "summary": self.summary,
+            "retrievals": list(self.retrievals.values()),
+            "folded": self.folded,
+        }
+
+    def history_messages(self):
+        """
+        Returns: chat messages carrying the summary and the prior turns
+        """
+        messages = []
+        if self.summary:
+            messages.append(
+                {
+                    "role": "system",
+                    "content": f"Summary of the earlier conversation: {self.summary}",
+                }
+            )
+        for turn in self.turns:
+            messages.append({"role": "user", "content": turn["question"]})
+            messages.append({"role": "assistant", "content": turn["answer"]})
+        return messages
+
+    def retrieval(self, function_name, request_type, arguments, now=None):
+        """
+        Returns: the stored response of an identical, still fresh call, or None
+        """
+        key = make_key("", function_name, arguments)
+        record = self.retrievals.get(key)
+        now = now if now is not None else time.time()
+        if record is None or now - record["fetched_at"] > CONVERSATION_RETRIEVAL_TTL:
+            return None
+        self.retrievals.move_to_end(key)
+        self.reused += 1
+        self._calls.append((function_name, request_type, arguments))
+        return record["response"]
+
+    def remember(self, function_name, request_type, arguments, response):
+        key = make_key("", function_name, arguments)
+        self.fetched += 1
+        self._calls.append((function_name, request_type, arguments))
+        if isinstance(response, dict) and "error" in response:
+            return
+        self.retrievals[key] = {
+            "key": key,
+            "function": function_name,
+            "request_type": request_type,
+            "arguments": arguments,
+            "response": response,
+            "fetched_at": time.time(),
+        }
+        self.retrievals.move_to_end(key)
+        while len(self.retrievals) > CONVERSATION_MAX_RETRIEVALS:
+            self.retrievals.popitem(last=False)
+
+    def last_calls(self):
+        """
+        Returns: the calls behind the previous answer, for follow-ups that need no
+        new retrieval
+        """
+        if not self.turns:
+            return []
+        return [tuple(call) for call in self.turns[-1].get("calls", [])]
+
+    def add_turn(self, question, answer):
+        turn = {
+            "question": question,
+            "answer": answer,
+            "calls": [list(call) for call in self._calls],
+        }
+        self.turns.append(turn)
+        self._added.append(turn)
+        self._calls = []
+
+    def merge_into(self, stored):
+        """
+        Add this request's turns and retrievals to `stored`, the conversation as
+        another request may have saved it since this one was read.
+        Returns: `stored`
+        """
+        stored.turns += self._added
+        for key, record in self.retrievals.items():
+            current = stored.retrievals.get(key)
+            if current is None or current["fetched_at"] <= record["fetched_at"]:
+                stored.retrievals[key] = record
+                stored.retrievals.move_to_end(key)
+        while len(stored.retrievals) > CONVERSATION_MAX_RETRIEVALS:
+            stored.retrievals.popitem(last=False)
+        return stored
+
+    def history_tokens(self):
+        return count_tokens(self.summary) + sum(
+            count_tokens(_turn_text(turn)) for turn in self.turns
+        )
+
+    def compact(self, summarize=None, budget=CONVERSATION_TOKEN_BUDGET):
+        """
+        Once the history exceeds `budget`, fold the oldest turns (all but the last
+        CONVERSATION_KEEP_TURNS) into the summary until it is back under half the
+        budget. Without `summarize`, or if it fails, those turns are evicted instead.
+        """
+        if self.history_tokens() <= budget:
+            return
+        folded = []
+        while (
+            len(self.turns) > CONVERSATION_KEEP_TURNS
+            and self.history_tokens() > budget // 2
+        ):
+            folded.append(self.turns.pop(0))
+        if not folded:
+            return
+        self.folded += len(folded)
+        if summarize is not None:
+            try:
+                self.summary = summarize(self.summary, folded)
+                self.summarized += len(folded)
+            except Exception as ex:
+                logger.error(f"Conversation summary failed: {ex}")
+                self.evicted += len(folded)
+        else:
+            self.evicted += len(folded)
+        self.summary = truncate_to_tokens(self.summary, budget // 2)
+
+
+class ConversationStore:
+    """
+    Conversations kept server-side in a response cache backend (or a RedisBackend)
+    for CONVERSATION_TTL idle seconds, with counters of how many retrievals follow-up
+    questions reused instead of fetching again.
+
+    A save re-reads the stored conversation and adds the request's turn to it, so
+    concurrent questions in one conversation each keep their turn. Saves within a
+    process are serialized; across processes the stores have no compare-and-set, so
+    two saves landing between each other's read and write still lose one turn.
+    """
+
+    def __init__(self, backend, ttl=CONVERSATION_TTL, budget=CONVERSATION_TOKEN_BUDGET):
+        self.backend = backend
+        self.ttl = ttl
+        self.budget = budget
+        self._counters = {
+            "turns": 0,
+            "retrievals_fetched": 0,
+            "retrievals_reused": 0,
+            "turns_summarized": 0,
+            "turns_evicted": 0,
+        }
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def new_id(self):
+        return secrets.token_urlsafe(16)
+
+    def _read(self, conversation_id):
+        try:
+            value = self.backend.get(conversation_id)
+        except Exception as ex:
+            logger.error(f"Conversation store read failed: {ex}")
+            return None
+        if value is None:
+            return None
+        return Conversation.from_dict(conversation_id, fast_json.loads(value))
+
+    def _write(self, conversation):
+        try:
+            self.backend.set(
+                conversation.conversation_id,
+                fast_json.dumps(conversation.to_dict()),
+                self.ttl,
+            )
+        except Exception as ex:
+            logger.error(f"Conversation store write failed: {ex}")
+
+    def get(self, conversation_id):
+        """
+        Returns: the stored conversation, or a new empty one
+        """
+        return self._read(conversation_id) or Conversation(conversation_id)
+
+    def save(self, conversation, summarize=None):
+        """
+        Add the request's turns and retrievals to the stored conversation. Once its
+        history outgrows the token budget, the oldest turns are folded into the
+        summary on a background thread.
+        Returns: the Future of that compaction, or None
+        """
+        with self._lock:
+            self._counters["turns"] += 1
+            self._counters["retrievals_fetched"] += conversation.fetched
+            self._counters["retrievals_reused"] += conversation.reused
+        with self._write_lock:
+            stored = self._read(conversation.conversation_id)
+            if stored is not None:
+                conversation = conversation.merge_into(stored)
+            self._write(conversation)
+        if conversation.history_tokens() <= self.budget:
+            return None
+        return _summary_executor.submit(
+            self.compact, conversation.conversation_id, summarize
+        )
+
+    def compact(self, conversation_id, summarize=None):
+        """
+        Fold the stored conversation's oldest turns into its summary. The summary is
+        written outside the lock; it is dropped if another compaction got there first.
+        """
+        snapshot = self._read(conversation_id)
+        if snapshot is None:
+            return
+        folded = snapshot.folded
+        with tracing.span("conversation_compact"):
+            snapshot.compact(summarize, self.budget)
+        count = snapshot.folded - folded
+        if not count:
+            return
+        with self._write_lock:
+            stored = self._read(conversation_id)
+            if stored is None or stored.folded != folded:
+                return
+            stored.turns = stored.turns[count:]
+            stored.summary = snapshot.summary
+            stored.folded = snapshot.folded
+            self._write(stored)
+        with self._lock:
+            self._counters["turns_summarized"] += snapshot.summarized
+            self._counters["turns_evicted"] += snapshot.evicted
+
+    def delete(self, conversation_id):
+        try:
+            self.backend.delete(conversation_id)
+        except Exception as ex:
+            logger.error(f"Conversation store delete failed: {ex}")
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        retrievals = counters["retrievals_fetched"] + counters["retrievals_reused"]
+        try:
+            backend_stats = self.backend.stats()
+        except Exception as ex:
+            logger.error(f"Conversation store stats failed: {ex}")
+            backend_stats = {}
+        return dict(
+            backend_stats,
+            backend=self.backend.name,
+            reuse_rate=(
+                counters["retrievals_reused"] / retrievals if retrievals else 0.0
+            ),
+            **counters,
+        )
+
+
+def create_conversation_store(backend=CONVERSATION_BACKEND):
+    if backend == "memory":
+        return ConversationStore(MemoryBackend(CONVERSATION_STORE_MAX_BYTES))
+    if backend == "sqlite":
+        return ConversationStore(
+            SQLiteBackend(CONVERSATION_STORE_PATH, CONVERSATION_STORE_MAX_BYTES)
+        )
+    if backend == "redis":
+        return ConversationStore(RedisBackend(prefix="conversation:"))
+    if backend == "none":
+        return None
+    raise Exception(f"[Conversation Error] Backend not supported: {backend}")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_conversation_store():
+    """
+    Return the process-wide conversation store, or None when CONVERSATION_BACKEND=none
+    (every question is then answered on its own).
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = create_conversation_store()
+    return _store
@@ -0,0 +1,294 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+DISCUSSION_STORE_ENABLED = (
+    os.environ.get("DISCUSSION_STORE_ENABLED", "false").lower() == "true"
+)
+DISCUSSION_STORE_PATH = os.environ.get(
+    "DISCUSSION_STORE_PATH", "discussion_store.sqlite3"
+)
+DEFAULT_LOOKBACK = timedelta(days=7)
+
+_TIMESTAMP_FIELDS = ("ts", "timestamp", "date", "created_at")
+
+
+def parse_timestamp(value):
+    """
+    Accept Slack-style epoch strings ("1700000000.000100"), numbers and ISO 8601.
+    Returns: seconds since the epoch (float) or None
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def format_timestamp(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc).isoformat()
+
+
+def resolve_window(arguments, now=None):
+    """
+    Translate the tool arguments into an epoch (start, end) window. As documented in
+    FUNCTION_CALLING_TOOLS, `from` is the most recent bound (default now) and `to` the
+    oldest one (default 7 days before `from`).
+    """
+    now = now if now is not None else time.time()
+    end = parse_timestamp(arguments.get("from"))
+    end = min(end, now) if end is not None else now
+    start = parse_timestamp(arguments.get("to"))
+    if start is None:
+        start = end - DEFAULT_LOOKBACK.total_seconds()
+    return min(start, end), max(start, end)
+
+
+def _message_timestamp(message):
+    if isinstance(message, dict):
+        for field in _TIMESTAMP_FIELDS:
+            timestamp = parse_timestamp(message.get(field))
+            if timestamp is not None:
+                return timestamp
+    return None
+
+
+def _items(kind, content):
+    if isinstance(content, dict):
+        for thread, messages in content.items():
+            for message in messages if isinstance(messages, list) else [messages]:
+                yield kind, str(thread), message
+    elif isinstance(content, list):
+        for message in content:
+            yield kind, "", message
+    elif content:
+        yield kind, "", content
+
+
+def subtract_ranges(start, end, covered):
+    """
+    Returns: the parts of [start, end] not covered by the sorted `covered` intervals
+    """
+    missing = []
+    cursor = start
+    for covered_start, covered_end in covered:
+        if covered_end < cursor:
+            continue
+        if covered_start > end:
+            break
+        if covered_start > cursor:
+            missing.append((cursor, covered_start))
+        cursor = max(cursor, covered_end)
+        if cursor >= end:
+            break
+    if cursor < end:
+        missing.append((cursor, end))
+    return missing
+
+
+class DiscussionStore:
+    """
+    Local SQLite mirror of discussion contents and thread contents.
+    Messages are indexed by (scope, discussion_id, timestamp); the time ranges already
+    mirrored are tracked as coverage intervals so only missing ranges hit the API.
+    Payloads without per-message timestamps are stored as one row spanning the window.
+    """
+
+    def __init__(self, path=DISCUSSION_STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.ranges_fetched = 0
+        self.queries = 0
+        self.queries_served_locally = 0
+        with self._connection() as conn:
+            conn.executescript(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "scope TEXT NOT NULL, discussion_id TEXT NOT NULL, kind TEXT NOT NULL, "
+                "thread TEXT, ts_start REAL NOT NULL, ts_end REAL NOT NULL, "
+                "payload TEXT NOT NULL, "
+                "UNIQUE (scope, discussion_id, kind, thread, ts_start, payload));"
+                "CREATE INDEX IF NOT EXISTS messages_time "
+                "ON messages (scope, discussion_id, ts_end, ts_start);"
+                "CREATE TABLE IF NOT EXISTS coverage ("
+                "scope TEXT NOT NULL, discussion_id TEXT NOT NULL, "
+                "ts_start REAL NOT NULL, ts_end REAL NOT NULL);"
+                "CREATE INDEX IF NOT EXISTS coverage_discussion "
+                "ON coverage (scope, discussion_id, ts_start);"
+            )
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def coverage(self, scope, discussion_id):
+        return (
+            self._connection()
+            .execute(
+                "SELECT ts_start, ts_end FROM coverage "
+                "WHERE scope = ? AND discussion_id = ? ORDER BY ts_start",
+                (scope, str(discussion_id)),
+            )
+            .fetchall()
+        )
+
+    def watermark(self, scope, discussion_id):
+        """
+        Returns: the most recent mirrored timestamp of the discussion, or None
+        """
+        (watermark,) = (
+            self._connection()
+            .execute(
+                "SELECT MAX(ts_end) FROM coverage WHERE scope = ? AND discussion_id = ?",
+                (scope, str(discussion_id)),
+            )
+            .fetchone()
+        )
+        return watermark
+
+    def missing_ranges(self, scope, discussion_id, start, end):
+        return subtract_ranges(start, end, self.coverage(scope, discussion_id))
+
+    def add(self, scope, discussion_id, start, end, payload):
+        discussion_id = str(discussion_id)
+        rows = []
+        for field in ("discussion_content", "thread_contents"):
+            for kind, thread, message in _items(field, (payload or {}).get(field)):
+                timestamp = _message_timestamp(message)
+                ts_start, ts_end = (
+                    (timestamp, timestamp) if timestamp is not None else (start, end)
+                )
+                rows.append(
+                    (
+                        scope,
+                        discussion_id,
+                        kind,
+                        thread,
+                        ts_start,
+                        ts_end,
+                        json.dumps(message, sort_keys=True),
+                    )
+                )
+
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR IGNORE INTO messages VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            intervals = conn.execute(
+                "SELECT ts_start, ts_end FROM coverage "
+                "WHERE scope = ? AND discussion_id = ? ORDER BY ts_start",
+                (scope, discussion_id),
+            ).fetchall()
+            merged = []
+            for interval_start, interval_end in sorted(intervals + [(start, end)]):
+                if merged and interval_start <= merged[-1][1]:
+                    merged[-1][1] = max(merged[-1][1], interval_end)
+                else:
+                    merged.append([interval_start, interval_end])
+            conn.execute(
+                "DELETE FROM coverage WHERE scope = ? AND discussion_id = ?",
+                (scope, discussion_id),
+            )
+            conn.executemany(
+                "INSERT INTO coverage VALUES (?, ?, ?, ?)",
+                [(scope, discussion_id, s, e) for s, e in merged],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def query(self, scope, discussion_id, start, end):
+        """
+        Answer a time range from the mirror using the time index.
+        Returns: {"discussion_content": [...], "thread_contents": {thread: [...]}}
+        """
+        rows = self._connection().execute(
+            "SELECT kind, thread, payload FROM messages "
+            "WHERE scope = ? AND discussion_id = ? AND ts_end >= ? AND ts_start <= ? "
+            "ORDER BY ts_start",
+            (scope, str(discussion_id), start, end),
+        )
+        result = {"discussion_content": [], "thread_contents": {}}
+        for kind, thread, payload in rows:
+            message = json.loads(payload)
+            if kind == "thread_contents":
+                result["thread_contents"].setdefault(thread, []).append(message)
+            else:
+                result["discussion_content"].append(message)
+        return result
+
+    def get(self, scope, discussion_id, start, end, fetch):
+        """
+        Fetch only the missing parts of [start, end] with `fetch(start, end)`, which
+        returns (data, success) like the provider methods, then answer from the mirror.
+        """
+        missing = self.missing_ranges(scope, discussion_id, start, end)
+        for missing_start, missing_end in missing:
+            data, success = fetch(missing_start, missing_end)
+            if not success:
+                return data, False
+            self.add(scope, discussion_id, missing_start, missing_end, data)
+        return self.answer(scope, discussion_id, start, end, len(missing)), True
+
+    def answer(self, scope, discussion_id, start, end, ranges_fetched):
+        with self._lock:
+            self.queries += 1
+            self.ranges_fetched += ranges_fetched
+            self.queries_served_locally += not ranges_fetched
+        logger.debug(
+            f"Discussion {discussion_id}: fetched {ranges_fetched} missing range(s)"
+        )
+        return self.query(scope, discussion_id, start, end)
+
+    def stats(self):
+        (messages,) = (
+            self._connection().execute("SELECT COUNT(*) FROM messages").fetchone()
+        )
+        with self._lock:
+            return {
+                "messages": messages,
+                "queries": self.queries,
+                "queries_served_locally": self.queries_served_locally,
+                "ranges_fetched": self.ranges_fetched,
+            }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_discussion_store():
+    """
+    Return the process-wide discussion mirror, or None unless DISCUSSION_STORE_ENABLED=true.
+    """
+    global _store
+    if not DISCUSSION_STORE_ENABLED:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = DiscussionStore()
+    return _store
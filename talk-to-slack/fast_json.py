@@ -0,0 +1,46 @@
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+FAST_JSON_ENABLED = os.environ.get("FAST_JSON_ENABLED", "true").lower() == "true"
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = "orjson" if FAST_JSON_ENABLED and orjson is not None else "json"
+
+
+def loads(data, backend=None):
+    """
+    Decode JSON from bytes or str, with orjson when it is installed.
+    """
+    if (backend or BACKEND) == "orjson":
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(data, backend=None):
+    """
+    Encode compactly (no whitespace, non-ASCII kept, unknown types via str()).
+    Returns: str
+    """
+    if (backend or BACKEND) == "orjson":
+        return orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS).decode(
+            "utf-8"
+        )
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def decode_response(response):
+    """
+    Decode a requests/httpx response body without the library's charset
+    detection; falls back to `response.json()` when there is no raw body.
+    """
+    content = response.content
+    if isinstance(content, (bytes, str)):
+        return loads(content)
+    return response.json()
@@ -0,0 +1,240 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+logger = logging.getLogger(__name__)
+
+POOL_CONNECTIONS = int(os.environ.get("HTTP_POOL_CONNECTIONS", "10"))
+POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", "32"))
+POOL_BLOCK = os.environ.get("HTTP_POOL_BLOCK", "false").lower() == "true"
+CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", "30"))
+KEEP_ALIVE = os.environ.get("HTTP_KEEP_ALIVE", "true").lower() == "true"
+KEEP_ALIVE_EXPIRY = float(os.environ.get("HTTP_KEEP_ALIVE_EXPIRY", "30"))
+HTTP2 = os.environ.get("HTTP_HTTP2", "true").lower() == "true"
+
+
+class PoolStats:
+    """
+    Thread-safe counters of connection pool usage.
+    A hit is a request served on an already open connection, a miss is a request
+    that had to open a new one (TCP + TLS handshake).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_new_connection(self):
+        with self._lock:
+            self.new_connections += 1
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.new_connections = 0
+
+    def snapshot(self):
+        with self._lock:
+            misses = min(self.new_connections, self.requests)
+            hits = self.requests - misses
+            return {
+                "requests": self.requests,
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / self.requests if self.requests else 0.0,
+            }
+
+
+pool_stats = PoolStats()
+
+
+class _CountingConnectionMixin:
+    def connect(self):
+        pool_stats.record_new_connection()
+        return super().connect()
+
+
+class CountingHTTPConnection(_CountingConnectionMixin, HTTPConnection):
+    pass
+
+
+class CountingHTTPSConnection(_CountingConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _CountingPoolMixin:
+    def _get_conn(self, timeout=None):
+        pool_stats.record_request()
+        return super()._get_conn(timeout=timeout)
+
+
+class CountingHTTPConnectionPool(_CountingPoolMixin, HTTPConnectionPool):
+    ConnectionCls = CountingHTTPConnection
+
+
+class CountingHTTPSConnectionPool(_CountingPoolMixin, HTTPSConnectionPool):
+    ConnectionCls = CountingHTTPSConnection
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": CountingHTTPConnectionPool,
+            "https": CountingHTTPSConnectionPool,
+        }
+
+
+_deadline = contextvars.ContextVar("http_deadline", default=None)
+
+
+@contextmanager
+def deadline(seconds):
+    """
+    Cap the timeouts of the pooled session's calls made in this context (and in
+    contexts copied from it) so none outlives `seconds` from now.
+    """
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def time_left():
+    """
+    Returns: seconds until the current deadline, or None when there is none
+    """
+    current = _deadline.get()
+    return None if current is None else current - time.monotonic()
+
+
+def capped_timeout(timeout):
+    """
+    Returns: `timeout` (seconds or (connect, read)) cut to the time left before the
+    current deadline
+    Raises: requests.Timeout when the deadline has passed
+    """
+    left = time_left()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise requests.Timeout("Deadline passed before the request was sent")
+    if isinstance(timeout, tuple):
+        return tuple(left if part is None else min(part, left) for part in timeout)
+    return left if timeout is None else min(timeout, left)
+
+
+class PooledSession(requests.Session):
+    """
+    requests.Session that applies a default (connect, read) timeout to every call,
+    cut short by the current `deadline`.
+    """
+
+    def __init__(self, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs["timeout"] = capped_timeout(kwargs.get("timeout", self.timeout))
+        return super().request(method, url, **kwargs)
+
+
+def create_session(
+    pool_connections=POOL_CONNECTIONS,
+    pool_maxsize=POOL_MAXSIZE,
+    pool_block=POOL_BLOCK,
+    timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+    keep_alive=KEEP_ALIVE,
+):
+    session = PooledSession(timeout=timeout)
+    adapter = PooledHTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        pool_block=pool_block,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if not keep_alive:
+        session.headers["Connection"] = "close"
+    return session
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Return the process-wide pooled session shared by the provider and the Flask routes.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+                logger.debug(
+                    f"Created HTTP session pool (connections={POOL_CONNECTIONS}, "
+                    f"maxsize={POOL_MAXSIZE}, keep_alive={KEEP_ALIVE})"
+                )
+    return _session
+
+
+def close_session():
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def http2_available():
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def create_async_client(
+    pool_maxsize=POOL_MAXSIZE,
+    timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+    keep_alive=KEEP_ALIVE,
+    http2=HTTP2,
+):
+    """
+    Create an httpx.AsyncClient with the same pool settings as the sync session.
+    HTTP/2 is negotiated when enabled and the optional `h2` package is installed.
+    An async client is bound to the event loop it is used on, so callers own its lifetime.
+    """
+    connect_timeout, read_timeout = timeout
+    limits = httpx.Limits(
+        max_connections=pool_maxsize,
+        max_keepalive_connections=pool_maxsize if keep_alive else 0,
+        keepalive_expiry=KEEP_ALIVE_EXPIRY,
+    )
+    return httpx.AsyncClient(
+        limits=limits,
+        timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+        http2=http2 and http2_available(),
+        verify=False,
+    )
+
+
+def stats():
+    return pool_stats.snapshot()
@@ -0,0 +1,241 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+
+from provider import INGEST_CONCURRENCY, INGEST_MAX_RETRIES
+
+logger = logging.getLogger(__name__)
+
+# Characters per memorized chunk; documents are split on paragraph boundaries.
+INGEST_CHUNK_SIZE = int(os.environ.get("INGEST_CHUNK_SIZE", "8000"))
+
+
+def read_jsonl(lines, source):
+    """
+    Parse documents JSONL: one {"content": ..., "name": ...} object per line. The
+    name defaults to `source:line`; blank lines are skipped.
+    Yields: (name, content)
+    """
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        yield str(record.get("name") or f"{source}:{number}"), record["content"]
+
+
+def read_file(path):
+    if path.endswith(".jsonl"):
+        with open(path) as lines:
+            yield from read_jsonl(lines, path)
+    else:
+        with open(path, errors="replace") as file:
+            yield path, file.read()
+
+
+def read_documents(paths):
+    """
+    Read documents one file at a time: `.jsonl` files hold one document per line,
+    other files are one document each, directories are walked in sorted order
+    (skipping hidden entries) and "-" reads JSONL from stdin.
+    Yields: (name, content)
+    """
+    for path in paths:
+        if path == "-":
+            yield from read_jsonl(sys.stdin, "stdin")
+        elif os.path.isdir(path):
+            for root, directories, files in os.walk(path):
+                directories[:] = sorted(d for d in directories if not d.startswith("."))
+                for file in sorted(files):
+                    if not file.startswith("."):
+                        yield from read_file(os.path.join(root, file))
+        else:
+            yield from read_file(path)
+
+
+def split_content(content, chunk_size):
+    """
+    Returns: `content` cut into pieces of at most `chunk_size` characters, on
+    paragraph boundaries where possible
+    """
+    chunks, current = [], ""
+    for paragraph in content.split("\n\n"):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        while len(paragraph) > chunk_size:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(paragraph[:chunk_size])
+            paragraph = paragraph[chunk_size:]
+        if current and len(current) + 2 + len(paragraph) > chunk_size:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def chunk_document(name, content, chunk_size=INGEST_CHUNK_SIZE):
+    """
+    Returns: [(name, chunk)], numbering the names when there are several chunks
+    """
+    chunks = split_content(content, chunk_size)
+    if len(chunks) == 1:
+        return [(name, chunks[0])]
+    return [
+        (f"{name} ({index}/{len(chunks)})", chunk)
+        for index, chunk in enumerate(chunks, start=1)
+    ]
+
+
+def content_hash(content):
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def read_journal(path):
+    """
+    Returns: hashes of the chunks an earlier run memorized
+    """
+    memorized = set()
+    if not os.path.exists(path):
+        return memorized
+    with open(path) as journal:
+        for line in journal:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A line cut short when the previous run was killed.
+                continue
+            if record.get("status") == "memorized":
+                memorized.add(record["hash"])
+    return memorized
+
+
+def run_ingest(
+    provider,
+    documents,
+    journal,
+    concurrency=INGEST_CONCURRENCY,
+    chunk_size=INGEST_CHUNK_SIZE,
+    max_retries=INGEST_MAX_RETRIES,
+    done=(),
+):
+    """
+    Chunk `documents`, drop chunks already memorized (`done`) or seen earlier in
+    the run, and memorize the rest, appending one JSON line per chunk to `journal`
+    as each completes so the file doubles as the resume journal.
+    Returns: the throughput report
+    """
+    report = {
+        "documents": 0,
+        "chunks": 0,
+        "memorized": 0,
+        "errors": 0,
+        "retries": 0,
+        "duplicates": 0,
+        "skipped": 0,
+        "bytes": 0,
+    }
+    seen = set()
+
+    def pending():
+        for name, content in documents:
+            report["documents"] += 1
+            for chunk_name, chunk in chunk_document(name, content, chunk_size):
+                digest = content_hash(chunk)
+                if digest in done:
+                    report["skipped"] += 1
+                    continue
+                if digest in seen:
+                    report["duplicates"] += 1
+                    continue
+                seen.add(digest)
+                report["chunks"] += 1
+                report["bytes"] += len(chunk.encode("utf-8"))
+                yield digest, chunk_name, chunk
+
+    started = time.perf_counter()
+    for result in provider.memorize_batch(
+        pending(), concurrency=concurrency, max_retries=max_retries
+    ):
+        entry = {"hash": result["id"], "name": result["name"], "status": "memorized"}
+        if "error" in result:
+            entry.update(status="error", error=result["error"])
+        journal.write(json.dumps(entry) + "\n")
+        journal.flush()
+        report["retries"] += result["attempts"] - 1
+        report["errors" if "error" in result else "memorized"] += 1
+    elapsed = time.perf_counter() - started
+
+    report.update(
+        {
+            "seconds": round(elapsed, 3),
+            "documents_per_second": (
+                round(report["documents"] / elapsed, 3) if elapsed else 0.0
+            ),
+            "chunks_per_second": (
+                round(report["chunks"] / elapsed, 3) if elapsed else 0.0
+            ),
+        }
+    )
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Memorize files, directories or documents JSONL in Rememberizer."
+    )
+    parser.add_argument(
+        "inputs",
+        nargs="+",
+        help='files, directories or documents JSONL ("-" for stdin)',
+    )
+    parser.add_argument(
+        "-j",
+        "--journal",
+        required=True,
+        help="progress JSONL; rerunning with the same file skips memorized chunks",
+    )
+    parser.add_argument("--concurrency", type=int, default=INGEST_CONCURRENCY)
+    parser.add_argument("--chunk-size", type=int, default=INGEST_CHUNK_SIZE)
+    parser.add_argument("--max-retries", type=int, default=INGEST_MAX_RETRIES)
+    parser.add_argument(
+        "--access-token",
+        default=os.environ.get("REMEMBERIZER_ACCESS_TOKEN"),
+        help="Rememberizer access token (default: $REMEMBERIZER_ACCESS_TOKEN)",
+    )
+    args = parser.parse_args(argv)
+    if not args.access_token:
+        parser.error("--access-token or REMEMBERIZER_ACCESS_TOKEN is required")
+
+    # Imported here so --help works without the app's configuration.
+    from app import make_provider
+
+    logging.getLogger().setLevel(logging.INFO)
+    provider = make_provider(args.access_token)
+    done = read_journal(args.journal)
+    if done:
+        logger.info(f"Resuming: {len(done)} chunks already memorized")
+
+    with open(args.journal, "a") as journal:
+        report = run_ingest(
+            provider,
+            read_documents(args.inputs),
+            journal,
+            concurrency=args.concurrency,
+            chunk_size=args.chunk_size,
+            max_retries=args.max_retries,
+            done=done,
+        )
+    json.dump(report, sys.stderr, indent=2)
+    sys.stderr.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,482 @@
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+from context_builder import extract_passages
+from semantic_cache import HashingEmbedder
+
+logger = logging.getLogger(__name__)
+
+# off: never used; fallback: answer locally only when the remote search fails;
+# local_first: answer locally when confident and fill the rest from the remote search.
+LOCAL_INDEX_MODE = os.environ.get("LOCAL_INDEX_MODE", "off")
+LOCAL_INDEX_PATH = os.environ.get("LOCAL_INDEX_PATH", "local_index")
+LOCAL_INDEX_DIM = int(os.environ.get("LOCAL_INDEX_DIM", "512"))
+LOCAL_INDEX_DTYPE = os.environ.get("LOCAL_INDEX_DTYPE", "float16")
+LOCAL_INDEX_NLIST = int(os.environ.get("LOCAL_INDEX_NLIST", "256"))
+LOCAL_INDEX_NPROBE = int(os.environ.get("LOCAL_INDEX_NPROBE", "8"))
+LOCAL_INDEX_MIN_SCORE = float(os.environ.get("LOCAL_INDEX_MIN_SCORE", "0.5"))
+LOCAL_INDEX_MIN_TRAIN = 256
+LOCAL_INDEX_MODES = ("fallback", "local_first")
+
+
+def recall(local_results, remote_results):
+    """
+    Share of the remote chunks that the local index also returned.
+    """
+    remote = {item.get("matched_content") for item in remote_results}
+    if not remote:
+        return None
+    local = {item.get("matched_content") for item in local_results}
+    return len(remote & local) / len(remote)
+
+
+def _kmeans(vectors, k, iterations=10, seed=0):
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        for cluster in range(k):
+            members = vectors[assignments == cluster]
+            if len(members):
+                centroids[cluster] = members.mean(axis=0)
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        centroids /= np.where(norms == 0, 1, norms)
+    return centroids
+
+
+class LocalIndex:
+    """
+    On-disk approximate nearest-neighbour index of knowledge chunks.
+    Embeddings live in a memory-mapped float16/float32 matrix that doubles in size as
+    it fills; chunk text and metadata live in SQLite. Once enough chunks are stored an
+    inverted-file (IVF) index is trained with spherical k-means, and queries only score
+    the chunks of the `nprobe` nearest lists. Chunks are isolated per scope. Training
+    that `add` triggers runs on a background thread, so the request that crossed the
+    threshold does not wait for k-means; searches use the previous lists meanwhile.
+
+    Several processes (gunicorn workers) may share one path: rows are numbered and
+    the matrix is grown only inside a write transaction, which serializes writers,
+    and each process remaps the matrix and reloads the centroids when another
+    process has grown or retrained them.
+    """
+
+    def __init__(
+        self,
+        path=LOCAL_INDEX_PATH,
+        dim=LOCAL_INDEX_DIM,
+        dtype=LOCAL_INDEX_DTYPE,
+        nlist=LOCAL_INDEX_NLIST,
+        nprobe=LOCAL_INDEX_NPROBE,
+        mode=LOCAL_INDEX_MODE,
+        min_score=LOCAL_INDEX_MIN_SCORE,
+        embedder=None,
+    ):
+        if mode not in LOCAL_INDEX_MODES:
+            raise Exception(f"[Local Index Error] Mode not supported: {mode}")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.mode = mode
+        self.min_score = min_score
+        self.embedder = embedder or HashingEmbedder(dim=dim)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(
+            os.path.join(path, "chunks.sqlite3"),
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "row INTEGER PRIMARY KEY, scope TEXT NOT NULL, text TEXT NOT NULL, "
+            "source TEXT, timestamp TEXT, list_id INTEGER NOT NULL DEFAULT -1, "
+            "UNIQUE (scope, text));"
+            "CREATE INDEX IF NOT EXISTS chunks_scope_list ON chunks (scope, list_id);"
+        )
+        self.size = self._stored_rows()
+        self._vectors_path = os.path.join(path, f"vectors.{self.dtype.name}")
+        self._centroids_path = os.path.join(path, "centroids.npy")
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._vectors = self._open_vectors(max(self.size, 1024))
+        finally:
+            self._conn.execute("COMMIT")
+        self.centroids = None
+        self._centroids_mtime = None
+        self._refresh_centroids()
+        self._trained_size = self.size if self.centroids is not None else 0
+        self._training = None
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.served_locally = 0
+        self.filled_remotely = 0
+        self.fallbacks = 0
+        self.recall_samples = 0
+        self.recall_total = 0.0
+
+    def _stored_rows(self):
+        (rows,) = self._conn.execute(
+            "SELECT COALESCE(MAX(row) + 1, 0) FROM chunks"
+        ).fetchone()
+        return rows
+
+    def _refresh_centroids(self):
+        """
+        Load the centroids when another process (or this one) saved new ones.
+        """
+        try:
+            mtime = os.stat(self._centroids_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self._centroids_mtime:
+            self.centroids = np.load(self._centroids_path)
+            self._centroids_mtime = mtime
+
+    def _covering(self, rows):
+        """
+        Remap the matrix if another process grew it past `rows`.
+        Returns: whether the matrix now covers `rows` rows
+        """
+        if rows > len(self._vectors):
+            self._vectors = self._open_vectors(0)
+        return rows <= len(self._vectors)
+
+    def _open_vectors(self, capacity):
+        """
+        Map the matrix with at least `capacity` rows. Growing the file must happen
+        inside a write transaction so that processes never truncate concurrently.
+        """
+        row_bytes = self.dim * self.dtype.itemsize
+        existing = (
+            os.path.getsize(self._vectors_path) // row_bytes
+            if os.path.exists(self._vectors_path)
+            else 0
+        )
+        if existing < capacity:
+            with open(self._vectors_path, "ab") as vectors:
+                vectors.truncate(capacity * row_bytes)
+        return np.memmap(
+            self._vectors_path,
+            dtype=self.dtype,
+            mode="r+",
+            shape=(max(existing, capacity), self.dim),
+        )
+
+    def _nearest_list(self, vectors):
+        if self.centroids is None:
+            return np.full(len(vectors), -1)
+        return np.argmax(vectors @ self.centroids.T, axis=1)
+
+    def add(self, scope, passages):
+        """
+        Index passages (objects with text/source/timestamp, see context_builder.Passage);
+        chunks already stored for the scope are skipped.
+        Returns: number of chunks added
+        """
+        passages = [passage for passage in passages if passage.text]
+        if not passages:
+            return 0
+        vectors = [self.embedder.embed(passage.text) for passage in passages]
+        with self._lock:
+            added = 0
+            self._refresh_centroids()
+            # Rows become visible to other processes only once their vectors are
+            # written.
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Read under the write lock, so it includes other processes' rows.
+                row = self._stored_rows()
+                for passage, vector in zip(passages, vectors):
+                    cursor = self._conn.execute(
+                        "INSERT OR IGNORE INTO chunks "
+                        "(row, scope, text, source, timestamp) VALUES (?, ?, ?, ?, ?)",
+                        (row, scope, passage.text, passage.source, passage.timestamp),
+                    )
+                    if not cursor.rowcount:
+                        continue
+                    if row >= len(self._vectors):
+                        self._vectors.flush()
+                        self._vectors = self._open_vectors(
+                            max(row + 1, len(self._vectors) * 2)
+                        )
+                    self._vectors[row] = vector
+                    list_id = int(self._nearest_list(vector[None, :])[0])
+                    if list_id >= 0:
+                        self._conn.execute(
+                            "UPDATE chunks SET list_id = ? WHERE row = ?",
+                            (list_id, row),
+                        )
+                    row += 1
+                    added += 1
+                self.size = row
+                self._vectors.flush()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            if self.size >= max(LOCAL_INDEX_MIN_TRAIN, 2 * self._trained_size):
+                self._train_in_background()
+            return added
+
+    def add_response(self, scope, response):
+        return self.add(scope, extract_passages(response))
+
+    def add_document(self, scope, name, contents):
+        """
+        Index mirrored document contents (strings, e.g. from iter_document_contents),
+        one chunk per paragraph.
+        """
+        passages = []
+        for content in contents:
+            for passage in extract_passages({"content": content}):
+                passage.source = name
+                passages.append(passage)
+        return self.add(scope, passages)
+
+    def _train_in_background(self):
+        with self._lock:
+            if self._training is not None and self._training.is_alive():
+                return
+            self._training = threading.Thread(
+                target=self._train_logged, name="local-index-train", daemon=True
+            )
+            self._training.start()
+
+    def _train_logged(self):
+        try:
+            self.train()
+        except Exception as ex:
+            logger.error(f"Training the local index failed: {ex}")
+
+    def wait_for_training(self, timeout=None):
+        """
+        Block until a background training started by `add` has finished.
+        """
+        training = self._training
+        if training is not None:
+            training.join(timeout)
+
+    def train(self):
+        """
+        (Re)build the IVF lists from the stored vectors. k-means runs on a sample
+        without holding the lock; only the swap to the new lists does.
+        """
+        with self._lock:
+            size = self._stored_rows()
+            if size < LOCAL_INDEX_MIN_TRAIN or not self._covering(size):
+                return
+            nlist = min(self.nlist, max(1, int(math.sqrt(size))))
+            rows = np.arange(size)
+            if size > 50 * nlist:
+                rng = np.random.default_rng(0)
+                rows = np.sort(rng.choice(size, 50 * nlist, replace=False))
+            sample = np.asarray(self._vectors[rows], dtype=np.float32)
+            vectors = self._vectors
+        centroids = _kmeans(sample, nlist)
+        # Assigned against the mapping taken above; it stays valid as the file grows.
+        assignments = [
+            np.argmax(
+                np.asarray(vectors[start : start + 8192], dtype=np.float32)
+                @ centroids.T,
+                axis=1,
+            )
+            for start in range(0, size, 8192)
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.size = self._stored_rows()
+                if not self._covering(self.size):
+                    self._conn.execute("ROLLBACK")
+                    return
+                # Rows added while k-means ran were listed with the old centroids.
+                added = np.asarray(self._vectors[size : self.size], dtype=np.float32)
+                assignments.append(np.argmax(added @ centroids.T, axis=1))
+                # Replaced atomically so other processes never load a partial file.
+                partial = f"{self._centroids_path}.{os.getpid()}"
+                with open(partial, "wb") as saved:
+                    np.save(saved, centroids)
+                os.replace(partial, self._centroids_path)
+                self._centroids_mtime = os.stat(self._centroids_path).st_mtime_ns
+                self._conn.executemany(
+                    "UPDATE chunks SET list_id = ? WHERE row = ?",
+                    [
+                        (int(list_id), row)
+                        for row, list_id in enumerate(np.concatenate(assignments))
+                    ],
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self.centroids = centroids
+            self._trained_size = self.size
+        logger.debug(f"Trained local index with {nlist} lists on {self.size} chunks")
+
+    def search(self, scope, query, n=5):
+        """
+        Returns: search-style results ({"matched_content", "document", "distance"}),
+        best match first
+        """
+        started = time.perf_counter()
+        vector = self.embedder.embed(query)
+        with self._lock:
+            self._refresh_centroids()
+            if self.centroids is not None:
+                probes = np.argsort(-(self.centroids @ vector))[: self.nprobe]
+                placeholders = ",".join("?" * len(probes))
+                rows = self._conn.execute(
+                    f"SELECT row, text, source, timestamp FROM chunks "
+                    f"WHERE scope = ? AND list_id IN ({placeholders})",
+                    [scope, *[int(probe) for probe in probes]],
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT row, text, source, timestamp FROM chunks WHERE scope = ?",
+                    (scope,),
+                ).fetchall()
+            if rows and not self._covering(max(row[0] for row in rows) + 1):
+                # Written by another process past this process's view of the file.
+                rows = [row for row in rows if row[0] < len(self._vectors)]
+            if rows:
+                candidates = np.asarray(
+                    self._vectors[[row[0] for row in rows]], dtype=np.float32
+                )
+                scores = candidates @ vector
+            else:
+                scores = np.zeros(0)
+        top = np.argsort(-scores)[:n]
+        results = [
+            {
+                "matched_content": rows[i][1],
+                "document": {"name": rows[i][2], "modified_time": rows[i][3]},
+                "distance": float(scores[i]),
+            }
+            for i in top
+        ]
+        with self._lock:
+            self.queries += 1
+            self.query_seconds += time.perf_counter() - started
+        return results
+
+    def lookup(self, scope, arguments):
+        """
+        Search the index for the `q`/`n` arguments of a search tool call.
+        Returns: (local results, answer) where answer is the search payload when the
+        local matches alone can serve the call in local_first mode, else None
+        """
+        query = arguments.get("q") or ""
+        n = int(arguments.get("n") or 5)
+        local = self.search(scope, query, n) if query else []
+        if self.mode == "local_first":
+            confident = [item for item in local if item["distance"] >= self.min_score]
+            if len(confident) >= n:
+                with self._lock:
+                    self.served_locally += 1
+                return local, {"data": confident}
+        return local, None
+
+    def resolve(self, scope, arguments, local, data, success):
+        """
+        Combine the local results from `lookup` with the remote search response:
+        index and score the remote chunks, fill a local_first answer with them, or
+        answer from the index when the remote search failed.
+
+        Local scores come from the hashing embedder and remote ones from
+        Rememberizer's, so they are not comparable: a local_first answer ranks each
+        source on its own, confident local matches before remote ones, and replaces
+        `distance` with that rank (1.0 for the first, falling towards 0) so that
+        sorting by score downstream keeps the order. The source's own score is kept
+        as `source_distance`.
+        Returns: data (dict), success (bool)
+        """
+        if not success:
+            if not local:
+                return data, False
+            with self._lock:
+                self.fallbacks += 1
+            logger.warning("Remote search failed, answering from the local index")
+            return {"data": local}, True
+
+        remote = data.get("data") if isinstance(data, dict) else None
+        if not isinstance(remote, list):
+            return data, success
+        if local:
+            self.record_recall(local, remote)
+        self.add_response(scope, data)
+        if self.mode != "local_first":
+            return data, success
+
+        n = int(arguments.get("n") or 5)
+        ranked = [item for item in local if item["distance"] >= self.min_score]
+        seen = {item["matched_content"] for item in ranked}
+        for item in sorted(remote, key=lambda item: -(item.get("distance") or 0)):
+            if len(ranked) >= n:
+                break
+            if item.get("matched_content") not in seen:
+                ranked.append(item)
+                seen.add(item.get("matched_content"))
+        results = [
+            dict(
+                item,
+                distance=1 - rank / len(ranked),
+                source_distance=item.get("distance"),
+            )
+            for rank, item in enumerate(ranked)
+        ]
+        with self._lock:
+            self.filled_remotely += 1
+        return dict(data, data=results), success
+
+    def record_recall(self, local_results, remote_results):
+        value = recall(local_results, remote_results)
+        if value is None:
+            return
+        with self._lock:
+            self.recall_samples += 1
+            self.recall_total += value
+
+    def stats(self):
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "chunks": self.size,
+                "lists": 0 if self.centroids is None else len(self.centroids),
+                "queries": self.queries,
+                "avg_query_ms": (
+                    1000 * self.query_seconds / self.queries if self.queries else 0.0
+                ),
+                "served_locally": self.served_locally,
+                "filled_remotely": self.filled_remotely,
+                "fallbacks": self.fallbacks,
+                "recall": (
+                    self.recall_total / self.recall_samples
+                    if self.recall_samples
+                    else None
+                ),
+            }
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_local_index():
+    """
+    Return the process-wide local index, or None when LOCAL_INDEX_MODE=off.
+    """
+    global _index
+    if LOCAL_INDEX_MODE == "off":
+        return None
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = LocalIndex()
+    return _index
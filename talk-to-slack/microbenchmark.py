@@ -0,0 +1,169 @@
+import argparse
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+import fast_json
+from benchmark import filler_text
+from results import parse_results, render_results
+
+
+def search_payload(matches, chunk_bytes):
+    """
+    A `search` response shaped like Rememberizer's, with the nested document and
+    integration metadata that the prompt never uses.
+    """
+    return {
+        "data": [
+            {
+                "chunk_id": f"chunk-{index}",
+                "document": {
+                    "id": index,
+                    "document_id": f"doc-{index}",
+                    "name": f"channel-{index % 20}",
+                    "type": "slack",
+                    "path": f"/slack/channel-{index % 20}",
+                    "url": f"https://slack.example/archives/{index}",
+                    "size": chunk_bytes * 10,
+                    "created_time": "2024-05-01T10:00:00Z",
+                    "modified_time": "2024-05-02T10:00:00Z",
+                    "indexed_on": "2024-05-02T10:05:00Z",
+                    "integration": {
+                        "id": 9,
+                        "integration_type": "slack",
+                        "integration_step": "done",
+                        "source": "workspace",
+                        "document_stats": {"status": {"indexed": 100}, "total_size": 1},
+                    },
+                },
+                "matched_content": filler_text(chunk_bytes),
+                "distance": round(random.uniform(0.5, 0.9), 4),
+            }
+            for index in range(matches)
+        ],
+        "message": "ok",
+        "code": None,
+    }
+
+
+def discussion_payload(messages, message_bytes):
+    threads = {
+        f"17000000{index:02d}.000100": [
+            {
+                "user_name": f"user-{reply}",
+                "text": filler_text(message_bytes),
+                "timestamp": f"17000001{reply:02d}.000100",
+            }
+            for reply in range(3)
+        ]
+        for index in range(messages // 4)
+    }
+    return {
+        "discussion_content": [
+            {
+                "user_name": f"user-{index % 7}",
+                "text": filler_text(message_bytes),
+                "timestamp": f"17000000{index:02d}.000100",
+                "reactions": [{"name": "thumbsup", "count": 2}],
+            }
+            for index in range(messages)
+        ],
+        "thread_contents": threads,
+    }
+
+
+def _time(function, repeat):
+    """
+    Returns: median CPU microseconds per call
+    """
+    samples = []
+    for _ in range(repeat):
+        started = time.process_time()
+        function()
+        samples.append(time.process_time() - started)
+    samples.sort()
+    return round(samples[len(samples) // 2] * 1e6, 1)
+
+
+def _retained_bytes(build):
+    """
+    Returns: bytes still allocated by the object `build()` returns
+    """
+    gc.collect()
+    tracemalloc.start()
+    retained = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del retained
+    return current
+
+
+def measure(name, payload, repeat):
+    raw = json.dumps(payload).encode("utf-8")
+    data = json.loads(raw)
+    report = {
+        "payload_bytes": len(raw),
+        "decode_us": {"json": _time(lambda: json.loads(raw), repeat)},
+        "prompt_us": {
+            "dict_str": _time(lambda: str(data), repeat),
+            "results_render": _time(lambda: render_results(data), repeat),
+        },
+        "prompt_bytes": {
+            "dict_str": len(str(data).encode("utf-8")),
+            "results_render": len(render_results(data).encode("utf-8")),
+        },
+        # Memory held by what is kept for the prompt: the decoded payload versus
+        # the result objects parsed out of it.
+        "retained_bytes": {
+            "dicts": _retained_bytes(lambda: json.loads(raw)),
+            "results": _retained_bytes(lambda: parse_results(json.loads(raw))),
+        },
+    }
+    if fast_json.orjson is not None:
+        report["decode_us"]["orjson"] = _time(
+            lambda: fast_json.loads(raw, backend="orjson"), repeat
+        )
+    report["name"] = name
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Measure JSON decoding, prompt rendering and retained memory for "
+        "representative Rememberizer payloads and write the results as JSON."
+    )
+    parser.add_argument("--matches", type=int, default=50, help="search matches")
+    parser.add_argument("--messages", type=int, default=200, help="discussion messages")
+    parser.add_argument("--chunk-bytes", type=int, default=800)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    report = {
+        "json_backend": fast_json.BACKEND,
+        "payloads": [
+            measure(
+                "search", search_payload(args.matches, args.chunk_bytes), args.repeat
+            ),
+            measure(
+                "discussion",
+                discussion_payload(args.messages, args.chunk_bytes // 4),
+                args.repeat,
+            ),
+        ],
+    }
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return report
+
+
+if __name__ == "__main__":
+    main()
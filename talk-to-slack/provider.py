@@ -1,18 +1,50 @@
+import contextvars
+import copy
+import hashlib
 import json
 import logging
 import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from itertools import islice
 
+import fast_json
+import http_pool
 import requests
+import tracing
 from constants import (
     REMEMBERIZER_ACCOUNT_ENDPOINT,
+    REMEMBERIZER_COMMON_KNOWLEDGE_ENDPOINT,
     REMEMBERIZER_DISCUSSION_CONTENT_ENDPOINT,
+    REMEMBERIZER_DOCUMENT_CONTENTS_ENDPOINT,
+    REMEMBERIZER_DOCUMENTS_ENDPOINT,
+    REMEMBERIZER_MEMORIZE_ENDPOINT,
     REMEMBERIZER_SEARCH_ENDPOINT,
     REMEMBERIZER_SLACK_INTEGRATIONS_ENDPOINT,
 )
+from discussion_store import format_timestamp, resolve_window
+from rate_limiter import RateLimiterError
+from results import render_results
+from single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
 GPT_MODEL = os.environ.get("GPT_FUNCTION_CALLING_MODEL", "gpt-4o")
+TOOL_CALL_MAX_WORKERS = int(os.environ.get("TOOL_CALL_MAX_WORKERS", "8"))
+TOOL_CALL_TIMEOUT = float(os.environ.get("TOOL_CALL_TIMEOUT", "20"))
+DOCUMENTS_PAGE_SIZE = int(os.environ.get("DOCUMENTS_PAGE_SIZE", "100"))
+DOCUMENT_CHUNK_SIZE = 20
+LIST_CHANNELS_LIMIT = int(os.environ.get("LIST_CHANNELS_LIMIT", "1000"))
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "4"))
+INGEST_CONCURRENCY = int(os.environ.get("INGEST_CONCURRENCY", "4"))
+INGEST_MAX_RETRIES = int(os.environ.get("INGEST_MAX_RETRIES", "3"))
+# Integration whose discussions `get_discussion_content` reads unless the model names
+# another one.
+DISCUSSION_INTEGRATION_TYPE = os.environ.get("DISCUSSION_INTEGRATION_TYPE", "slack")
+# Send a `prompt_cache_key` so requests sharing the static prefix reach one cache.
+PROMPT_CACHE_KEY_ENABLED = (
+    os.environ.get("PROMPT_CACHE_KEY_ENABLED", "false").lower() == "true"
+)
 
 FUNCTION_CALLING_TOOLS = [
     {
@@ -55,6 +87,10 @@ FUNCTION_CALLING_TOOLS = [
                         "type": "string",
                         "description": "The ending time when we want to retrieve the content of the discussion in ISO 8601 format at GMT+0. If not specified, it is 7 days before the 'from' parameter.",
                     },
+                    "integration_type": {
+                        "type": "string",
+                        "description": f"The integration the discussion belongs to. If not specified, it is '{DISCUSSION_INTEGRATION_TYPE}'.",
+                    },
                 },
             },
         },
@@ -72,6 +108,19 @@ FUNCTION_CALLING_TOOLS = [
     },
 ]
 
+# The static prompt prefix (tool schemas, then the system message) is built once and
+# shared by every request, so it stays byte-identical and the completion API can
+# serve it from its prompt cache.
+SYSTEM_MESSAGE = {"role": "system", "content": "You are a friendly AI assistant."}
+PROMPT_PREFIX_ID = hashlib.sha256(
+    fast_json.dumps([FUNCTION_CALLING_TOOLS, SYSTEM_MESSAGE]).encode("utf-8")
+).hexdigest()[:16]
+COMPLETION_OPTIONS = (
+    {"extra_body": {"prompt_cache_key": PROMPT_PREFIX_ID}}
+    if PROMPT_CACHE_KEY_ENABLED
+    else {}
+)
+
 FUNCTION_MAPPING = {
     "search": ("search", "GET", REMEMBERIZER_SEARCH_ENDPOINT),
     "account": ("get_account", "GET", REMEMBERIZER_ACCOUNT_ENDPOINT),
@@ -103,20 +152,132 @@ def generate_extra_knowledge_message(extra_knowledge: str, request_type: str) ->
         )
 
 
+def build_answer_messages(question, context, history=()):
+    """
+    `history` holds the conversation's summary and prior turns as chat messages.
+    """
+    prompt = f"Question: {question}\nContext: {context}\nFormat your answer in Markdown:\nAnswer:"
+    return [
+        SYSTEM_MESSAGE,
+        *history,
+        {"role": "user", "content": prompt},
+    ]
+
+
+def parse_tool_calls(tool_calls, function_mapping=FUNCTION_MAPPING):
+    """
+    Resolve the tool calls returned by the model, keeping their order.
+    Returns: list of (provider_function_name, request_type, arguments)
+    """
+    calls = []
+    for tool_call in tool_calls:
+        function_name = tool_call.function.name
+        if function_name not in function_mapping:
+            logger.error(f"Function {function_name} not found in the list of functions")
+            continue
+        arguments = json.loads(tool_call.function.arguments)
+        logger.debug(f"Calling {function_name} with arguments {arguments}")
+        provider_function_name, request_type, _ = function_mapping[function_name]
+        calls.append((provider_function_name, request_type, arguments))
+    return calls
+
+
+def _past_deadline(delay):
+    """
+    Returns: whether a retry after `delay` seconds would start past the deadline
+    the call runs under (see http_pool.deadline)
+    """
+    left = http_pool.time_left()
+    return left is not None and delay >= left
+
+
+_tool_call_executor = ThreadPoolExecutor(
+    max_workers=TOOL_CALL_MAX_WORKERS, thread_name_prefix="tool-call"
+)
+_prefetch_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="prefetch")
+
+
 class RememberizerSourceProvider:
-    def __init__(self, access_token):
+    def __init__(
+        self,
+        access_token,
+        session=None,
+        cache=None,
+        semantic_cache=None,
+        router=None,
+        context_builder=None,
+        discussion_store=None,
+        local_index=None,
+        single_flight=None,
+        rate_limiter=None,
+        speculative_search=None,
+        sources=None,
+    ):
         self.access_token = access_token
+        self.session = session or http_pool.get_session()
+        self.cache = cache
+        self.semantic_cache = semantic_cache
+        self.router = router
+        self.context_builder = context_builder
+        self.discussion_store = discussion_store
+        self.local_index = local_index
+        self.single_flight = single_flight
+        self.rate_limiter = rate_limiter
+        self.speculative_search = speculative_search
+        self.sources = sources
+        self.retrieval_memo = None
+        self._scope = None
 
-    def call_api(self, url, params={}, method="get", retried=False):
+    def call_api(self, url, params={}, method="get", retried=False, json_body=False):
+        """
+        Send a request through the rate limiter, retrying 429/5xx responses and
+        connection errors with backoff. `retried=True` sends it only once, for
+        callers that already retry. `json_body=True` sends a POST's params as a JSON
+        body instead of a form.
+        """
+        if self.rate_limiter is None:
+            return self._send(url, params, method, json_body)
+        attempt = 0
+        while True:
+            wait = self.rate_limiter.acquire(self.access_token, url)
+            try:
+                time.sleep(wait)
+                response = self._send(url, params, method, json_body)
+            except requests.RequestException:
+                delay = self.rate_limiter.complete(self.access_token, url, attempt)
+                if retried or delay is None or _past_deadline(delay):
+                    raise
+            except BaseException:
+                self.rate_limiter.abandon(url)
+                raise
+            else:
+                delay = self.rate_limiter.complete(
+                    self.access_token,
+                    url,
+                    attempt,
+                    response.status_code,
+                    response.headers.get("Retry-After"),
+                )
+                if retried or delay is None or _past_deadline(delay):
+                    return response
+            time.sleep(delay)
+            attempt += 1
+
+    def _send(self, url, params, method, json_body=False):
         headers = {"Authorization": f"Bearer {self.access_token}"}
-        if method == "post":
-            response = requests.post(url, headers=headers, data=params, verify=False)
-        elif method == "get":
-            response = requests.get(url, headers=headers, params=params, verify=False)
-        else:
-            raise Exception(
-                f"[Rememberizer Source Error] Method not supported: {method}"
-            )
+        with tracing.span("call_api", method=method, url=url) as span:
+            if method == "post":
+                body = {"json": params} if json_body else {"data": params}
+                response = self.session.post(url, headers=headers, verify=False, **body)
+            elif method == "get":
+                response = self.session.get(
+                    url, headers=headers, params=params, verify=False
+                )
+            else:
+                raise Exception(
+                    f"[Rememberizer Source Error] Method not supported: {method}"
+                )
+            span.set("status_code", response.status_code)
         return response
 
     def format_response(self, response):
@@ -124,46 +285,530 @@ class RememberizerSourceProvider:
         Format the response from the API
         Returns: data (dict), success (bool)
         """
-        return response.json(), response.status_code == 200
+        with tracing.span("parse_response") as span:
+            if isinstance(response.content, bytes):
+                span.set("payload_bytes", len(response.content))
+            return fast_json.decode_response(response), response.status_code == 200
 
     def responses_to_text(self, user_message, response):
         text = "Knowledge source: Rememberizer\n"
         text += f"\tUser: {user_message}\n"
-        text += f"\tResponse: {response}\n\n"
+        text += f"\tResponse: {render_results(response)}\n\n"
 
         return text
 
+    def cached(self, endpoint, arguments, fetch):
+        """
+        Serve `endpoint` from the response cache when possible, else call `fetch()`
+        and cache the result if it succeeded.
+        Returns: data (dict), success (bool)
+        """
+        if self.cache is None:
+            return self.coalesced(endpoint, arguments, fetch)
+        data = self.cache.get(self.access_token, endpoint, arguments)
+        if data is not None:
+            return data, True
+        data, success = self.coalesced(endpoint, arguments, fetch)
+        if success:
+            self.cache.set(self.access_token, endpoint, arguments, data)
+        return data, success
+
+    def coalesced(self, endpoint, arguments, fetch):
+        """
+        Share one `fetch()` between concurrent identical calls (same token, endpoint
+        and arguments) when single-flight deduplication is enabled.
+        """
+        if self.single_flight is None:
+            return fetch()
+        return self.single_flight.do(self.access_token, endpoint, arguments, fetch)
+
     def search(self, arguments):
+        """
+        Search every registered knowledge source at once, or Rememberizer alone when
+        there is no source registry.
+        """
+        if self.sources is not None:
+            return self.sources.search(self, arguments)
+        return self.search_rememberizer(arguments)
+
+    def search_rememberizer(self, arguments):
+        if self.local_index is None:
+            return self._remote_search(arguments)
+        scope = self.scope()
+        local, answer = self.local_index.lookup(scope, arguments)
+        if answer is not None:
+            return answer, True
+        try:
+            data, success = self._remote_search(arguments)
+        except Exception as ex:
+            logger.error(f"Remote search failed: {ex}")
+            data, success = {"error": str(ex)}, False
+        return self.local_index.resolve(scope, arguments, local, data, success)
+
+    def _remote_search(self, arguments):
+        if self.semantic_cache is not None:
+            data = self.semantic_cache.get(self.access_token, arguments)
+            if data is not None:
+                return data, True
+        data, success = self.cached(
+            "search", arguments, lambda: self._search(arguments)
+        )
+        if success and self.semantic_cache is not None:
+            self.semantic_cache.set(self.access_token, arguments, data)
+        return data, success
+
+    def _search(self, arguments):
         response = self.call_api(f"{REMEMBERIZER_SEARCH_ENDPOINT}", params=arguments)
         return self.format_response(response)
 
     def get_account(self, arguments):
+        return self.cached(
+            "get_account", arguments, lambda: self._get_account(arguments)
+        )
+
+    def _get_account(self, arguments):
         response = self.call_api(f"{REMEMBERIZER_ACCOUNT_ENDPOINT}", params=arguments)
         return self.format_response(response)
 
+    def get_common_knowledge(self, arguments):
+        return self.cached(
+            "get_common_knowledge",
+            arguments,
+            lambda: self.format_response(
+                self.call_api(REMEMBERIZER_COMMON_KNOWLEDGE_ENDPOINT, params=arguments)
+            ),
+        )
+
+    def scope(self):
+        """
+        Key for per-user local data: the Rememberizer account id, which survives
+        token refreshes, or a hash of the access token if the account is unavailable.
+        """
+        if self._scope is None:
+            account, success = self.get_account({})
+            if success and account.get("id") is not None:
+                self._scope = f"account:{account['id']}"
+            else:
+                digest = hashlib.sha256(self.access_token.encode("utf-8")).hexdigest()
+                self._scope = f"token:{digest}"
+        return self._scope
+
     def get_discussion_content(self, arguments):
+        # A copy: the caller's arguments are the call the conversation remembers.
+        arguments = dict(arguments)
         discussion_id = arguments.pop("discussion_id")
-        arguments["integration_type"] = "slack"
-        response = self.call_api(
-            REMEMBERIZER_DISCUSSION_CONTENT_ENDPOINT.format(discussion_id),
-            params=arguments,
+        integration_type = arguments.pop(
+            "integration_type", DISCUSSION_INTEGRATION_TYPE
+        )
+        data, success = self._mirrored_discussion_content(
+            discussion_id, arguments, integration_type
+        )
+        if success and self.local_index is not None:
+            self.local_index.add_response(self.scope(), data)
+        return data, success
+
+    def _mirrored_discussion_content(self, discussion_id, arguments, integration_type):
+        if self.discussion_store is None:
+            return self._get_discussion_content(
+                discussion_id, arguments, integration_type
+            )
+
+        start, end = resolve_window(arguments)
+        return self.discussion_store.get(
+            self.scope(),
+            discussion_id,
+            start,
+            end,
+            lambda missing_start, missing_end: self._get_discussion_content(
+                discussion_id,
+                {
+                    "from": format_timestamp(missing_end),
+                    "to": format_timestamp(missing_start),
+                },
+                integration_type,
+            ),
+        )
+
+    def _get_discussion_content(
+        self, discussion_id, arguments, integration_type=DISCUSSION_INTEGRATION_TYPE
+    ):
+        arguments = dict(arguments, integration_type=integration_type)
+        return self.coalesced(
+            "get_discussion_content",
+            dict(arguments, discussion_id=discussion_id),
+            lambda: self.format_response(
+                self.call_api(
+                    REMEMBERIZER_DISCUSSION_CONTENT_ENDPOINT.format(discussion_id),
+                    params=arguments,
+                )
+            ),
         )
-        return self.format_response(response)
 
     def list_channels(self, arguments):
-        response = self.call_api(
-            f"{REMEMBERIZER_SLACK_INTEGRATIONS_ENDPOINT}", params=arguments
+        return self.cached(
+            "list_channels", arguments, lambda: self._list_channels(arguments)
+        )
+
+    def _list_channels(self, arguments):
+        try:
+            channels = list(
+                islice(
+                    self.iter_documents(
+                        arguments,
+                        url=REMEMBERIZER_SLACK_INTEGRATIONS_ENDPOINT,
+                        prefetch=True,
+                    ),
+                    LIST_CHANNELS_LIMIT,
+                )
+            )
+        except Exception as ex:
+            return {"error": str(ex)}, False
+        return {"count": len(channels), "results": channels}, True
+
+    def fetch_page(self, url, params=None):
+        data, success = self.format_response(self.call_api(url, params=params or {}))
+        if not success or data.get("error"):
+            raise Exception(
+                f"[Rememberizer Source Error] Failed to fetch {url}: {data}"
+            )
+        return data
+
+    def iter_pages(self, url, params=None, prefetch=False):
+        """
+        Yield each page of a paginated endpoint, following its `next` links.
+        With `prefetch`, the next page is requested in the background while the
+        caller consumes the current one; at most one page is held ahead.
+        """
+        page = self.fetch_page(url, params)
+        while True:
+            next_url = page.get("next")
+            pending = None
+            if next_url and prefetch:
+                pending = _prefetch_executor.submit(self.fetch_page, next_url)
+            yield page
+            if not next_url:
+                return
+            page = pending.result() if pending else self.fetch_page(next_url)
+
+    def iter_documents(
+        self,
+        params=None,
+        url=REMEMBERIZER_DOCUMENTS_ENDPOINT,
+        page_size=DOCUMENTS_PAGE_SIZE,
+        prefetch=False,
+    ):
+        """
+        Yield every document (or Slack channel) across all pages, e.g.
+        `iter_documents({"integration_type": "slack"})`.
+        """
+        params = dict(params or {}, page_size=page_size)
+        for page in self.iter_pages(url, params, prefetch=prefetch):
+            yield from page.get("results", [])
+
+    def iter_document_contents(
+        self, document_id, chunk_size=DOCUMENT_CHUNK_SIZE, prefetch=False
+    ):
+        """
+        Yield the content of a document in `chunk_size` chunk windows, using the
+        returned `end_chunk` as the next `start_chunk`.
+        """
+        url = REMEMBERIZER_DOCUMENT_CONTENTS_ENDPOINT.format(document_id)
+
+        def fetch(start):
+            return self.fetch_page(
+                url, {"start_chunk": start, "end_chunk": start + chunk_size}
+            )
+
+        start = 0
+        page = fetch(start)
+        while True:
+            content, end = page.get("content"), page.get("end_chunk")
+            last = not content or end is None or end < start + chunk_size
+            pending = None
+            if not last and prefetch:
+                pending = _prefetch_executor.submit(fetch, end)
+            if content:
+                yield content
+            if last:
+                return
+            start = end
+            page = pending.result() if pending else fetch(start)
+
+    def index_document(self, document_id, name=None):
+        """
+        Mirror a document's contents into the local index.
+        Returns: number of chunks added
+        """
+        if self.local_index is None:
+            return 0
+        return self.local_index.add_document(
+            self.scope(),
+            name or str(document_id),
+            self.iter_document_contents(document_id, prefetch=True),
         )
-        return self.format_response(response)
 
     def call_function(self, function_name, arguments):
-        response, success = getattr(self, function_name)(arguments)
+        with tracing.span(f"tool.{function_name}"):
+            if self.retrieval_memo is not None:
+                response, success = self.retrieval_memo.do(
+                    self.access_token,
+                    function_name,
+                    arguments,
+                    lambda: getattr(self, function_name)(arguments),
+                )
+            else:
+                response, success = getattr(self, function_name)(arguments)
 
         if not success:
             logger.error(f"Error calling function {function_name}")
 
         return response
 
+    def run_tool_calls(self, calls, timeout=TOOL_CALL_TIMEOUT):
+        """
+        Run the parsed tool calls concurrently on the shared tool-call pool.
+        Calls that miss the deadline or raise are replaced by an error payload so one
+        slow endpoint does not hold up the others.
+        Returns: responses in the same order as `calls`
+        """
+        futures = [
+            _tool_call_executor.submit(
+                contextvars.copy_context().run,
+                self.call_function,
+                function_name,
+                arguments,
+            )
+            for function_name, _, arguments in calls
+        ]
+        done, _ = wait(futures, timeout=timeout)
+
+        responses = []
+        for (function_name, _, _), future in zip(calls, futures):
+            if future not in done:
+                future.cancel()
+                logger.error(f"Function {function_name} timed out after {timeout}s")
+                responses.append({"error": f"{function_name} timed out"})
+            elif future.exception() is not None:
+                logger.error(
+                    f"Error calling function {function_name}: {future.exception()}"
+                )
+                responses.append({"error": f"{function_name} failed"})
+            else:
+                responses.append(future.result())
+        return responses
+
+    def retrieve(self, calls, conversation=None, speculation=None):
+        """
+        Run the tool calls, answering those the conversation already made (and that
+        are still fresh) from its stored responses, and a search the speculative
+        one matches from its result.
+        Returns: responses in the same order as `calls`
+        """
+        responses = [
+            conversation.retrieval(*call) if conversation is not None else None
+            for call in calls
+        ]
+        missing = [
+            index for index, response in enumerate(responses) if response is None
+        ]
+        if speculation is not None:
+            claimed = speculation.claim([calls[index] for index in missing])
+            if claimed is not None:
+                index, response = missing.pop(claimed[0]), claimed[1]
+                responses[index] = response
+                if conversation is not None:
+                    conversation.remember(*calls[index], response)
+        if missing:
+            fetched = self.run_tool_calls([calls[index] for index in missing])
+            for index, response in zip(missing, fetched):
+                if conversation is not None:
+                    conversation.remember(*calls[index], response)
+                responses[index] = response
+        return responses
+
+    def build_extra_knowledge(self, message, calls, responses):
+        with tracing.span("build_context") as span:
+            if self.context_builder is not None:
+                extra_content, report = self.context_builder.build(message, responses)
+                span.set("context_tokens", report["tokens_after"])
+            else:
+                extra_content = "".join(
+                    self.responses_to_text(message, response) for response in responses
+                )
+        request_type = "POST" if any(call[1] == "POST" for call in calls) else "GET"
+        return generate_extra_knowledge_message(
+            extra_knowledge=extra_content,
+            request_type=request_type,
+        )
+
+    def answer(self, question, client, gpt_model=GPT_MODEL):
+        """
+        Run the same pipeline as /ask: tool selection and retrieval, then the
+        answer completion.
+        Returns: the answer text
+        """
+        context = self.handle(question, client, gpt_model=gpt_model)
+        with tracing.span("answer_completion", model=gpt_model) as span:
+            completion = client.chat.completions.create(
+                messages=build_answer_messages(question, context),
+                model=gpt_model,
+                temperature=0.7,
+                **COMPLETION_OPTIONS,
+            )
+            span.set_usage(completion.usage)
+        return completion.choices[0].message.content
+
+    def answer_batch(
+        self,
+        questions,
+        client,
+        concurrency=BATCH_CONCURRENCY,
+        gpt_model=GPT_MODEL,
+        memo=None,
+    ):
+        """
+        Answer (id, question) pairs with at most `concurrency` in flight. Identical
+        tool calls across the batch are made once (`memo`, a retaining SingleFlight,
+        also reports how many were saved).
+        Yields: {"id", "question", "answer"} or {"id", "question", "error"} in
+        completion order
+        """
+        batch = copy.copy(self)
+        batch.retrieval_memo = memo or SingleFlight(retain=True)
+
+        def run(question_id, question):
+            with tracing.span("ask_batch"):
+                try:
+                    answer = batch.answer(question, client, gpt_model)
+                except Exception as ex:
+                    logger.error(f"Batch question {question_id} failed: {ex}")
+                    return {"id": question_id, "question": question, "error": str(ex)}
+            return {"id": question_id, "question": question, "answer": answer}
+
+        with ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="batch"
+        ) as executor:
+            pending = set()
+            for question_id, question in questions:
+                if len(pending) >= concurrency:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+                pending.add(
+                    executor.submit(
+                        contextvars.copy_context().run, run, question_id, question
+                    )
+                )
+            for future in as_completed(pending):
+                yield future.result()
+
+    def memorize(self, arguments, retried=False):
+        """
+        Store {"name", "content"} in Rememberizer, where `search` finds it once it
+        is indexed.
+        Returns: data (dict), success (bool)
+        """
+        return self._memorized(self._memorize(arguments, retried))
+
+    def _memorize(self, arguments, retried):
+        return self.call_api(
+            REMEMBERIZER_MEMORIZE_ENDPOINT,
+            params=arguments,
+            method="post",
+            retried=retried,
+            json_body=True,
+        )
+
+    def _memorized(self, response):
+        data = fast_json.decode_response(response) if response.content else {}
+        return data, response.status_code in (200, 201)
+
+    def memorize_batch(
+        self,
+        chunks,
+        concurrency=INGEST_CONCURRENCY,
+        max_retries=INGEST_MAX_RETRIES,
+    ):
+        """
+        Memorize (id, name, content) chunks with at most `concurrency` in flight;
+        `chunks` is only read when a slot frees up, so a lazy source is never read
+        ahead. Connection errors, 429 and 5xx responses and rate limiter rejections
+        are retried up to `max_retries` times with exponential backoff, waiting at
+        least until an open circuit lets a trial through. Any other exception
+        becomes the chunk's error.
+        Yields: {"id", "name", "attempts"} or {"id", "name", "attempts", "error"} in
+        completion order
+        """
+
+        def attempt(name, content):
+            """
+            Returns: error message or None, whether the error is worth retrying and
+            the least seconds to wait before retrying
+            """
+            try:
+                response = self._memorize({"name": name, "content": content}, True)
+            except RateLimiterError as ex:
+                return str(ex), True, ex.retry_after or 0.0
+            except requests.RequestException as ex:
+                return str(ex), True, 0.0
+            data, success = self._memorized(response)
+            if success:
+                return None, False, 0.0
+            status = response.status_code
+            return f"HTTP {status}: {data}", status == 429 or status >= 500, 0.0
+
+        def run(chunk_id, name, content):
+            attempts = 0
+            while True:
+                attempts += 1
+                with tracing.span("memorize", attempt=attempts) as span:
+                    try:
+                        error, retryable, retry_after = attempt(name, content)
+                    except Exception as ex:
+                        error, retryable, retry_after = str(ex), False, 0.0
+                    span.set("success", error is None)
+                if error is None:
+                    return {"id": chunk_id, "name": name, "attempts": attempts}
+                if not retryable or attempts > max_retries:
+                    logger.error(f"Memorizing {name} failed: {error}")
+                    return {
+                        "id": chunk_id,
+                        "name": name,
+                        "attempts": attempts,
+                        "error": error,
+                    }
+                time.sleep(max(min(0.5 * 2 ** (attempts - 1), 30), retry_after))
+
+        with ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="ingest"
+        ) as executor:
+            pending = set()
+            for chunk_id, name, content in chunks:
+                if len(pending) >= concurrency:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+                pending.add(
+                    executor.submit(
+                        contextvars.copy_context().run, run, chunk_id, name, content
+                    )
+                )
+            for future in as_completed(pending):
+                yield future.result()
+
+    def route_locally(self, message, function_mapping=FUNCTION_MAPPING):
+        """
+        Ask the local intent router for the tool call, skipping the LLM tool choice.
+        Returns: parsed calls like `parse_tool_calls`, or None to fall back to the LLM
+        """
+        if self.router is None:
+            return None
+        decision = self.router.route(message)
+        if decision is None or decision.tool not in function_mapping:
+            return None
+        provider_function_name, request_type, _ = function_mapping[decision.tool]
+        return [(provider_function_name, request_type, decision.arguments)]
+
     def handle(
         self,
         message,
@@ -171,48 +816,64 @@ class RememberizerSourceProvider:
         gpt_model=GPT_MODEL,
         function_calling_tools=FUNCTION_CALLING_TOOLS,
         function_mapping=FUNCTION_MAPPING,
+        conversation=None,
     ):
-        try:
-            tool_choice_prompt = [
-                {"role": "system", "content": "You are a friendly AI assistant."},
-                {"role": "user", "content": message},
-            ]
-
-            chat_response = client.chat.completions.create(
-                messages=tool_choice_prompt,
-                model=gpt_model,
-                tools=function_calling_tools,
-            )
+        speculation = None
+        with tracing.span("handle") as span:
+            try:
+                with tracing.span("route_locally"):
+                    calls = self.route_locally(message, function_mapping)
+                if calls:
+                    span.set("routed_locally", True)
+                    responses = self.retrieve(calls, conversation)
+                    return self.build_extra_knowledge(message, calls, responses)
 
-            if not chat_response.choices[0].message.tool_calls:
-                return "No context provided"
+                if self.speculative_search is not None:
+                    speculation = self.speculative_search.start(self, message)
 
-            tools_response = chat_response.choices[0].message
-            tool_calls = tools_response.tool_calls
-            function_name = tool_calls[0].function.name
-            arguments = json.loads(tool_calls[0].function.arguments)
+                tool_choice_prompt = [
+                    SYSTEM_MESSAGE,
+                    *(conversation.history_messages() if conversation else []),
+                    {"role": "user", "content": message},
+                ]
 
-            if function_name not in function_mapping:
-                logger.error(
-                    f"Function {function_name} not found in the list of functions"
-                )
-                return {}
+                with tracing.span("tool_choice", model=gpt_model) as choice_span:
+                    chat_response = client.chat.completions.create(
+                        messages=tool_choice_prompt,
+                        model=gpt_model,
+                        tools=function_calling_tools,
+                        **COMPLETION_OPTIONS,
+                    )
+                    choice_span.set_usage(chat_response.usage)
 
-            logger.debug(f"Calling {function_name} with arguments {arguments}")
-            provider_function_name, request_type, _ = function_mapping[function_name]
+                if not chat_response.choices[0].message.tool_calls:
+                    if conversation is not None and conversation.last_calls():
+                        # A follow-up about the previous answer: reuse its context.
+                        calls = conversation.last_calls()
+                        responses = self.retrieve(calls, conversation)
+                        return self.build_extra_knowledge(message, calls, responses)
+                    return "No context provided"
 
-            response = self.call_function(provider_function_name, arguments)
-            extra_content = self.responses_to_text(message, response)
-            raw_content = generate_extra_knowledge_message(
-                extra_knowledge=extra_content,
-                request_type=request_type,
-            )
+                tools_response = chat_response.choices[0].message
+                with tracing.span("parse_tool_calls"):
+                    calls = parse_tool_calls(
+                        tools_response.tool_calls, function_mapping
+                    )
+                if not calls:
+                    return {}
 
-            return raw_content
+                responses = self.retrieve(calls, conversation, speculation)
+                return self.build_extra_knowledge(message, calls, responses)
 
-        except Exception as ex:
-            logger.error(
-                f"Something went wrong while connecting with Rememberizer. {str(ex)}",
-                exc_info=True,
-            )
-            return {}
+            except Exception as ex:
+                span.fail(ex)
+                logger.error(
+                    f"Something went wrong while connecting with Rememberizer. {str(ex)}",
+                    exc_info=True,
+                )
+                return {}
+            finally:
+                if speculation is not None:
+                    speculation.discard()
+                    span.set("speculation", speculation.outcome)
+                    span.set("speculation_saved_ms", round(speculation.saved * 1000, 1))
@@ -0,0 +1,398 @@
+import hashlib
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "true").lower() == "true"
+# Requests per second (and burst) allowed per access token and endpoint.
+RATE_LIMIT_RPS = float(os.environ.get("RATE_LIMIT_RPS", "5"))
+RATE_LIMIT_BURST = int(os.environ.get("RATE_LIMIT_BURST", "10"))
+RATE_LIMIT_MAX_WAIT = float(os.environ.get("RATE_LIMIT_MAX_WAIT", "10"))
+RETRY_MAX_ATTEMPTS = int(os.environ.get("RETRY_MAX_ATTEMPTS", "3"))
+RETRY_BACKOFF_BASE = float(os.environ.get("RETRY_BACKOFF_BASE", "0.5"))
+RETRY_BACKOFF_MAX = float(os.environ.get("RETRY_BACKOFF_MAX", "8"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.environ.get("CIRCUIT_RESET_TIMEOUT", "30"))
+
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+MAX_BUCKETS = 10000
+
+_ID_SEGMENT_RE = re.compile(
+    r"/(\d+|[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12})"
+    r"(?=/|$)"
+)
+
+
+class RateLimiterError(Exception):
+    """
+    Raised by `RateLimiter.acquire` when a call is rejected before it is sent.
+    `retry_after` is the number of seconds until the endpoint's circuit lets a
+    trial through, or None.
+    """
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def endpoint_key(url):
+    """
+    The URL path with ids replaced, e.g. ".../discussions/{}/contents".
+    """
+    return _ID_SEGMENT_RE.sub("/{}", urlsplit(url).path)
+
+
+def parse_retry_after(value, now=None):
+    """
+    Accept delta-seconds or an HTTP date.
+    Returns: seconds to wait (float) or None
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at - (now if now is not None else time.time()), 0.0)
+
+
+def backoff(attempt, base=RETRY_BACKOFF_BASE, cap=RETRY_BACKOFF_MAX):
+    """
+    Exponential backoff with full jitter.
+    """
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+class TokenBucket:
+    """
+    Token bucket whose refill rate adapts to throttling: halved on every 429 and
+    raised back towards the configured rate by 5% of it on every success (AIMD).
+    """
+
+    def __init__(self, rate, burst):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, max_wait=None):
+        """
+        Take a token, possibly from the future.
+        Returns: seconds the caller must wait before sending, or None when that would
+        exceed `max_wait` (no token is taken then)
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now > self.updated:
+                self._refill(now)
+            wait = max(self.updated - now, 0.0)
+            if self.tokens < 1:
+                wait += (1 - self.tokens) / self.rate
+            if max_wait is not None and wait > max_wait:
+                return None
+            self.tokens -= 1
+            return wait
+
+    def pause(self, seconds):
+        """
+        Hold back every token until `seconds` from now (Retry-After).
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now > self.updated:
+                self._refill(now)
+            self.updated = max(self.updated, now + seconds)
+            self.tokens = min(self.tokens, 0.0)
+
+    def throttled(self):
+        with self._lock:
+            self.rate = max(self.rate / 2, self.max_rate / 20)
+
+    def succeeded(self):
+        with self._lock:
+            self.rate = min(self.rate + self.max_rate / 20, self.max_rate)
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive server errors and rejects calls
+    until `reset_timeout` has passed; then lets one trial call through (half-open)
+    and closes again if it succeeds. A trial that is never recorded (released, or
+    lost to a cancelled caller) stops blocking new trials after `reset_timeout`.
+    """
+
+    def __init__(
+        self,
+        failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout=CIRCUIT_RESET_TIMEOUT,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.trial_started = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state != "half_open":
+                return False
+            now = time.monotonic()
+            if (
+                not self.trial_in_flight
+                or now - self.trial_started >= self.reset_timeout
+            ):
+                self.trial_in_flight = True
+                self.trial_started = now
+                return True
+            return False
+
+    def retry_in(self):
+        """
+        Returns: seconds until the circuit lets a trial call through
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return 0.0
+            return max(self.reset_timeout - (time.monotonic() - self.opened_at), 0.0)
+
+    def release(self):
+        """
+        Give back a trial taken by `allow` for a call that was never sent or whose
+        outcome is unknown.
+        """
+        with self._lock:
+            self.trial_in_flight = False
+
+    def record(self, success):
+        with self._lock:
+            self.trial_in_flight = False
+            if success:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class RateLimiter:
+    """
+    Client-side limits for Rememberizer calls: a token bucket per (access token,
+    endpoint), a circuit breaker per endpoint and the retry policy for 429/5xx and
+    connection errors. The providers call `acquire` before and `complete` after each
+    attempt; both return delays so sync and async callers can sleep their own way.
+    An attempt that ends in neither (e.g. a cancelled caller) must call `abandon`.
+    """
+
+    def __init__(
+        self,
+        rate=RATE_LIMIT_RPS,
+        burst=RATE_LIMIT_BURST,
+        max_wait=RATE_LIMIT_MAX_WAIT,
+        max_attempts=RETRY_MAX_ATTEMPTS,
+        failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout=CIRCUIT_RESET_TIMEOUT,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = max_wait
+        self.max_attempts = max_attempts
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._buckets = OrderedDict()
+        self._breakers = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, access_token, endpoint):
+        digest = hashlib.sha256(access_token.encode("utf-8")).hexdigest()
+        key = (digest, endpoint)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+                if len(self._buckets) > MAX_BUCKETS:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            return bucket
+
+    def _breaker(self, endpoint):
+        with self._lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                breaker = self._breakers[endpoint] = CircuitBreaker(
+                    self.failure_threshold, self.reset_timeout
+                )
+            return breaker
+
+    def _count(self, endpoint, counter, amount=1):
+        with self._lock:
+            counters = self._counters.setdefault(
+                endpoint,
+                {
+                    "calls": 0,
+                    "throttled": 0,
+                    "server_errors": 0,
+                    "retries": 0,
+                    "rejected": 0,
+                    "waited_seconds": 0.0,
+                },
+            )
+            counters[counter] += amount
+
+    def acquire(self, access_token, url):
+        """
+        Returns: seconds to wait before sending the request
+        Raises: RateLimiterError when the endpoint's circuit is open or the wait
+        would exceed max_wait
+        """
+        endpoint = endpoint_key(url)
+        breaker = self._breaker(endpoint)
+        if not breaker.allow():
+            self._count(endpoint, "rejected")
+            raise RateLimiterError(
+                f"[Rate Limiter Error] Circuit open for {endpoint}, failing fast",
+                retry_after=breaker.retry_in(),
+            )
+        wait = self._bucket(access_token, endpoint).reserve(self.max_wait)
+        if wait is None:
+            # The call is not sent, so it must not hold the half-open trial.
+            breaker.release()
+            self._count(endpoint, "rejected")
+            raise RateLimiterError(
+                f"[Rate Limiter Error] Rate limit wait for {endpoint} exceeds "
+                f"{self.max_wait}s"
+            )
+        self._count(endpoint, "calls")
+        self._count(endpoint, "waited_seconds", wait)
+        return wait
+
+    def abandon(self, url):
+        """
+        Forget an acquired attempt that will never complete, freeing the endpoint's
+        half-open trial if it held it.
+        """
+        self._breaker(endpoint_key(url)).release()
+
+    def complete(self, access_token, url, attempt, status=None, retry_after=None):
+        """
+        Record the outcome of an attempt; `status` is None for connection errors.
+        Returns: seconds to wait before retrying, or None when the result is final
+        """
+        endpoint = endpoint_key(url)
+        bucket = self._bucket(access_token, endpoint)
+        server_error = status is None or status >= 500
+        self._breaker(endpoint).record(not server_error)
+        retry_after = parse_retry_after(retry_after)
+        if status == 429:
+            self._count(endpoint, "throttled")
+            bucket.throttled()
+            if retry_after:
+                bucket.pause(retry_after)
+        elif server_error:
+            self._count(endpoint, "server_errors")
+        else:
+            bucket.succeeded()
+
+        if status not in RETRYABLE_STATUSES and status is not None:
+            return None
+        if attempt + 1 >= self.max_attempts:
+            return None
+        delay = max(backoff(attempt), retry_after or 0.0)
+        if delay > self.max_wait:
+            return None
+        self._count(endpoint, "retries")
+        logger.warning(
+            f"{endpoint} returned {status or 'a connection error'}, "
+            f"retrying in {delay:.2f}s"
+        )
+        return delay
+
+    def stats(self):
+        with self._lock:
+            endpoints = {
+                endpoint: dict(counters)
+                for endpoint, counters in self._counters.items()
+            }
+            breakers = dict(self._breakers)
+            buckets = len(self._buckets)
+        for endpoint, breaker in breakers.items():
+            endpoints.setdefault(endpoint, {})["circuit"] = breaker.state
+        return {"buckets": buckets, "endpoints": endpoints}
+
+    def render(self):
+        """
+        Returns: the limiter counters in the Prometheus text exposition format
+        """
+        endpoints = self.stats()["endpoints"]
+        lines = []
+        for counter in ("throttled", "server_errors", "retries", "rejected"):
+            lines += [
+                f"# HELP rate_limiter_{counter}_total Rememberizer calls {counter}.",
+                f"# TYPE rate_limiter_{counter}_total counter",
+            ]
+            lines += [
+                f'rate_limiter_{counter}_total{{endpoint="{endpoint}"}} '
+                f"{counters.get(counter, 0)}"
+                for endpoint, counters in sorted(endpoints.items())
+            ]
+        lines += [
+            "# HELP rate_limiter_circuit_open Whether the endpoint's circuit is open.",
+            "# TYPE rate_limiter_circuit_open gauge",
+        ]
+        lines += [
+            f'rate_limiter_circuit_open{{endpoint="{endpoint}"}} '
+            f'{int(counters.get("circuit") == "open")}'
+            for endpoint, counters in sorted(endpoints.items())
+        ]
+        return "\n".join(lines) + "\n"
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """
+    Return the process-wide rate limiter, or None when RATE_LIMIT_ENABLED=false.
+    """
+    global _limiter
+    if not RATE_LIMIT_ENABLED:
+        return None
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter()
+    return _limiter
@@ -0,0 +1,317 @@
+import logging
+import os
+import socket
+import socketserver
+import ssl
+import sys
+import threading
+import time
+from urllib.parse import unquote, urlsplit
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.environ.get("REDIS_URL", "redis://127.0.0.1:6379/0")
+REDIS_TIMEOUT = float(os.environ.get("REDIS_TIMEOUT", "5"))
+# Verify the server certificate of a rediss:// URL. Managed Redis that presents a
+# self-signed certificate (Heroku Redis, for one) needs this set to false.
+REDIS_TLS_VERIFY = os.environ.get("REDIS_TLS_VERIFY", "true").lower() == "true"
+
+
+def encode_command(*args):
+    """
+    Returns: the command as a RESP array of bulk strings
+    """
+    parts = [f"*{len(args)}\r\n".encode()]
+    for arg in args:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode("utf-8")
+        parts.append(f"${len(arg)}\r\n".encode() + arg + b"\r\n")
+    return b"".join(parts)
+
+
+def read_reply(stream):
+    """
+    Read one RESP reply from a binary file object.
+    Returns: str, int, bytes, None or a list of those
+    Raises: on an error reply or a closed connection
+    """
+    line = stream.readline()
+    if not line.endswith(b"\r\n"):
+        raise ConnectionError("[Redis Error] Connection closed")
+    kind, body = line[:1], line[1:-2]
+    if kind == b"+":
+        return body.decode("utf-8")
+    if kind == b"-":
+        raise Exception(f"[Redis Error] {body.decode('utf-8')}")
+    if kind == b":":
+        return int(body)
+    if kind == b"$":
+        length = int(body)
+        if length < 0:
+            return None
+        data = stream.read(length + 2)
+        return data[:-2]
+    if kind == b"*":
+        length = int(body)
+        if length < 0:
+            return None
+        return [read_reply(stream) for _ in range(length)]
+    raise Exception(f"[Redis Error] Unexpected reply: {line!r}")
+
+
+class RedisClient:
+    """
+    Minimal client for the Redis protocol (RESP2): one connection per thread,
+    reconnecting once when a pooled connection has gone away. Speaks to Redis,
+    Valkey, KeyDB or the StandInRedis below. A `rediss://` URL connects over TLS,
+    and a username in the URL authenticates as that ACL user.
+    """
+
+    def __init__(
+        self, url=REDIS_URL, timeout=REDIS_TIMEOUT, tls_verify=REDIS_TLS_VERIFY
+    ):
+        parts = urlsplit(url)
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 6379
+        self.username = unquote(parts.username) if parts.username else None
+        self.password = unquote(parts.password) if parts.password else None
+        self.db = int(parts.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self.tls_context = None
+        if parts.scheme == "rediss":
+            self.tls_context = ssl.create_default_context()
+            if not tls_verify:
+                self.tls_context.check_hostname = False
+                self.tls_context.verify_mode = ssl.CERT_NONE
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.tls_context is not None:
+            try:
+                sock = self.tls_context.wrap_socket(sock, server_hostname=self.host)
+            except BaseException:
+                sock.close()
+                raise
+        connection = (sock, sock.makefile("rb"))
+        self._local.connection = connection
+        if self.username and self.password:
+            self._send(connection, "AUTH", self.username, self.password)
+        elif self.password:
+            self._send(connection, "AUTH", self.password)
+        if self.db:
+            self._send(connection, "SELECT", self.db)
+        return connection
+
+    def _send(self, connection, *args):
+        sock, stream = connection
+        sock.sendall(encode_command(*args))
+        return read_reply(stream)
+
+    def _close(self):
+        connection = getattr(self._local, "connection", None)
+        self._local.connection = None
+        if connection is not None:
+            connection[1].close()
+            connection[0].close()
+
+    def execute(self, *args):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            try:
+                return self._send(connection, *args)
+            except (ConnectionError, OSError):
+                self._close()
+        try:
+            return self._send(self._connect(), *args)
+        except (ConnectionError, OSError):
+            self._close()
+            raise
+
+
+class RedisBackend:
+    """
+    Key/value store on a Redis-protocol server, with the same interface as the
+    response cache backends. Keys are namespaced with `prefix`; expiry is left to
+    the server.
+    """
+
+    name = "redis"
+
+    def __init__(self, url=REDIS_URL, prefix="", client=None):
+        self.client = client or RedisClient(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.execute("GET", self.prefix + key)
+        return value.decode("utf-8") if value is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.execute("SET", self.prefix + key, value, "EX", max(int(ttl), 1))
+
+    def delete(self, key):
+        self.client.execute("DEL", self.prefix + key)
+
+    def _scan(self):
+        cursor = "0"
+        while True:
+            cursor, keys = self.client.execute(
+                "SCAN", cursor, "MATCH", f"{self.prefix}*", "COUNT", 1000
+            )
+            yield keys
+            cursor = cursor.decode("utf-8") if isinstance(cursor, bytes) else cursor
+            if cursor == "0":
+                return
+
+    def clear(self):
+        for keys in self._scan():
+            if keys:
+                self.client.execute("DEL", *keys)
+
+    def count(self):
+        """
+        Returns: the number of keys under the prefix
+        """
+        return sum(len(keys) for keys in self._scan())
+
+    def stats(self):
+        return {"keys": self.client.execute("DBSIZE")}
+
+
+class _StandInHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        while True:
+            try:
+                command = read_reply(self.rfile)
+            except (ConnectionError, OSError):
+                return
+            if not isinstance(command, list) or not command:
+                return
+            try:
+                reply = self.server.store.execute(*command)
+            except Exception as ex:
+                self.wfile.write(f"-ERR {ex}\r\n".encode("utf-8"))
+                continue
+            self.wfile.write(_encode_reply(reply))
+
+
+def _encode_reply(reply):
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, bool):
+        return b"+OK\r\n"
+    if isinstance(reply, int):
+        return f":{reply}\r\n".encode()
+    if isinstance(reply, str):
+        return f"+{reply}\r\n".encode("utf-8")
+    if isinstance(reply, list):
+        return f"*{len(reply)}\r\n".encode() + b"".join(map(_encode_reply, reply))
+    return f"${len(reply)}\r\n".encode() + reply + b"\r\n"
+
+
+class _StandInStore:
+    """
+    The subset of Redis commands the app uses: PING, AUTH, SELECT, GET, MGET,
+    SET [EX|PX] [NX], DEL, EXPIRE, DBSIZE, SCAN and FLUSHDB, on a single keyspace.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+        self.auth = None
+
+    def _live(self, key, now):
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= now:
+            del self._data[key]
+            return None
+        return entry
+
+    def execute(self, name, *args):
+        name = name.decode("utf-8").upper()
+        now = time.monotonic()
+        with self._lock:
+            if name == "AUTH":
+                self.auth = args
+            if name in ("PING", "AUTH", "SELECT"):
+                return "PONG" if name == "PING" else True
+            if name == "GET":
+                entry = self._live(args[0], now)
+                return entry[0] if entry is not None else None
+            if name == "MGET":
+                entries = [self._live(key, now) for key in args]
+                return [entry[0] if entry is not None else None for entry in entries]
+            if name == "SET":
+                options = [arg.upper() for arg in args[2:]]
+                if b"NX" in options and self._live(args[0], now) is not None:
+                    return None
+                expires_at = None
+                if b"EX" in options:
+                    expires_at = now + int(args[options.index(b"EX") + 3])
+                if b"PX" in options:
+                    expires_at = now + int(args[options.index(b"PX") + 3]) / 1000
+                self._data[args[0]] = (args[1], expires_at)
+                return True
+            if name == "DEL":
+                return sum(self._data.pop(key, None) is not None for key in args)
+            if name == "EXPIRE":
+                entry = self._live(args[0], now)
+                if entry is None:
+                    return 0
+                self._data[args[0]] = (entry[0], now + int(args[1]))
+                return 1
+            if name == "DBSIZE":
+                return sum(self._live(key, now) is not None for key in list(self._data))
+            if name == "SCAN":
+                options = dict(zip((arg.upper() for arg in args[1::2]), args[2::2]))
+                prefix = options.get(b"MATCH", b"*").rstrip(b"*")
+                keys = [
+                    key
+                    for key in list(self._data)
+                    if key.startswith(prefix) and self._live(key, now) is not None
+                ]
+                return [b"0", keys]
+            if name == "FLUSHDB":
+                self._data.clear()
+                return True
+        raise Exception(f"unknown command '{name}'")
+
+
+class StandInRedis:
+    """
+    In-process Redis-protocol server on a local port, for development and tests
+    where no Redis is available. Not persistent; use a real server in production.
+    `tls=(certfile, keyfile)` serves it over TLS as a `rediss://` URL.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, tls=None):
+        self.server = socketserver.ThreadingTCPServer((host, port), _StandInHandler)
+        self.server.daemon_threads = True
+        self.server.store = _StandInStore()
+        scheme = "redis"
+        if tls is not None:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(*tls)
+            self.server.socket = context.wrap_socket(
+                self.server.socket, server_side=True
+            )
+            scheme = "rediss"
+        self.url = f"{scheme}://{host}:{self.server.server_address[1]}/0"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 6379
+    with StandInRedis(port=port) as stand_in:
+        print(f"Stand-in Redis listening on {stand_in.url}", flush=True)
+        threading.Event().wait()
@@ -0,0 +1,282 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import fast_json
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_BACKEND = os.environ.get("RESPONSE_CACHE_BACKEND", "memory")
+RESPONSE_CACHE_PATH = os.environ.get("RESPONSE_CACHE_PATH", "response_cache.sqlite3")
+RESPONSE_CACHE_MAX_BYTES = int(
+    os.environ.get("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024))
+)
+
+# Seconds a successful response stays fresh, per provider endpoint.
+DEFAULT_TTLS = {
+    "search": int(os.environ.get("RESPONSE_CACHE_TTL_SEARCH", "300")),
+    "get_account": int(os.environ.get("RESPONSE_CACHE_TTL_ACCOUNT", "3600")),
+    "list_channels": int(os.environ.get("RESPONSE_CACHE_TTL_LIST_CHANNELS", "900")),
+    "get_common_knowledge": int(
+        os.environ.get("RESPONSE_CACHE_TTL_COMMON_KNOWLEDGE", "3600")
+    ),
+}
+
+
+def normalize_params(params):
+    """
+    Drop empty values, collapse whitespace in strings and sort keys so equivalent
+    requests map to the same cache key.
+    """
+    normalized = {}
+    for key, value in (params or {}).items():
+        if value is None or value == "":
+            continue
+        if isinstance(value, str):
+            value = " ".join(value.split())
+        normalized[key] = value
+    return dict(sorted(normalized.items()))
+
+
+def make_key(access_token, endpoint, params):
+    raw = json.dumps(
+        [access_token, endpoint, normalize_params(params)],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class MemoryBackend:
+    """
+    In-process LRU store bounded by the total size of the serialized values.
+    """
+
+    name = "memory"
+
+    def __init__(self, max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.time() + ttl)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def _remove(self, key):
+        value, _ = self._entries.pop(key)
+        self._bytes -= len(value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes}
+
+
+class SQLiteBackend:
+    """
+    File-backed store that every worker process on the host can share.
+    Least recently read entries are evicted when the size cap is exceeded.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path=RESPONSE_CACHE_PATH, max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)"
+            )
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._connection()
+        now = time.time()
+        row = conn.execute(
+            "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at <= now:
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return value
+
+    def set(self, key, value, ttl):
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now + ttl, now),
+            )
+            conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+            (total,) = conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM cache"
+            ).fetchone()
+            while total > self.max_bytes:
+                oldest = conn.execute(
+                    "SELECT key, size FROM cache ORDER BY accessed_at LIMIT 1"
+                ).fetchone()
+                conn.execute("DELETE FROM cache WHERE key = ?", (oldest[0],))
+                total -= oldest[1]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, key):
+        self._connection().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self):
+        self._connection().execute("DELETE FROM cache")
+
+    def stats(self):
+        entries, size = (
+            self._connection()
+            .execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache")
+            .fetchone()
+        )
+        return {"entries": entries, "bytes": size}
+
+
+class ResponseCache:
+    """
+    TTL cache of successful Rememberizer responses keyed on
+    (access token, endpoint, normalized params).
+    """
+
+    def __init__(self, backend, ttls=None):
+        self.backend = backend
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def _record(self, endpoint, hit):
+        with self._lock:
+            counters = self._counters.setdefault(endpoint, {"hits": 0, "misses": 0})
+            counters["hits" if hit else "misses"] += 1
+
+    def get(self, access_token, endpoint, params):
+        try:
+            value = self.backend.get(make_key(access_token, endpoint, params))
+        except Exception as ex:
+            logger.error(f"Response cache read failed: {ex}")
+            value = None
+        self._record(endpoint, value is not None)
+        return fast_json.loads(value) if value is not None else None
+
+    def set(self, access_token, endpoint, params, data):
+        ttl = self.ttls.get(endpoint)
+        if not ttl:
+            return
+        try:
+            self.backend.set(
+                make_key(access_token, endpoint, params), fast_json.dumps(data), ttl
+            )
+        except Exception as ex:
+            logger.error(f"Response cache write failed: {ex}")
+
+    def clear(self):
+        self.backend.clear()
+        with self._lock:
+            self._counters.clear()
+
+    def stats(self):
+        with self._lock:
+            endpoints = {
+                endpoint: dict(
+                    counters,
+                    hit_rate=counters["hits"] / (counters["hits"] + counters["misses"]),
+                )
+                for endpoint, counters in self._counters.items()
+            }
+        hits = sum(counters["hits"] for counters in endpoints.values())
+        lookups = hits + sum(counters["misses"] for counters in endpoints.values())
+        return dict(
+            self.backend.stats(),
+            backend=self.backend.name,
+            hit_rate=hits / lookups if lookups else 0.0,
+            endpoints=endpoints,
+        )
+
+
+def create_cache(backend=RESPONSE_CACHE_BACKEND):
+    if backend == "memory":
+        return ResponseCache(MemoryBackend())
+    if backend == "sqlite":
+        return ResponseCache(SQLiteBackend())
+    if backend == "none":
+        return None
+    raise Exception(f"[Response Cache Error] Backend not supported: {backend}")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """
+    Return the process-wide response cache, or None when RESPONSE_CACHE_BACKEND=none.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = create_cache()
+    return _cache
@@ -0,0 +1,172 @@
+import fast_json
+
+
+class Passage:
+    """
+    One piece of retrieved text. Rendered straight into the prompt as
+    "- [source | timestamp] text".
+    """
+
+    __slots__ = ("text", "source", "timestamp", "score", "order")
+
+    def __init__(self, text, source=None, timestamp=None, score=None, order=0):
+        self.text = text
+        self.source = source
+        self.timestamp = timestamp
+        self.score = score
+        self.order = order
+
+    def header(self):
+        labels = [label for label in (self.source, self.timestamp) if label]
+        return f"[{' | '.join(labels)}] " if labels else ""
+
+    def render(self):
+        return f"- {self.header()}{self.text}"
+
+
+class SearchMatch(Passage):
+    """
+    A matched chunk from `search`; the source is its document's name.
+    """
+
+    __slots__ = ("document_id",)
+
+    def __init__(self, text, source=None, timestamp=None, score=None, document_id=None):
+        super().__init__(text, source, timestamp, score)
+        self.document_id = document_id
+
+    @classmethod
+    def from_dict(cls, item):
+        document = item.get("document") or {}
+        return cls(
+            item.get("matched_content") or "",
+            source=document.get("name"),
+            timestamp=document.get("modified_time") or document.get("created_time"),
+            score=item.get("distance"),
+            document_id=document.get("id"),
+        )
+
+
+class DiscussionMessage(Passage):
+    """
+    A message from discussion or thread contents; the source is its author.
+    """
+
+    __slots__ = ("thread",)
+
+    def __init__(self, text, source=None, timestamp=None, thread=None):
+        super().__init__(text, source, timestamp)
+        self.thread = thread
+
+    @classmethod
+    def from_message(cls, message, thread=None):
+        if isinstance(message, str):
+            return cls(message, thread=thread)
+        if isinstance(message, dict):
+            text = (
+                message.get("text") or message.get("content") or message.get("message")
+            )
+            author = (
+                message.get("user_name") or message.get("user") or message.get("author")
+            )
+            timestamp = (
+                message.get("timestamp") or message.get("ts") or message.get("date")
+            )
+            return cls(
+                str(text) if text else "", author, timestamp and str(timestamp), thread
+            )
+        return cls(str(message), thread=thread)
+
+
+class Document(Passage):
+    """
+    A document or channel from a listing; the text is its name.
+    """
+
+    __slots__ = ("document_id", "integration_type")
+
+    def __init__(
+        self, text, source=None, timestamp=None, document_id=None, integration_type=None
+    ):
+        super().__init__(text, source, timestamp)
+        self.document_id = document_id
+        self.integration_type = integration_type
+
+    @classmethod
+    def from_dict(cls, item):
+        integration_type = item.get("integration_type")
+        return cls(
+            str(item.get("name") or item.get("id") or ""),
+            source=integration_type,
+            timestamp=item.get("modified_time") or item.get("created_time"),
+            document_id=item.get("document_id") or item.get("id"),
+            integration_type=integration_type,
+        )
+
+
+def _is_search(response):
+    return isinstance(response.get("data"), list) and all(
+        isinstance(item, dict) and "matched_content" in item
+        for item in response["data"]
+    )
+
+
+def _is_listing(response):
+    return isinstance(response.get("results"), list) and all(
+        isinstance(item, dict) and "name" in item for item in response["results"]
+    )
+
+
+def _discussion_messages(content):
+    if isinstance(content, str):
+        return [
+            DiscussionMessage(line) for line in content.splitlines() if line.strip()
+        ]
+    if isinstance(content, list):
+        return [DiscussionMessage.from_message(message) for message in content]
+    if isinstance(content, dict):
+        return [
+            DiscussionMessage.from_message(message, str(thread))
+            for thread, messages in content.items()
+            for message in (messages if isinstance(messages, list) else [messages])
+        ]
+    return []
+
+
+def parse_results(response):
+    """
+    Turn a Rememberizer payload into result objects: SearchMatch for `search`,
+    DiscussionMessage for discussion contents, Document for document and channel
+    listings, paragraph Passages for document contents.
+    Returns: list of results, or None for payloads of any other shape
+    """
+    if not isinstance(response, dict):
+        return None
+    if _is_search(response):
+        return [SearchMatch.from_dict(item) for item in response["data"]]
+    if "discussion_content" in response or "thread_contents" in response:
+        messages = _discussion_messages(response.get("discussion_content"))
+        messages += _discussion_messages(response.get("thread_contents"))
+        return [message for message in messages if message.text]
+    if _is_listing(response):
+        return [Document.from_dict(item) for item in response["results"]]
+    if isinstance(response.get("content"), str):
+        return [
+            Passage(paragraph)
+            for paragraph in response["content"].split("\n\n")
+            if paragraph.strip()
+        ]
+    return None
+
+
+def render_results(response):
+    """
+    Returns: the payload in prompt format, one rendered result per line, or
+    compact JSON when it has no known shape
+    """
+    results = parse_results(response)
+    if results is None:
+        return (
+            fast_json.dumps(response) if isinstance(response, dict) else str(response)
+        )
+    return "\n".join(result.render() for result in results)
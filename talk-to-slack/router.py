@@ -0,0 +1,251 @@
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import threading
+
+import numpy as np
+from semantic_cache import HashingEmbedder
+
+logger = logging.getLogger(__name__)
+
+LOCAL_ROUTER_ENABLED = os.environ.get("LOCAL_ROUTER_ENABLED", "false").lower() == "true"
+LOCAL_ROUTER_CONFIDENCE = float(os.environ.get("LOCAL_ROUTER_CONFIDENCE", "0.6"))
+LOCAL_ROUTER_SEARCH_N = int(os.environ.get("LOCAL_ROUTER_SEARCH_N", "5"))
+
+# Tool names (as in FUNCTION_CALLING_TOOLS) the router may pick without the LLM.
+# "get_discussion_content" needs a discussion id and a time window, so questions
+# that look like it are always left to the LLM.
+ROUTABLE_TOOLS = ("search", "account", "list_channels")
+
+# Rules are classifier features, not decisions: a match adds RULE_BOOST to its
+# label's similarity, so a question is only routed when the classifier agrees.
+# Tool lookups (channels, account) are only routed when a rule matched too.
+# The rules stay narrow: "which channels discussed X" or "my account tier customers"
+# are searches, not tool lookups.
+RULE_BOOST = 0.1
+RULES = [
+    (
+        "list_channels",
+        re.compile(
+            r"^\W*(please )?(list|show)( me)?( all| my| the)*( slack)? channels\b"
+            r"|\b(which|what) (slack )?channels (are|do i|have i|does my)\b"
+            r"|\bchannels? (list|names)\b|\bchannel names\b",
+            re.IGNORECASE,
+        ),
+    ),
+    (
+        "account",
+        re.compile(
+            r"\b(my|the) (rememberizer )?account"
+            r"( (info|information|details|settings))?\W*$|\bwho am i\b"
+            r"|\bwhat plan am i on\b"
+            r"|\bmy (email|user ?name|profile|plan|subscription)\b",
+            re.IGNORECASE,
+        ),
+    ),
+    (
+        "get_discussion_content",
+        re.compile(
+            r"#[\w-]+|\b(in|on) the [\w-]+ channel\b"
+            r"|\b(today|yesterday|this week|last week|last \d+ (hours|days))\b",
+            re.IGNORECASE,
+        ),
+    ),
+]
+
+SEED_EXAMPLES = {
+    "list_channels": [
+        "list all slack channels",
+        "what channels do I have",
+        "show me the channels in my workspace",
+        "which slack channels are connected",
+        "channel names",
+    ],
+    "account": [
+        "tell me about my rememberizer account",
+        "what is my account email",
+        "account information",
+        "who am I logged in as",
+        "what plan am I on",
+    ],
+    "get_discussion_content": [
+        "what happened in the general channel today",
+        "summarize the discussion in #engineering this week",
+        "what did people say in the random channel yesterday",
+        "recent messages in the support channel",
+        "catch me up on the last 3 days of the design channel",
+    ],
+    "search": [
+        "how do we deploy the backend service",
+        "what did we decide about the pricing change",
+        "who is responsible for the billing integration",
+        "is there a guide for onboarding new engineers",
+        "why did the release get delayed",
+        "what is the status of the mobile app migration",
+        "find the notes about the customer escalation",
+    ],
+}
+
+
+class RouteDecision:
+    __slots__ = ("tool", "arguments", "confidence", "source")
+
+    def __init__(self, tool, arguments, confidence, source):
+        self.tool = tool
+        self.arguments = arguments
+        self.confidence = confidence
+        self.source = source
+
+    def __repr__(self):
+        return (
+            f"RouteDecision(tool={self.tool!r}, confidence={self.confidence:.2f}, "
+            f"source={self.source!r})"
+        )
+
+
+class IntentRouter:
+    """
+    Picks the tool for obvious questions locally with a nearest-centroid
+    classifier over hashed n-gram embeddings of seed examples, nudged by regex
+    rules (never decided by them alone).
+    `route` returns None when the LLM tool-choice call should decide instead.
+    """
+
+    def __init__(
+        self,
+        confidence=LOCAL_ROUTER_CONFIDENCE,
+        search_n=LOCAL_ROUTER_SEARCH_N,
+        examples=SEED_EXAMPLES,
+        embedder=None,
+        temperature=0.1,
+    ):
+        self.confidence = confidence
+        self.search_n = search_n
+        self.temperature = temperature
+        self.embedder = embedder or HashingEmbedder()
+        self.labels = list(examples)
+        centroids = np.stack(
+            [
+                np.mean([self.embedder.embed(text) for text in examples[label]], axis=0)
+                for label in self.labels
+            ]
+        )
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        self.centroids = centroids / np.where(norms == 0, 1, norms)
+        self._lock = threading.Lock()
+        self.routed = 0
+        self.deferred = 0
+
+    def classify(self, message):
+        """
+        Returns: (label, confidence, source)
+        """
+        similarities = self.centroids @ self.embedder.embed(message)
+        matched = set()
+        for label, pattern in RULES:
+            if pattern.search(message):
+                matched.add(label)
+                similarities[self.labels.index(label)] += RULE_BOOST
+        scores = np.exp((similarities - similarities.max()) / self.temperature)
+        probabilities = scores / scores.sum()
+        best = int(np.argmax(probabilities))
+        label = self.labels[best]
+        source = "rule+classifier" if label in matched else "classifier"
+        return label, float(probabilities[best]), source
+
+    def route(self, message):
+        label, confidence, source = self.classify(message)
+        decision = None
+        # A tool lookup also needs a matching rule; only searches are routed on the
+        # classifier alone, since a wrongly routed search still finds the topic.
+        corroborated = label == "search" or source == "rule+classifier"
+        if label in ROUTABLE_TOOLS and corroborated and confidence >= self.confidence:
+            arguments = {"q": message, "n": self.search_n} if label == "search" else {}
+            decision = RouteDecision(label, arguments, confidence, source)
+        with self._lock:
+            if decision:
+                self.routed += 1
+            else:
+                self.deferred += 1
+        logger.debug(
+            f"Local router: {label} ({confidence:.2f}, {source}) -> "
+            f"{'routed' if decision else 'LLM'}"
+        )
+        return decision
+
+    def stats(self):
+        with self._lock:
+            total = self.routed + self.deferred
+            return {
+                "routed": self.routed,
+                "deferred": self.deferred,
+                "routed_rate": self.routed / total if total else 0.0,
+            }
+
+
+def evaluate(router, examples):
+    """
+    Replay labeled examples ({"message": ..., "tool": ...}) through the router.
+    Accuracy is measured on the questions the router answers itself; coverage is
+    the share of questions it answers without the LLM.
+    """
+    total = routed = correct = 0
+    confusion = {}
+    for example in examples:
+        total += 1
+        decision = router.route(example["message"])
+        predicted = decision.tool if decision else "llm"
+        key = f"{example['tool']}->{predicted}"
+        confusion[key] = confusion.get(key, 0) + 1
+        if decision:
+            routed += 1
+            correct += decision.tool == example["tool"]
+    return {
+        "total": total,
+        "routed": routed,
+        "coverage": routed / total if total else 0.0,
+        "accuracy": correct / routed if routed else 0.0,
+        "confusion": confusion,
+    }
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    """
+    Return the process-wide intent router, or None unless LOCAL_ROUTER_ENABLED=true.
+    """
+    global _router
+    if not LOCAL_ROUTER_ENABLED:
+        return None
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = IntentRouter()
+    return _router
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Report local router accuracy against a labeled replay set."
+    )
+    parser.add_argument(
+        "replay", help='JSONL file with {"message": ..., "tool": ...} per line'
+    )
+    parser.add_argument("--confidence", type=float, default=LOCAL_ROUTER_CONFIDENCE)
+    args = parser.parse_args(argv)
+
+    with open(args.replay) as replay:
+        examples = [json.loads(line) for line in replay if line.strip()]
+    report = evaluate(IntentRouter(confidence=args.confidence), examples)
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+import copy
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+from response_cache import DEFAULT_TTLS
+
+logger = logging.getLogger(__name__)
+
+SEMANTIC_CACHE_ENABLED = (
+    os.environ.get("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+)
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.9"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", "256"))
+SEMANTIC_CACHE_MAX_USERS = int(os.environ.get("SEMANTIC_CACHE_MAX_USERS", "1024"))
+SEMANTIC_CACHE_TTL = int(
+    os.environ.get("SEMANTIC_CACHE_TTL", str(DEFAULT_TTLS["search"]))
+)
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class HashingEmbedder:
+    """
+    Dependency-free text embedding: word unigrams/bigrams and character n-grams
+    hashed into a fixed number of signed buckets, L2-normalized.
+    """
+
+    def __init__(self, dim=1024, char_ngrams=(3, 4, 5)):
+        self.dim = dim
+        self.char_ngrams = char_ngrams
+
+    def features(self, text):
+        words = _WORD_RE.findall(text.lower())
+        features = list(words)
+        features += [f"{a} {b}" for a, b in zip(words, words[1:])]
+        for word in words:
+            padded = f" {word} "
+            for size in self.char_ngrams:
+                features += [
+                    padded[i : i + size] for i in range(len(padded) - size + 1)
+                ]
+        return features
+
+    def embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self.features(text):
+            digest = zlib.crc32(feature.encode("utf-8"))
+            vector[digest % self.dim] += 1.0 if digest & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class _UserIndex:
+    """
+    One user's query vectors. The matrix starts small and doubles up to `capacity`
+    rows, so users with few queries do not hold a full-size matrix.
+    """
+
+    INITIAL_ROWS = 8
+
+    def __init__(self, capacity, dim):
+        self.capacity = capacity
+        rows = min(capacity, self.INITIAL_ROWS)
+        self.vectors = np.zeros((rows, dim), dtype=np.float32)
+        self.entries = [None] * rows
+        self.last_used = np.zeros(rows, dtype=np.float64)
+        self.size = 0
+
+    def _grow(self):
+        rows = min(self.capacity, len(self.entries) * 2)
+        vectors = np.zeros((rows, self.vectors.shape[1]), dtype=np.float32)
+        vectors[: self.size] = self.vectors[: self.size]
+        last_used = np.zeros(rows, dtype=np.float64)
+        last_used[: self.size] = self.last_used[: self.size]
+        self.vectors, self.last_used = vectors, last_used
+        self.entries += [None] * (rows - len(self.entries))
+
+    def search(self, vector):
+        if not self.size:
+            return None, 0.0
+        similarities = self.vectors[: self.size] @ vector
+        slot = int(np.argmax(similarities))
+        return slot, float(similarities[slot])
+
+    def add(self, vector, entry, now):
+        if self.size == len(self.entries) and self.size < self.capacity:
+            self._grow()
+        if self.size < len(self.entries):
+            slot = self.size
+            self.size += 1
+        else:
+            slot = int(np.argmin(self.last_used))
+        self.vectors[slot] = vector
+        self.entries[slot] = entry
+        self.last_used[slot] = now
+
+    def remove(self, slot):
+        last = self.size - 1
+        self.vectors[slot] = self.vectors[last]
+        self.entries[slot] = self.entries[last]
+        self.last_used[slot] = self.last_used[last]
+        self.entries[last] = None
+        self.size = last
+
+
+class SemanticCache:
+    """
+    Reuses `search` results for near-duplicate queries of the same user.
+    A lookup hits when the cosine similarity with a stored query is above `threshold`
+    and the stored result has at least as many chunks (`n`) as requested.
+    """
+
+    def __init__(
+        self,
+        threshold=SEMANTIC_CACHE_THRESHOLD,
+        max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+        max_users=SEMANTIC_CACHE_MAX_USERS,
+        ttl=SEMANTIC_CACHE_TTL,
+        embedder=None,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_users = max_users
+        self.ttl = ttl
+        self.embedder = embedder or HashingEmbedder()
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _user_key(self, access_token):
+        return hashlib.sha256(access_token.encode("utf-8")).hexdigest()
+
+    def get(self, access_token, arguments):
+        query = arguments.get("q")
+        if not query:
+            return None
+        vector = self.embedder.embed(query)
+        now = time.time()
+        with self._lock:
+            index = self._users.get(self._user_key(access_token))
+            slot, similarity = index.search(vector) if index else (None, 0.0)
+            if slot is not None and similarity >= self.threshold:
+                entry = index.entries[slot]
+                if entry["expires_at"] <= now:
+                    index.remove(slot)
+                elif entry["n"] >= arguments.get("n", 0):
+                    index.last_used[slot] = now
+                    self.hits += 1
+                    logger.debug(
+                        f"Semantic cache hit ({similarity:.3f}) for {query!r} "
+                        f"using {entry['q']!r}"
+                    )
+                    # A copy, so a caller that edits the result leaves the cache intact.
+                    return copy.deepcopy(entry["data"])
+            self.misses += 1
+        return None
+
+    def set(self, access_token, arguments, data):
+        query = arguments.get("q")
+        if not query:
+            return
+        vector = self.embedder.embed(query)
+        now = time.time()
+        entry = {
+            "q": query,
+            "n": arguments.get("n", 0),
+            # A copy, so a caller that keeps editing its result leaves the cache intact.
+            "data": copy.deepcopy(data),
+            "expires_at": now + self.ttl,
+        }
+        with self._lock:
+            user_key = self._user_key(access_token)
+            index = self._users.get(user_key)
+            if index is None:
+                index = _UserIndex(self.max_entries, self.embedder.dim)
+                self._users[user_key] = index
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+            self._users.move_to_end(user_key)
+            slot, similarity = index.search(vector)
+            if slot is not None and similarity >= 0.999:
+                index.remove(slot)
+            index.add(vector, entry, now)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "users": len(self._users),
+                "entries": sum(index.size for index in self._users.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "threshold": self.threshold,
+            }
+
+
+_semantic_cache = None
+_semantic_cache_lock = threading.Lock()
+
+
+def get_semantic_cache():
+    """
+    Return the process-wide semantic cache, or None when SEMANTIC_CACHE_ENABLED=false.
+    """
+    global _semantic_cache
+    if not SEMANTIC_CACHE_ENABLED:
+        return None
+    if _semantic_cache is None:
+        with _semantic_cache_lock:
+            if _semantic_cache is None:
+                _semantic_cache = SemanticCache()
+    return _semantic_cache
@@ -0,0 +1,162 @@
+import logging
+import os
+import secrets
+import threading
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from redis_store import RedisBackend
+from response_cache import MemoryBackend, SQLiteBackend
+from werkzeug.datastructures import CallbackDict
+
+logger = logging.getLogger(__name__)
+
+SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "cookie")
+SESSION_STORE_PATH = os.environ.get("SESSION_STORE_PATH", "session_store.sqlite3")
+SESSION_STORE_MAX_BYTES = int(
+    os.environ.get("SESSION_STORE_MAX_BYTES", str(64 * 1024 * 1024))
+)
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(session):
+            session.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """
+    Keeps session data in `backend` (a response cache backend or a RedisBackend)
+    and only a random session id in the cookie. Data is written back only when the
+    request changed it, and clearing the session deletes it from the store, so a
+    logout revokes the session on every worker sharing the backend.
+    """
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._counters = {"loaded": 0, "missing": 0, "saved": 0, "deleted": 0}
+        self._errors = 0
+        self._lock = threading.Lock()
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def _failed(self, action, ex):
+        logger.error(f"Session store {action} failed: {ex}")
+        with self._lock:
+            self._errors += 1
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            try:
+                value = self.backend.get(sid)
+            except Exception as ex:
+                self._failed("read", ex)
+                value = None
+            if value is not None:
+                self._count("loaded")
+                return ServerSideSession(self.serializer.loads(value), sid)
+            self._count("missing")
+        # Unknown ids are never adopted, so a planted cookie cannot fix the session.
+        return ServerSideSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        if not session:
+            if session.modified and not session.new:
+                try:
+                    self.backend.delete(session.sid)
+                    self._count("deleted")
+                except Exception as ex:
+                    self._failed("delete", ex)
+                response.delete_cookie(
+                    name,
+                    domain=domain,
+                    path=path,
+                    secure=secure,
+                    samesite=samesite,
+                    httponly=httponly,
+                )
+            return
+
+        if session.modified:
+            try:
+                self.backend.set(
+                    session.sid,
+                    self.serializer.dumps(dict(session)),
+                    app.permanent_session_lifetime.total_seconds(),
+                )
+                self._count("saved")
+            except Exception as ex:
+                self._failed("write", ex)
+        if session.new or session.modified or self.should_set_cookie(app, session):
+            response.set_cookie(
+                name,
+                session.sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=httponly,
+                domain=domain,
+                path=path,
+                secure=secure,
+                samesite=samesite,
+            )
+
+    def stats(self):
+        try:
+            backend_stats = self.backend.stats()
+        except Exception as ex:
+            self._failed("stats", ex)
+            backend_stats = {}
+        with self._lock:
+            counters = dict(self._counters, errors=self._errors)
+        return dict(backend_stats, backend=self.backend.name, **counters)
+
+
+def create_session_interface(backend=SESSION_BACKEND):
+    if backend == "memory":
+        return ServerSideSessionInterface(MemoryBackend(SESSION_STORE_MAX_BYTES))
+    if backend == "sqlite":
+        return ServerSideSessionInterface(
+            SQLiteBackend(SESSION_STORE_PATH, SESSION_STORE_MAX_BYTES)
+        )
+    if backend == "redis":
+        return ServerSideSessionInterface(RedisBackend(prefix="session:"))
+    if backend == "cookie":
+        return None
+    raise Exception(f"[Session Store Error] Backend not supported: {backend}")
+
+
+_interface = None
+_interface_lock = threading.Lock()
+
+
+def get_session_interface():
+    """
+    Return the process-wide server-side session interface, or None when
+    SESSION_BACKEND=cookie (Flask's signed-cookie sessions).
+    """
+    global _interface
+    if _interface is None:
+        with _interface_lock:
+            if _interface is None:
+                _interface = create_session_interface()
+    return _interface
@@ -0,0 +1,126 @@
+import asyncio
+import copy
+import logging
+import os
+import threading
+from concurrent.futures import Future
+
+from response_cache import make_key
+
+logger = logging.getLogger(__name__)
+
+SINGLE_FLIGHT_ENABLED = (
+    os.environ.get("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+)
+
+
+class SingleFlight:
+    """
+    Deduplicates identical in-flight calls, keyed on (access token, endpoint,
+    normalized params). The first caller runs the call; callers that arrive while it
+    is in flight wait for it and get a copy of its result (or its exception).
+    Threads and asyncio tasks share the same in-flight table, including tasks
+    running on different event loops. With `retain`, successful results are kept
+    and served to later identical calls too (a memo for one batch run).
+    """
+
+    def __init__(self, retain=False):
+        self.retain = retain
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def _join(self, key, endpoint):
+        """
+        Returns: (future, leader) where leader is True if the caller must run the call
+        """
+        with self._lock:
+            counters = self._counters.setdefault(endpoint, {"calls": 0, "saved": 0})
+            future = self._calls.get(key)
+            if future is not None:
+                counters["saved"] += 1
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            counters["calls"] += 1
+            return future, True
+
+    def _settle(self, key, future, result=None, exception=None):
+        if not self.retain or exception is not None:
+            with self._lock:
+                self._calls.pop(key, None)
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+
+    def do(self, access_token, endpoint, params, fetch):
+        key = make_key(access_token, endpoint, params)
+        future, leader = self._join(key, endpoint)
+        if not leader:
+            logger.debug(f"Joined in-flight {endpoint} call")
+            return copy.deepcopy(future.result())
+        try:
+            result = fetch()
+        except Exception as ex:
+            self._settle(key, future, exception=ex)
+            raise
+        except BaseException:
+            self._settle(
+                key, future, exception=Exception("[Single Flight Error] Call aborted")
+            )
+            raise
+        self._settle(key, future, result)
+        return result
+
+    async def do_async(self, access_token, endpoint, params, fetch):
+        key = make_key(access_token, endpoint, params)
+        future, leader = self._join(key, endpoint)
+        if not leader:
+            logger.debug(f"Joined in-flight {endpoint} call")
+            return copy.deepcopy(await asyncio.wrap_future(future))
+        try:
+            result = await fetch()
+        except Exception as ex:
+            self._settle(key, future, exception=ex)
+            raise
+        except BaseException:
+            # Cancelled (e.g. by a tool-call timeout): release the waiters too.
+            self._settle(
+                key, future, exception=Exception("[Single Flight Error] Call aborted")
+            )
+            raise
+        self._settle(key, future, result)
+        return result
+
+    def stats(self):
+        with self._lock:
+            endpoints = {
+                endpoint: dict(counters)
+                for endpoint, counters in self._counters.items()
+            }
+            in_flight = sum(not future.done() for future in self._calls.values())
+        return {
+            "in_flight": in_flight,
+            "calls": sum(counters["calls"] for counters in endpoints.values()),
+            "saved": sum(counters["saved"] for counters in endpoints.values()),
+            "endpoints": endpoints,
+        }
+
+
+_single_flight = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight():
+    """
+    Return the process-wide call deduplicator, or None when SINGLE_FLIGHT_ENABLED=false.
+    """
+    global _single_flight
+    if not SINGLE_FLIGHT_ENABLED:
+        return None
+    if _single_flight is None:
+        with _single_flight_lock:
+            if _single_flight is None:
+                _single_flight = SingleFlight()
+    return _single_flight
@@ -0,0 +1,370 @@
+import asyncio
+import contextvars
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import http_pool
+from context_builder import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Comma-separated sources the `search` tool fans out to, e.g.
+# "rememberizer:slack,rememberizer:google_drive,common_knowledge,local_index".
+# Empty keeps the single Rememberizer search.
+KNOWLEDGE_SOURCES = os.environ.get("KNOWLEDGE_SOURCES", "")
+SOURCE_TIMEOUT = float(os.environ.get("SOURCE_TIMEOUT", "5"))
+# Tokens of matched content each source may contribute.
+SOURCE_TOKEN_BUDGET = int(os.environ.get("SOURCE_TOKEN_BUDGET", "1500"))
+
+# Source fetches running at once across all searches. A fetch past its deadline
+# is abandoned but keeps its slot until its (deadline-capped) HTTP call returns;
+# once every slot is taken, further fetches fail at once rather than queue.
+SOURCE_MAX_IN_FLIGHT = int(os.environ.get("SOURCE_MAX_IN_FLIGHT", "16"))
+
+_source_executor = ThreadPoolExecutor(
+    max_workers=SOURCE_MAX_IN_FLIGHT, thread_name_prefix="source"
+)
+_source_slots = threading.BoundedSemaphore(SOURCE_MAX_IN_FLIGHT)
+
+
+def _integration_type(item):
+    document = item.get("document") or {}
+    integration = document.get("integration") or {}
+    return integration.get("integration_type") or document.get("type")
+
+
+def _labelled(item, label):
+    """
+    Returns: a copy of the search match with the source label before its document name
+    """
+    document = dict(item.get("document") or {})
+    name = document.get("name")
+    document["name"] = f"{label} / {name}" if name else label
+    return dict(item, document=document)
+
+
+def _search_matches(data, success, name):
+    if not success:
+        raise Exception(f"[Knowledge Source Error] {name} search failed: {data}")
+    return data.get("data") or [] if isinstance(data, dict) else []
+
+
+class SourceBusyError(Exception):
+    def __init__(self, name):
+        super().__init__(
+            f"[Knowledge Source Error] {name}: {SOURCE_MAX_IN_FLIGHT} fetches "
+            f"already in flight"
+        )
+
+
+class RememberizerSource:
+    """
+    Rememberizer `search`, optionally limited to one integration type. Sources over
+    the same account share a single search call through the response cache and
+    single-flight, so adding one per integration type costs no extra requests.
+    """
+
+    def __init__(
+        self, integration_type=None, timeout=SOURCE_TIMEOUT, budget=SOURCE_TOKEN_BUDGET
+    ):
+        self.integration_type = integration_type
+        self.name = (
+            f"rememberizer:{integration_type}" if integration_type else "rememberizer"
+        )
+        self.timeout = timeout
+        self.budget = budget
+
+    def _select(self, items):
+        return [
+            _labelled(item, self.name)
+            for item in items
+            if self.integration_type is None
+            or _integration_type(item) == self.integration_type
+        ]
+
+    def fetch(self, provider, query, n):
+        data, success = provider.search_rememberizer({"q": query, "n": n})
+        return self._select(_search_matches(data, success, self.name))
+
+    async def fetch_async(self, provider, query, n):
+        data, success = await provider.search_rememberizer({"q": query, "n": n})
+        return self._select(_search_matches(data, success, self.name))
+
+
+class CommonKnowledgeSource:
+    """
+    Search matches from the common knowledge the user subscribed to, labelled with
+    the knowledge's name.
+    """
+
+    name = "common_knowledge"
+
+    def __init__(self, timeout=SOURCE_TIMEOUT, budget=SOURCE_TOKEN_BUDGET):
+        self.timeout = timeout
+        self.budget = budget
+
+    def _select(self, knowledge, items):
+        names = {
+            document_id: entry.get("name") or self.name
+            for entry in (knowledge if isinstance(knowledge, list) else [])
+            for document_id in entry.get("document_ids") or []
+        }
+        return [
+            _labelled(item, names[(item.get("document") or {}).get("id")])
+            for item in items
+            if (item.get("document") or {}).get("id") in names
+        ]
+
+    def fetch(self, provider, query, n):
+        knowledge, success = provider.get_common_knowledge({})
+        if not success:
+            raise Exception(f"[Knowledge Source Error] {self.name}: {knowledge}")
+        data, success = provider.search_rememberizer({"q": query, "n": n})
+        return self._select(knowledge, _search_matches(data, success, self.name))
+
+    async def fetch_async(self, provider, query, n):
+        knowledge, success = await provider.get_common_knowledge({})
+        if not success:
+            raise Exception(f"[Knowledge Source Error] {self.name}: {knowledge}")
+        data, success = await provider.search_rememberizer({"q": query, "n": n})
+        return self._select(knowledge, _search_matches(data, success, self.name))
+
+
+class LocalIndexSource:
+    """
+    The provider's local vector index, queried directly.
+    """
+
+    name = "local_index"
+
+    def __init__(self, timeout=SOURCE_TIMEOUT, budget=SOURCE_TOKEN_BUDGET):
+        self.timeout = timeout
+        self.budget = budget
+
+    def fetch(self, provider, query, n):
+        if provider.local_index is None:
+            return []
+        results = provider.local_index.search(provider.scope(), query, n)
+        return [_labelled(item, self.name) for item in results]
+
+    async def fetch_async(self, provider, query, n):
+        if provider.local_index is None:
+            return []
+        results = await asyncio.to_thread(
+            provider.local_index.search, await provider.scope(), query, n
+        )
+        return [_labelled(item, self.name) for item in results]
+
+
+def within_budget(items, budget):
+    """
+    Returns: the best-scored items whose matched content fits in `budget` tokens
+    """
+    kept, used = [], 0
+    for item in sorted(items, key=lambda item: -(item.get("distance") or 0)):
+        tokens = count_tokens(item.get("matched_content") or "")
+        if used + tokens > budget:
+            continue
+        kept.append(item)
+        used += tokens
+    return kept
+
+
+class SourceRegistry:
+    """
+    Knowledge sources a `search` fans out to. Every source runs at the same time
+    under its own deadline, which also bounds its HTTP calls; matches that fit each
+    source's token budget are merged best score first. A source that misses its
+    deadline, fails or finds every fetch slot taken is left out and reported, so
+    it never holds up the answer.
+    """
+
+    def __init__(self, sources=()):
+        self.sources = []
+        self._counters = {}
+        self._lock = threading.Lock()
+        for source in sources:
+            self.register(source)
+
+    def register(self, source):
+        with self._lock:
+            self.sources.append(source)
+            self._counters[source.name] = {
+                "calls": 0,
+                "results": 0,
+                "timeouts": 0,
+                "busy": 0,
+                "errors": 0,
+                "seconds": 0.0,
+            }
+
+    def _query(self, arguments):
+        return str(arguments.get("q") or ""), int(arguments.get("n") or 5)
+
+    def _fetch(self, slots, source, provider, query, n, started):
+        # Runs on a slot taken by `_submit`; the source's HTTP calls get what is
+        # left of its deadline as their timeout.
+        try:
+            remaining = source.timeout - (time.perf_counter() - started)
+            with http_pool.deadline(remaining):
+                return source.fetch(provider, query, n)
+        finally:
+            slots.release()
+
+    def _submit(self, source, provider, query, n, started):
+        slots = _source_slots
+        if not slots.acquire(blocking=False):
+            return None
+        try:
+            return _source_executor.submit(
+                contextvars.copy_context().run,
+                self._fetch,
+                slots,
+                source,
+                provider,
+                query,
+                n,
+                started,
+            )
+        except BaseException:
+            slots.release()
+            raise
+
+    def search(self, provider, arguments):
+        """
+        Returns: data (dict), success (bool) as for a single `search`, with a
+        `sources` report and `partial` set when a source was left out
+        """
+        query, n = self._query(arguments)
+        started = time.perf_counter()
+        futures = [
+            self._submit(source, provider, query, n, started) for source in self.sources
+        ]
+        outcomes = []
+        for source, future in zip(self.sources, futures):
+            if future is None:
+                outcomes.append(SourceBusyError(source.name))
+                continue
+            remaining = source.timeout - (time.perf_counter() - started)
+            try:
+                outcomes.append(future.result(timeout=max(remaining, 0)))
+            except Exception as ex:
+                future.cancel()
+                outcomes.append(ex)
+        return self._merge(outcomes, started)
+
+    async def search_async(self, provider, arguments):
+        query, n = self._query(arguments)
+        started = time.perf_counter()
+        outcomes = await asyncio.gather(
+            *(
+                asyncio.wait_for(source.fetch_async(provider, query, n), source.timeout)
+                for source in self.sources
+            ),
+            return_exceptions=True,
+        )
+        return self._merge(outcomes, started)
+
+    def _merge(self, outcomes, started):
+        elapsed = time.perf_counter() - started
+        report, merged = {}, []
+        for order, (source, outcome) in enumerate(zip(self.sources, outcomes)):
+            if isinstance(outcome, TimeoutError):
+                logger.warning(f"Knowledge source {source.name} missed its deadline")
+                report[source.name] = {"status": "timeout"}
+            elif isinstance(outcome, SourceBusyError):
+                logger.warning(f"Knowledge source {source.name} skipped: {outcome}")
+                report[source.name] = {"status": "busy"}
+            elif isinstance(outcome, asyncio.CancelledError):
+                # gather(return_exceptions=True) hands back a cancelled fetch too.
+                logger.warning(f"Knowledge source {source.name} was cancelled")
+                report[source.name] = {"status": "error"}
+            elif isinstance(outcome, Exception):
+                logger.error(f"Knowledge source {source.name} failed: {outcome}")
+                report[source.name] = {"status": "error"}
+            else:
+                items = within_budget(outcome, source.budget)
+                merged += [(item, order) for item in items]
+                report[source.name] = {"status": "ok", "results": len(items)}
+            self._record(source.name, report[source.name], elapsed)
+
+        seen, data = set(), []
+        for item, _ in sorted(
+            merged, key=lambda pair: (-(pair[0].get("distance") or 0), pair[1])
+        ):
+            if item.get("matched_content") not in seen:
+                seen.add(item.get("matched_content"))
+                data.append(item)
+        if not any(entry["status"] == "ok" for entry in report.values()):
+            return {"error": "No knowledge source answered", "sources": report}, False
+        return {
+            "data": data,
+            "sources": report,
+            "partial": any(entry["status"] != "ok" for entry in report.values()),
+        }, True
+
+    def _record(self, name, entry, elapsed):
+        with self._lock:
+            counters = self._counters[name]
+            counters["calls"] += 1
+            counters["seconds"] += elapsed
+            counters["results"] += entry.get("results", 0)
+            if entry["status"] == "timeout":
+                counters["timeouts"] += 1
+            elif entry["status"] == "busy":
+                counters["busy"] += 1
+            elif entry["status"] == "error":
+                counters["errors"] += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                name: dict(
+                    counters,
+                    seconds=round(counters["seconds"], 3),
+                    timeout_rate=(
+                        counters["timeouts"] / counters["calls"]
+                        if counters["calls"]
+                        else 0.0
+                    ),
+                )
+                for name, counters in self._counters.items()
+            }
+
+
+def create_source(spec):
+    name, _, option = spec.strip().partition(":")
+    if name == "rememberizer":
+        return RememberizerSource(option or None)
+    if name == "common_knowledge":
+        return CommonKnowledgeSource()
+    if name == "local_index":
+        return LocalIndexSource()
+    raise Exception(f"[Knowledge Source Error] Source not supported: {spec}")
+
+
+def create_source_registry(specs=KNOWLEDGE_SOURCES):
+    specs = [spec for spec in specs.split(",") if spec.strip()]
+    if not specs:
+        return None
+    return SourceRegistry(create_source(spec) for spec in specs)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_source_registry():
+    """
+    Return the process-wide knowledge source registry, or None when
+    KNOWLEDGE_SOURCES is empty (`search` queries Rememberizer alone).
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = create_source_registry()
+    return _registry
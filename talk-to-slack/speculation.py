@@ -0,0 +1,227 @@
+import asyncio
+import contextvars
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from provider import TOOL_CALL_MAX_WORKERS, TOOL_CALL_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+SPECULATIVE_SEARCH_ENABLED = (
+    os.environ.get("SPECULATIVE_SEARCH_ENABLED", "false").lower() == "true"
+)
+SPECULATIVE_SEARCH_N = int(os.environ.get("SPECULATIVE_SEARCH_N", "5"))
+# Word overlap (Jaccard) between the model's `q` and the question needed to use the
+# speculative result.
+SPECULATIVE_MIN_SIMILARITY = float(os.environ.get("SPECULATIVE_MIN_SIMILARITY", "0.5"))
+
+_WORD = re.compile(r"\w+")
+
+_speculation_executor = ThreadPoolExecutor(
+    max_workers=TOOL_CALL_MAX_WORKERS, thread_name_prefix="speculation"
+)
+
+
+def similarity(a, b):
+    """
+    Returns: Jaccard similarity of the two texts' lowercased words
+    """
+    a, b = set(_WORD.findall(a.lower())), set(_WORD.findall(b.lower()))
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class Speculation:
+    """
+    One request's speculative `search`, started with the raw question while the
+    model is still choosing tools. `claim` hands its response to a matching search
+    call; anything else discards it. Exactly one of the two settles it, setting
+    `outcome` ("hits", "misses" or "failures") and the `saved` seconds.
+    """
+
+    def __init__(self, speculator, arguments):
+        self.speculator = speculator
+        self.arguments = arguments
+        self.started = time.perf_counter()
+        self.finished = None
+        self.future = None
+        self.outcome = None
+        self.saved = 0.0
+
+    def run(self, provider):
+        try:
+            return provider.call_function("search", self.arguments)
+        finally:
+            self.finished = time.perf_counter()
+
+    async def run_async(self, provider):
+        try:
+            return await provider.call_function("search", self.arguments)
+        finally:
+            self.finished = time.perf_counter()
+
+    def match(self, calls):
+        """
+        Returns: index of the first `search` call close enough to the speculative
+        one (and asking for no more results), or None
+        """
+        for index, (function_name, _, arguments) in enumerate(calls):
+            if (
+                function_name == "search"
+                and arguments.get("n", self.arguments["n"]) <= self.arguments["n"]
+                and similarity(str(arguments.get("q", "")), self.arguments["q"])
+                >= self.speculator.min_similarity
+            ):
+                return index
+        return None
+
+    def _settle(self, outcome, claimed=None):
+        self.outcome = outcome
+        if claimed is not None:
+            # Without speculation the search would have started when it was claimed.
+            self.saved = min(self.finished - self.started, claimed - self.started)
+        self.speculator.record(outcome, self.saved)
+
+    def claim(self, calls):
+        """
+        Returns: (index, response) for the call the speculative search answers, or
+        None when none matches or it failed
+        """
+        if self.outcome is not None:
+            return None
+        index = self.match(calls)
+        if index is None:
+            self.discard()
+            return None
+        self.outcome = "claimed"
+        claimed = time.perf_counter()
+        try:
+            response = self.future.result(timeout=self.speculator.timeout)
+        except Exception as ex:
+            logger.error(f"Speculative search failed: {ex}")
+            self._settle("failures")
+            return None
+        self._settle("hits", claimed)
+        return index, response
+
+    async def claim_async(self, calls):
+        if self.outcome is not None:
+            return None
+        index = self.match(calls)
+        if index is None:
+            self.discard()
+            return None
+        self.outcome = "claimed"
+        claimed = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(self.future, self.speculator.timeout)
+        except Exception as ex:
+            logger.error(f"Speculative search failed: {ex}")
+            self._settle("failures")
+            return None
+        self._settle("hits", claimed)
+        return index, response
+
+    def discard(self):
+        """
+        Drop the speculative search, cancelling it if it has not finished. A search
+        already sent still completes (and fills the response cache).
+        """
+        if self.outcome is not None:
+            return
+        self.future.cancel()
+        # Retrieve the exception of a search that fails after it was discarded.
+        self.future.add_done_callback(
+            lambda future: future.cancelled() or future.exception()
+        )
+        self._settle("misses")
+
+
+class SpeculativeSearch:
+    """
+    Starts a `search` for the raw question alongside the tool-choice completion and
+    counts how often the model's own search could use it, and the latency saved.
+    """
+
+    def __init__(
+        self,
+        n=SPECULATIVE_SEARCH_N,
+        min_similarity=SPECULATIVE_MIN_SIMILARITY,
+        timeout=TOOL_CALL_TIMEOUT,
+    ):
+        self.n = n
+        self.min_similarity = min_similarity
+        self.timeout = timeout
+        self._counters = {"started": 0, "hits": 0, "misses": 0, "failures": 0}
+        self._saved = 0.0
+        self._lock = threading.Lock()
+
+    def _speculation(self, message):
+        with self._lock:
+            self._counters["started"] += 1
+        return Speculation(self, {"q": message, "n": self.n})
+
+    def start(self, provider, message):
+        """
+        Returns: a Speculation running `search` on the speculation pool
+        """
+        speculation = self._speculation(message)
+        speculation.future = _speculation_executor.submit(
+            contextvars.copy_context().run, speculation.run, provider
+        )
+        return speculation
+
+    def start_async(self, provider, message):
+        """
+        Returns: a Speculation running `search` as a task on the current loop
+        """
+        speculation = self._speculation(message)
+        speculation.future = asyncio.ensure_future(speculation.run_async(provider))
+        return speculation
+
+    def record(self, outcome, saved=0.0):
+        with self._lock:
+            self._counters[outcome] += 1
+            self._saved += saved
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            saved = self._saved
+        settled = counters["hits"] + counters["misses"] + counters["failures"]
+        return dict(
+            counters,
+            hit_rate=counters["hits"] / settled if settled else 0.0,
+            saved_seconds=round(saved, 3),
+            avg_saved_ms=(
+                round(saved * 1000 / counters["hits"], 1) if counters["hits"] else 0.0
+            ),
+        )
+
+
+def create_speculative_search(enabled=SPECULATIVE_SEARCH_ENABLED):
+    if not enabled:
+        return None
+    return SpeculativeSearch()
+
+
+_speculator = None
+_speculator_lock = threading.Lock()
+
+
+def get_speculative_search():
+    """
+    Return the process-wide speculative search, or None when
+    SPECULATIVE_SEARCH_ENABLED=false.
+    """
+    global _speculator
+    if _speculator is None:
+        with _speculator_lock:
+            if _speculator is None:
+                _speculator = create_speculative_search()
+    return _speculator
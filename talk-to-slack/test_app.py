@@ -1,7 +1,19 @@
-from unittest.mock import MagicMock, Mock, patch
+import json
+from unittest.mock import ANY, MagicMock, Mock, patch
 
 import pytest
-from app import app
+import tracing
+from app import app, make_provider
+from channel_prefetch import SlackInfoRefresher
+from clients import ProviderRegistry
+from constants import (
+    REMEMBERIZER_DOCUMENTS_ENDPOINT,
+    REMEMBERIZER_INTEGRATIONS_ENDPOINT,
+)
+from conversation import ConversationStore
+from rate_limiter import RateLimiter
+from response_cache import MemoryBackend
+from token_manager import MemoryTokenStore, TokenManager
 
 
 @pytest.fixture
@@ -10,15 +22,23 @@ def client():
         yield client
 
 
-@patch("app.requests.post")
-def test_auth_rememberizer_callback(mock_post, client):
+@pytest.fixture(autouse=True)
+def provider_registry():
+    # Providers hold the HTTP session they were built with; keep each test's own.
+    with patch("app.clients.get_provider_registry", return_value=ProviderRegistry()):
+        yield
+
+
+@patch("app.token_manager.get_token_manager", return_value=None)
+@patch("app.http_pool.get_session")
+def test_auth_rememberizer_callback(mock_get_session, mock_get_manager, client):
     mock_response = Mock()
     mock_response.status_code = 200
     mock_response.json.return_value = {
         "access_token": "mock_access_token",
         "refresh_token": "mock_refresh_token",
     }
-    mock_post.return_value = mock_response
+    mock_get_session.return_value.post.return_value = mock_response
     response = client.get("/auth/rememberizer/callback?code=mock_auth_code")
     assert response.status_code == 302
 
@@ -27,12 +47,62 @@ def test_auth_rememberizer_callback(mock_post, client):
         assert session["rememberizer_refresh_token"] == "mock_refresh_token"
 
 
-@patch("app.requests.get")
-def test_dashboard(mock_get, client):
+@patch("app.token_manager.get_token_manager")
+@patch("app.http_pool.get_session")
+def test_auth_callback_keeps_tokens_server_side(
+    mock_get_session, mock_get_manager, client
+):
+    manager = TokenManager(MemoryTokenStore())
+    mock_get_manager.return_value = manager
+    mock_response = Mock()
+    mock_response.status_code = 200
+    mock_response.json.return_value = {
+        "access_token": "mock_access_token",
+        "refresh_token": "mock_refresh_token",
+        "expires_in": 3600,
+    }
+    mock_get_session.return_value.post.return_value = mock_response
+    client.get("/auth/rememberizer/callback?code=mock_auth_code")
+
+    with client.session_transaction() as session:
+        assert "rememberizer_access_token" not in session
+        token_id = session["rememberizer_token_id"]
+    assert manager.access_token(token_id) == "mock_access_token"
+
+    mock_get_session.return_value.get.return_value.status_code = 200
+    mock_get_session.return_value.get.return_value.json.return_value = {}
+    client.get("/dashboard")
+    assert mock_get_session.return_value.get.call_args.kwargs["headers"] == {
+        "Authorization": "Bearer mock_access_token"
+    }
+
+
+@patch("app.clients.get_provider_registry")
+@patch("app.token_manager.get_token_manager")
+@patch("app.http_pool.get_session")
+def test_logout_forgets_without_refreshing(
+    mock_get_session, mock_get_manager, mock_get_registry, client
+):
+    manager = TokenManager(MemoryTokenStore())
+    mock_get_manager.return_value = manager
+    token_id = manager.save(
+        {"access_token": "expired", "refresh_token": "refresh", "expires_in": -1}
+    )
+    with client.session_transaction() as session:
+        session["rememberizer_token_id"] = token_id
+    client.get("/logout")
+
+    mock_get_session.return_value.post.assert_not_called()
+    mock_get_registry.return_value.forget.assert_called_once_with("expired")
+    assert manager.stored_access_token(token_id) is None
+
+
+@patch("app.http_pool.get_session")
+def test_dashboard(mock_get_session, client):
     mock_response = Mock()
     mock_response.status_code = 200
     mock_response.json.return_value = {"name": "mock_data", "email": "mock_data"}
-    mock_get.return_value = mock_response
+    mock_get_session.return_value.get.return_value = mock_response
 
     with client.session_transaction() as sess:
         sess["rememberizer_access_token"] = "mock_access_token"
@@ -42,13 +112,48 @@ def test_dashboard(mock_get, client):
     assert b"mock_data" in response.data
 
 
-@patch("app.OpenAI")
-@patch("app.requests.get")
-def test_ask(mock_requests_get, mock_openai, client):
+@patch("app.session_interface", Mock())
+@patch("app.http_pool.get_session")
+def test_dashboard_caches_account_info(mock_get_session, client):
+    mock_response = Mock()
+    mock_response.status_code = 200
+    mock_response.json.return_value = {"name": "mock_data", "email": "mock_data"}
+    mock_get_session.return_value.get.return_value = mock_response
+
+    with client.session_transaction() as sess:
+        sess["rememberizer_access_token"] = "mock_access_token"
+    client.get("/dashboard")
+    response = client.get("/dashboard")
+
+    assert b"mock_data" in response.data
+    assert mock_get_session.return_value.get.call_count == 1
+
+
+@patch("app.http_pool.get_session")
+def test_dashboard_keeps_account_info_out_of_cookie_session(mock_get_session, client):
+    mock_response = Mock()
+    mock_response.status_code = 200
+    mock_response.json.return_value = {"name": "mock_data", "email": "mock_data"}
+    mock_get_session.return_value.get.return_value = mock_response
+
+    with client.session_transaction() as sess:
+        sess["rememberizer_access_token"] = "mock_access_token"
+    client.get("/dashboard")
+    response = client.get("/dashboard")
+
+    assert b"mock_data" in response.data
+    assert mock_get_session.return_value.get.call_count == 2
+    with client.session_transaction() as sess:
+        assert "account_info" not in sess
+
+
+@patch("app.clients.get_openai_client")
+@patch("app.http_pool.get_session")
+def test_ask(mock_get_session, mock_openai, client):
     mock_response_get = MagicMock()
     mock_response_get.status_code = 200
     mock_response_get.json.return_value = {"mock_search_results": "mock_data"}
-    mock_requests_get.return_value = mock_response_get
+    mock_get_session.return_value.get.return_value = mock_response_get
 
     mock_openai_instance = MagicMock()
     mock_completion = MagicMock()
@@ -66,3 +171,245 @@ def test_ask(mock_requests_get, mock_openai, client):
     assert response.status_code == 200
     assert b"mock_question" in response.data
     assert b"mock_answer" in response.data
+
+
+def test_make_provider_reused():
+    first = make_provider("mock_access_token")
+
+    assert make_provider("mock_access_token") is first
+    assert make_provider("other_access_token") is not first
+
+
+def test_stats(client):
+    response = client.get("/stats")
+
+    assert response.status_code == 200
+    assert set(response.json["http_pool"]) == {"requests", "hits", "misses", "hit_rate"}
+    assert response.json["openai_usage"]["prompt_prefix"]
+
+
+def test_metrics(client):
+    with tracing.span("build_prompt"):
+        pass
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    assert b'ask_stage_duration_seconds_count{stage="build_prompt"}' in response.data
+
+
+@patch("app.rate_limiter.get_rate_limiter")
+def test_metrics_include_rate_limiter(mock_get_limiter, client):
+    limiter = RateLimiter(failure_threshold=1)
+    limiter.complete("token", "https://host/api/v1/documents/search/", 0, 500)
+    mock_get_limiter.return_value = limiter
+    response = client.get("/metrics")
+
+    assert (
+        b'rate_limiter_circuit_open{endpoint="/api/v1/documents/search/"} 1'
+        in response.data
+    )
+
+
+@patch("app.conversation.get_conversation_store")
+@patch("app.make_provider")
+@patch("app.clients.get_openai_client")
+def test_ask_follow_up_keeps_conversation(
+    mock_openai, mock_make_provider, mock_get_store, client
+):
+    mock_get_store.return_value = ConversationStore(MemoryBackend())
+    mock_make_provider.return_value.handle.return_value = "mock_context"
+    create = mock_openai.return_value.chat.completions.create
+    create.return_value.choices[0].message.content = "first_answer"
+
+    with client.session_transaction() as sess:
+        sess["rememberizer_access_token"] = "mock_access_token"
+    client.post("/ask", data={"question": "first_question"})
+    create.return_value.choices[0].message.content = "second_answer"
+    response = client.post("/ask", data={"question": "second_question"})
+
+    assert b"first_question" in response.data
+    assert b"second_answer" in response.data
+    messages = create.call_args.kwargs["messages"]
+    assert [message["content"] for message in messages[1:3]] == [
+        "first_question",
+        "first_answer",
+    ]
+    chat = mock_make_provider.return_value.handle.call_args.kwargs["conversation"]
+    assert [turn["question"] for turn in chat.turns] == [
+        "first_question",
+        "second_question",
+    ]
+
+
+@patch("app.make_provider")
+@patch("app.clients.get_openai_client")
+def test_ask_async_under_wsgi_answers_like_ask(mock_openai, mock_make_provider, client):
+    mock_make_provider.return_value.handle.return_value = "mock_context"
+    create = mock_openai.return_value.chat.completions.create
+    create.return_value.choices[0].message.content = "mock_answer"
+
+    with client.session_transaction() as sess:
+        sess["rememberizer_access_token"] = "mock_access_token"
+    response = client.post("/ask-async", data={"question": "mock_question"})
+
+    assert response.status_code == 200
+    assert b"mock_answer" in response.data
+    mock_make_provider.assert_called_once_with("mock_access_token")
+
+
+def _stream_chunk(content):
+    chunk = MagicMock()
+    chunk.choices = [MagicMock()]
+    chunk.choices[0].delta.content = content
+    return chunk
+
+
+@patch("app.make_provider")
+@patch("app.clients.get_openai_client")
+def test_ask_stream(mock_openai, mock_make_provider, client):
+    mock_make_provider.return_value.handle.return_value = "mock_context"
+    mock_openai.return_value.chat.completions.create.return_value = iter(
+        [_stream_chunk("mock_"), _stream_chunk(None), _stream_chunk("answer")]
+    )
+
+    with client.session_transaction() as sess:
+        sess["rememberizer_access_token"] = "mock_access_token"
+    response = client.post("/ask-stream", data={"question": "mock_question"})
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    events = response.get_data(as_text=True).split("\n\n")
+    assert events[0] == ": started"
+    assert events[1] == 'data: {"delta": "mock_"}'
+    assert events[2] == 'data: {"delta": "answer"}'
+    assert events[3].startswith("event: done\ndata: ")
+    timings = json.loads(events[3].split("data: ", 1)[1])
+    assert timings["time_to_first_token"] <= timings["total"]
+    mock_make_provider.return_value.handle.assert_called_once_with(
+        "mock_question", mock_openai.return_value, conversation=ANY
+    )
+    assert mock_openai.return_value.chat.completions.create.call_args.kwargs["stream"]
+
+
+@patch("app.conversation.get_conversation_store")
+@patch("app.make_provider")
+@patch("app.clients.get_openai_client")
+def test_ask_stream_reports_failure(
+    mock_openai, mock_make_provider, mock_get_store, client
+):
+    mock_get_store.return_value = ConversationStore(MemoryBackend())
+
+    def chunks():
+        yield _stream_chunk("mock_")
+        raise Exception("connection reset")
+
+    mock_make_provider.return_value.handle.return_value = "mock_context"
+    mock_openai.return_value.chat.completions.create.return_value = chunks()
+
+    with client.session_transaction() as sess:
+        sess["rememberizer_access_token"] = "mock_access_token"
+    response = client.post("/ask-stream", data={"question": "mock_question"})
+
+    events = response.get_data(as_text=True).split("\n\n")
+    assert events[1] == 'data: {"delta": "mock_"}'
+    assert events[2].startswith("event: error\ndata: ")
+    assert "connection reset" not in events[2]
+    assert events[3].startswith("event: done\ndata: ")
+    with client.session_transaction() as sess:
+        conversation_id = sess["conversation_id"]
+    assert mock_get_store.return_value.get(conversation_id).turns == []
+
+    mock_make_provider.return_value.handle.side_effect = Exception("search failed")
+    events = client.post("/ask-stream", data={"question": "mock_question"})
+    events = events.get_data(as_text=True).split("\n\n")
+    assert events[1].startswith("event: error\ndata: ")
+    assert events[2].startswith("event: done\ndata: ")
+
+
+def test_ask_stream_requires_login(client):
+    response = client.post("/ask-stream", data={"question": "mock_question"})
+    assert response.status_code == 302
+
+
+@patch("app.STREAM_ASK", True)
+def test_chatbox_stream_enabled(client):
+    response = client.get("/")
+    assert b"/ask-stream" in response.data
+
+
+def slack_pages(pages):
+    def get(url, **kwargs):
+        response = Mock()
+        response.status_code = 200
+        response.json.return_value = pages[url]
+        return response
+
+    return get
+
+
+@patch("app.channel_prefetch.get_refresher")
+@patch("app.http_pool.get_session")
+def test_slack_info_fetches_all_pages(mock_get_session, mock_get_refresher, client):
+    mock_get_refresher.return_value = SlackInfoRefresher(start=False)
+    mock_get_session.return_value.get.side_effect = slack_pages(
+        {
+            REMEMBERIZER_INTEGRATIONS_ENDPOINT: {
+                "data": [{"integration_type": "slack", "source": "mock_workspace"}]
+            },
+            REMEMBERIZER_DOCUMENTS_ENDPOINT: {
+                "results": [{"integration_type": "slack", "name": "general"}],
+                "next": "https://api.rememberizer.ai/api/v1/documents/?page=2",
+            },
+            "https://api.rememberizer.ai/api/v1/documents/?page=2": {
+                "results": [{"integration_type": "slack", "name": "random"}]
+            },
+        }
+    )
+
+    with client.session_transaction() as sess:
+        sess["rememberizer_access_token"] = "mock_access_token"
+    response = client.get("/slack-info")
+
+    assert response.status_code == 200
+    assert b"mock_workspace" in response.data
+    assert b"#general" in response.data
+    assert b"#random" in response.data
+
+
+@patch("app.channel_prefetch.get_refresher")
+@patch("app.http_pool.get_session")
+def test_slack_info_served_from_snapshot(mock_get_session, mock_get_refresher, client):
+    mock_get_refresher.return_value = SlackInfoRefresher(start=False)
+    mock_get_session.return_value.get.side_effect = slack_pages(
+        {
+            REMEMBERIZER_INTEGRATIONS_ENDPOINT: {
+                "data": [{"integration_type": "slack", "source": "mock_workspace"}]
+            },
+            REMEMBERIZER_DOCUMENTS_ENDPOINT: {
+                "results": [{"integration_type": "slack", "name": "general"}]
+            },
+        }
+    )
+
+    with client.session_transaction() as sess:
+        sess["rememberizer_access_token"] = "mock_access_token"
+    client.get("/slack-info")
+    calls = mock_get_session.return_value.get.call_count
+    response = client.get("/slack-info")
+
+    assert b"#general" in response.data
+    assert mock_get_session.return_value.get.call_count == calls
+
+
+@patch("app.channel_prefetch.get_refresher", return_value=None)
+@patch("app.http_pool.get_session")
+def test_slack_info_rejected_token(mock_get_session, mock_get_refresher, client):
+    mock_get_session.return_value.get.return_value.status_code = 401
+
+    with client.session_transaction() as sess:
+        sess["rememberizer_access_token"] = "mock_access_token"
+    response = client.get("/slack-info")
+
+    assert response.status_code == 302
+    assert response.location.endswith("/auth/rememberizer")
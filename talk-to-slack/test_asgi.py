@@ -0,0 +1,217 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+from urllib.parse import urlencode
+
+import clients
+from app import app, make_async_provider
+from asgi import application, wsgi_environ
+
+
+def call(scope, body=b""):
+    """
+    Returns: (status, headers, body) of `application` answering one request
+    """
+    messages = []
+    requests = [{"type": "http.request", "body": body, "more_body": False}]
+
+    async def receive():
+        return requests.pop(0) if requests else {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+
+    async def run():
+        await application(scope, receive, send)
+
+    asyncio.run(run())
+    start = messages[0]
+    return (
+        start["status"],
+        dict(start["headers"]),
+        b"".join(message.get("body", b"") for message in messages[1:]),
+    )
+
+
+def http_scope(method, path, headers=()):
+    return {
+        "type": "http",
+        "http_version": "1.1",
+        "method": method,
+        "path": path,
+        "root_path": "",
+        "query_string": b"",
+        "headers": list(headers),
+        "server": ("testserver", 80),
+        "scheme": "http",
+    }
+
+
+def session_cookie(**values):
+    with app.test_client() as client:
+        with client.session_transaction() as session:
+            session.update(values)
+        return client.get_cookie("session").value
+
+
+class TestASGI(unittest.TestCase):
+
+    def setUp(self):
+        self.openai = MagicMock()
+        completion = MagicMock()
+        completion.choices[0].message.content = "mock_answer"
+        self.openai.chat.completions.create = AsyncMock(return_value=completion)
+        self.openai.close = AsyncMock()
+        self.http = MagicMock()
+        self.http.aclose = AsyncMock()
+        for target, value in (
+            ("clients.create_async_openai_client", self.openai),
+            ("clients.http_pool.create_async_client", self.http),
+        ):
+            patcher = patch(target, return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch("clients._async_clients", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def ask(self, cookie):
+        headers = [(b"content-type", b"application/x-www-form-urlencoded")]
+        if cookie is not None:
+            headers.append((b"cookie", f"session={cookie}".encode()))
+        return call(
+            http_scope("POST", "/ask-async", headers),
+            urlencode({"question": "mock_question"}).encode(),
+        )
+
+    @patch("app.make_async_provider")
+    def test_ask_async_on_event_loop(self, mock_make_provider):
+        provider = mock_make_provider.return_value
+        provider.handle = AsyncMock(return_value="mock_context")
+
+        status, _, body = self.ask(session_cookie(rememberizer_access_token="token"))
+
+        self.assertEqual(status, 200)
+        self.assertIn(b"mock_question", body)
+        self.assertIn(b"mock_answer", body)
+        mock_make_provider.assert_called_once_with("token")
+        provider.handle.assert_awaited_once_with(
+            "mock_question", self.openai, conversation=None
+        )
+
+    @patch("app.make_async_provider")
+    def test_questions_in_flight_share_the_loop(self, mock_make_provider):
+        in_flight = []
+        both = asyncio.Event()
+
+        async def handle(question, client, conversation=None):
+            in_flight.append(question)
+            if len(in_flight) == 2:
+                both.set()
+            # Returns only once both questions are in flight on the one loop.
+            await asyncio.wait_for(both.wait(), 5)
+            return "mock_context"
+
+        mock_make_provider.return_value.handle = handle
+        cookie = f"session={session_cookie(rememberizer_access_token='token')}"
+        headers = [
+            (b"content-type", b"application/x-www-form-urlencoded"),
+            (b"cookie", cookie.encode()),
+        ]
+        statuses = []
+
+        async def ask():
+            requests = [
+                {"type": "http.request", "body": b"question=q", "more_body": False}
+            ]
+
+            async def receive():
+                return requests.pop(0)
+
+            async def send(message):
+                if message["type"] == "http.response.start":
+                    statuses.append(message["status"])
+
+            await application(http_scope("POST", "/ask-async", headers), receive, send)
+
+        async def run():
+            await asyncio.gather(ask(), ask())
+
+        asyncio.run(run())
+        self.assertEqual(statuses, [200, 200])
+
+    def test_ask_async_without_question(self):
+        cookie = session_cookie(rememberizer_access_token="token")
+        status, _, _ = call(
+            http_scope(
+                "POST", "/ask-async", [(b"cookie", f"session={cookie}".encode())]
+            )
+        )
+        self.assertEqual(status, 400)
+
+    def test_ask_async_requires_login(self):
+        status, headers, _ = self.ask(None)
+        self.assertEqual(status, 302)
+        self.assertTrue(headers[b"location"].endswith(b"/auth/rememberizer"))
+
+    def test_other_routes_served_by_flask(self):
+        status, _, body = call(http_scope("GET", "/"))
+        self.assertEqual(status, 200)
+        self.assertIn(b"<html", body.lower())
+
+    def test_async_clients_shared_on_one_loop(self):
+        async def run():
+            first = make_async_provider("token")
+            self.assertIs(make_async_provider("token"), first)
+            self.assertIs(first.client, self.http)
+            self.assertIs(
+                clients.get_async_provider_registry().get("token", None), first
+            )
+            await clients.close_async_clients()
+
+        asyncio.run(run())
+        self.openai.close.assert_awaited_once()
+        self.http.aclose.assert_awaited_once()
+        self.assertIsNone(clients.get_async_provider_registry())
+
+    def test_lifespan_shutdown_closes_clients(self):
+        messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+        sent = []
+
+        async def run():
+            clients.get_async_clients()
+
+            async def receive():
+                return messages.pop(0)
+
+            async def send(message):
+                sent.append(message["type"])
+
+            await application({"type": "lifespan"}, receive, send)
+
+        asyncio.run(run())
+        self.assertEqual(
+            sent, ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+        )
+        self.http.aclose.assert_awaited_once()
+
+    def test_wsgi_environ(self):
+        scope = http_scope(
+            "POST",
+            "/ask-async",
+            [
+                (b"content-type", b"text/plain"),
+                (b"cookie", b"a=1"),
+                (b"cookie", b"b=2"),
+                (b"x-forwarded-for", b"10.0.0.1"),
+            ],
+        )
+        environ = wsgi_environ(scope, b"body")
+        self.assertEqual(environ["CONTENT_TYPE"], "text/plain")
+        self.assertEqual(environ["HTTP_COOKIE"], "a=1; b=2")
+        self.assertEqual(environ["HTTP_X_FORWARDED_FOR"], "10.0.0.1")
+        self.assertEqual(environ["wsgi.input"].read(), b"body")
+
+
+if __name__ == "__main__":
+    unittest.main()
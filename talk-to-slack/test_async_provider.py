@@ -0,0 +1,210 @@
+import asyncio
+import threading
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from async_provider import AsyncRememberizerSourceProvider
+from provider import FUNCTION_MAPPING
+from rate_limiter import RateLimiter
+
+
+class TestAsyncRememberizerSourceProvider(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.access_token = "test_access_token"
+        self.client = MagicMock()
+        self.client.get = AsyncMock()
+        self.client.post = AsyncMock()
+        self.client.aclose = AsyncMock()
+        self.provider = AsyncRememberizerSourceProvider(self.access_token, self.client)
+        self.mock_response = MagicMock()
+        self.mock_response.json.return_value = {"data": "test"}
+        self.mock_response.status_code = 200
+
+    async def test_call_api_get(self):
+        self.client.get.return_value = self.mock_response
+        response = await self.provider.call_api("http://test.url", method="get")
+        self.assertEqual(response, self.mock_response)
+        self.client.get.assert_awaited_once_with(
+            "http://test.url",
+            headers={"Authorization": f"Bearer {self.access_token}"},
+            params={},
+        )
+
+    @patch("async_provider.asyncio.sleep", new_callable=AsyncMock)
+    async def test_call_api_retries_with_rate_limiter(self, mock_sleep):
+        unavailable = MagicMock(status_code=503, headers={})
+        self.client.get.side_effect = [unavailable, self.mock_response]
+        self.provider.rate_limiter = RateLimiter(max_attempts=3)
+
+        response = await self.provider.call_api("http://test.url/search/")
+
+        self.assertIs(response, self.mock_response)
+        self.assertEqual(self.client.get.await_count, 2)
+
+    async def test_cancelled_call_releases_circuit_trial(self):
+        limiter = RateLimiter(failure_threshold=1, reset_timeout=0.05)
+        limiter.complete(self.access_token, "http://test.url/search/", 0, 500)
+        await asyncio.sleep(0.06)
+        self.provider.rate_limiter = limiter
+
+        async def hang(*args, **kwargs):
+            await asyncio.sleep(10)
+
+        self.client.get.side_effect = hang
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(
+                self.provider.call_api("http://test.url/search/"), 0.01
+            )
+        self.client.get.side_effect = None
+        self.client.get.return_value = self.mock_response
+        response = await self.provider.call_api("http://test.url/search/")
+        self.assertIs(response, self.mock_response)
+        self.assertEqual(limiter.stats()["endpoints"]["/search/"]["circuit"], "closed")
+
+    async def test_store_calls_run_off_the_event_loop(self):
+        loop_thread = threading.get_ident()
+        threads = []
+
+        def record(result):
+            def call(*args):
+                threads.append(threading.get_ident())
+                return result
+
+            return call
+
+        store = MagicMock()
+        store.missing_ranges.side_effect = record([])
+        store.answer.side_effect = record({"discussion_content": []})
+        self.provider.discussion_store = store
+        self.provider._scope = "account:1"
+        response, success = await self.provider.get_discussion_content(
+            {"discussion_id": 123}
+        )
+        self.assertTrue(success)
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(loop_thread, threads)
+
+    async def test_call_api_post(self):
+        self.client.post.return_value = self.mock_response
+        response = await self.provider.call_api(
+            "http://test.url", method="post", params={"key": "value"}
+        )
+        self.assertEqual(response, self.mock_response)
+        self.client.post.assert_awaited_once_with(
+            "http://test.url",
+            headers={"Authorization": f"Bearer {self.access_token}"},
+            data={"key": "value"},
+        )
+
+    async def test_call_api_unsupported_method(self):
+        with self.assertRaises(Exception):
+            await self.provider.call_api("http://test.url", method="delete")
+
+    async def test_shared_client_not_closed(self):
+        async with self.provider:
+            pass
+        self.client.aclose.assert_not_awaited()
+
+    async def test_owned_client_closed(self):
+        with patch("async_provider.http_pool.create_async_client") as mock_create:
+            mock_create.return_value.aclose = AsyncMock()
+            async with AsyncRememberizerSourceProvider(self.access_token):
+                pass
+            mock_create.return_value.aclose.assert_awaited_once()
+
+    def test_sync_pipelines_unavailable(self):
+        for name in ("answer", "answer_batch", "memorize", "memorize_batch"):
+            with self.assertRaises(Exception) as raised:
+                getattr(self.provider, name)("argument")
+            self.assertIn(name, str(raised.exception))
+
+    async def test_get_discussion_content(self):
+        self.client.get.return_value = self.mock_response
+        arguments = {"discussion_id": 123}
+        response, success = await self.provider.get_discussion_content(arguments)
+        self.assertEqual(arguments, {"discussion_id": 123})
+        self.assertTrue(success)
+        self.assertEqual(response, {"data": "test"})
+        self.client.get.assert_awaited_once_with(
+            FUNCTION_MAPPING["get_discussion_content"][2].format(123),
+            headers={"Authorization": f"Bearer {self.access_token}"},
+            params={"integration_type": "slack"},
+        )
+
+    async def test_list_channels_all_pages(self):
+        def page(results, next_url=None):
+            response = MagicMock()
+            response.status_code = 200
+            response.json.return_value = {"results": results, "next": next_url}
+            return response
+
+        self.client.get.side_effect = [
+            page([{"name": "a"}], "http://next/2"),
+            page([{"name": "b"}]),
+        ]
+        response, success = await self.provider.list_channels({})
+        self.assertTrue(success)
+        self.assertEqual(
+            response, {"count": 2, "results": [{"name": "a"}, {"name": "b"}]}
+        )
+        self.assertEqual(self.client.get.await_count, 2)
+
+    async def test_handle(self):
+        self.client.get.return_value = self.mock_response
+        mock_openai = MagicMock()
+        mock_response = MagicMock()
+        mock_response.choices = [MagicMock()]
+        mock_response.choices[0].message.tool_calls = [MagicMock()]
+        mock_response.choices[0].message.tool_calls[0].function.name = "search"
+        mock_response.choices[0].message.tool_calls[
+            0
+        ].function.arguments = '{"q": "test query"}'
+        mock_openai.chat.completions.create = AsyncMock(return_value=mock_response)
+
+        result = await self.provider.handle("Test message", mock_openai)
+        self.assertIn("Knowledge source: Rememberizer", result)
+        self.assertIn('{"data":"test"}', result)
+        self.client.get.assert_awaited_once_with(
+            FUNCTION_MAPPING["search"][2],
+            headers={"Authorization": f"Bearer {self.access_token}"},
+            params={"q": "test query"},
+        )
+
+    async def test_run_tool_calls_concurrently_with_timeout(self):
+        async def call_function(function_name, arguments):
+            if function_name == "search":
+                await asyncio.sleep(1)
+            return {"function": function_name}
+
+        calls = [
+            ("search", "GET", {}),
+            ("get_account", "GET", {}),
+            ("list_channels", "GET", {}),
+        ]
+        with patch.object(self.provider, "call_function", side_effect=call_function):
+            responses = await self.provider.run_tool_calls(calls, timeout=0.1)
+
+        self.assertEqual(
+            responses,
+            [
+                {"error": "search timed out"},
+                {"function": "get_account"},
+                {"function": "list_channels"},
+            ],
+        )
+
+    async def test_handle_no_tool_calls(self):
+        mock_openai = MagicMock()
+        mock_response = MagicMock()
+        mock_response.choices = [MagicMock()]
+        mock_response.choices[0].message.tool_calls = None
+        mock_openai.chat.completions.create = AsyncMock(return_value=mock_response)
+
+        result = await self.provider.handle("Test message", mock_openai)
+        self.assertEqual(result, "No context provided")
+        self.client.get.assert_not_awaited()
+
+
+if __name__ == "__main__":
+    unittest.main()
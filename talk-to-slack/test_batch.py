@@ -0,0 +1,131 @@
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from batch import read_checkpoint, read_questions, run_batch
+from provider import RememberizerSourceProvider
+
+
+def _client():
+    """
+    A stand-in OpenAI client: tool-choice calls ask for a search on the question's
+    topic, answer calls echo the prompt.
+    """
+
+    def create(messages, model, tools=None, **kwargs):
+        question = messages[-1]["content"]
+        response = MagicMock()
+        response.choices = [MagicMock()]
+        if tools:
+            tool_call = MagicMock()
+            tool_call.function.name = "search"
+            tool_call.function.arguments = json.dumps({"q": question.split(":")[0]})
+            response.choices[0].message.tool_calls = [tool_call]
+        else:
+            response.choices[0].message.content = f"answer to {question}"
+        return response
+
+    client = MagicMock()
+    client.chat.completions.create.side_effect = create
+    return client
+
+
+class TestAnswerBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.provider = RememberizerSourceProvider("token", MagicMock())
+        self.searches = []
+        self.running = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def search(self, arguments):
+        with self.lock:
+            self.searches.append(arguments["q"])
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(0.05)
+        with self.lock:
+            self.running -= 1
+        return {"data": [arguments["q"]]}, True
+
+    def run_batch(self, questions, concurrency=2):
+        with patch.object(
+            RememberizerSourceProvider, "search", side_effect=self.search
+        ), patch.object(RememberizerSourceProvider, "route_locally", return_value=None):
+            return list(
+                self.provider.answer_batch(
+                    list(enumerate(questions)), _client(), concurrency=concurrency
+                )
+            )
+
+    def test_shared_retrievals_made_once(self):
+        results = self.run_batch(["billing: who?", "billing: when?", "pricing"])
+        self.assertEqual(sorted(self.searches), ["billing", "pricing"])
+        self.assertEqual(sorted(result["id"] for result in results), [0, 1, 2])
+        for result in results:
+            self.assertIn(f"Question: {result['question']}", result["answer"])
+        self.assertIsNone(self.provider.retrieval_memo)
+
+    def test_bounded_concurrency(self):
+        self.run_batch([f"topic {i}" for i in range(6)], concurrency=2)
+        self.assertEqual(len(self.searches), 6)
+        self.assertLessEqual(self.peak, 2)
+
+    def test_error_reported_per_question(self):
+        client = _client()
+        with patch.object(
+            RememberizerSourceProvider, "answer", side_effect=[Exception("down"), "ok"]
+        ):
+            results = list(
+                self.provider.answer_batch([(1, "a"), (2, "b")], client, concurrency=1)
+            )
+        self.assertEqual(
+            results,
+            [
+                {"id": 1, "question": "a", "error": "down"},
+                {"id": 2, "question": "b", "answer": "ok"},
+            ],
+        )
+
+
+class TestBatchCli(unittest.TestCase):
+
+    def test_read_questions(self):
+        lines = ['{"question": "a"}\n', "\n", '{"id": "x", "question": "b"}\n']
+        self.assertEqual(list(read_questions(lines)), [("1", "a"), ("x", "b")])
+
+    def test_resume_from_checkpoint(self):
+        provider = MagicMock()
+        provider.answer_batch.side_effect = lambda questions, *args, **kwargs: (
+            {"id": question_id, "question": question, "answer": "ok"}
+            for question_id, question in questions
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "answers.jsonl")
+            with open(path, "w") as output:
+                output.write('{"id": "1", "question": "a", "answer": "ok"}\n')
+                output.write('{"id": "2", "question": "b", "error": "down"}\n')
+                output.write('{"id": "3", "quest')
+            answered = read_checkpoint(path)
+            self.assertEqual(answered, {"1"})
+
+            output = io.StringIO()
+            questions = read_questions(['{"question": "a"}', '{"question": "b"}'])
+            report = run_batch(provider, None, questions, output, 2, "gpt-4o", answered)
+
+        self.assertEqual(
+            [json.loads(line)["id"] for line in output.getvalue().splitlines()], ["2"]
+        )
+        self.assertEqual(report["skipped"], 1)
+        self.assertEqual(report["answered"], 1)
+        self.assertIn("questions_per_second", report)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+
+import requests
+from benchmark import Distribution, MockServer, compare, summarize
+from openai import OpenAI
+
+
+class TestDistribution(unittest.TestCase):
+
+    def test_sample(self):
+        self.assertEqual(Distribution("fixed:5").sample(), 5)
+        self.assertTrue(10 <= Distribution("uniform:10,20").sample() <= 20)
+        self.assertGreaterEqual(Distribution("normal:0,1").sample(), 0)
+        self.assertGreaterEqual(Distribution("exponential:3").sample(), 0)
+
+    def test_invalid_spec(self):
+        for spec in ("fixed", "uniform:1", "poisson:3", "fixed:abc"):
+            with self.assertRaises(Exception):
+                Distribution(spec)
+
+
+class TestReport(unittest.TestCase):
+
+    def test_summarize(self):
+        summary = summarize([0.01 * i for i in range(1, 101)], errors=2, duration=10)
+        self.assertEqual(summary["requests"], 100)
+        self.assertEqual(summary["errors"], 2)
+        self.assertEqual(summary["rps"], 10)
+        self.assertAlmostEqual(summary["latency_ms"]["p50"], 505, places=0)
+        self.assertAlmostEqual(summary["latency_ms"]["p99"], 990, places=0)
+
+    def test_compare(self):
+        baseline = {"scenarios": {"/ask": {"rps": 10, "latency_ms": {"p95": 100}}}}
+        current = {
+            "scenarios": {
+                "/ask": {"rps": 12, "latency_ms": {"p95": 150}},
+                "/dashboard": {"rps": 5, "latency_ms": {"p95": 10}},
+            }
+        }
+        self.assertEqual(
+            compare(baseline, current),
+            {"/ask": {"p95_change_pct": 50.0, "rps_change_pct": 20.0}},
+        )
+
+
+class TestMockServers(unittest.TestCase):
+
+    def test_rememberizer_pagination(self):
+        with MockServer("rememberizer", channels=150) as server:
+            first = requests.get(
+                f"{server.base_url}/documents/", params={"page_size": 100}
+            ).json()
+            second = requests.get(first["next"]).json()
+        self.assertEqual(len(first["results"]), 100)
+        self.assertEqual(len(second["results"]), 50)
+        self.assertIsNone(second["next"])
+
+    def test_rememberizer_payload_size(self):
+        with MockServer("rememberizer", payload_bytes="fixed:300") as server:
+            data = requests.get(
+                f"{server.base_url}/documents/search/", params={"q": "x", "n": 3}
+            ).json()["data"]
+        self.assertEqual([len(item["matched_content"]) for item in data], [300] * 3)
+
+    def test_openai_tool_call_and_answer(self):
+        with MockServer("openai") as server:
+            client = OpenAI(api_key="bench", base_url=server.base_url)
+            messages = [{"role": "user", "content": "question"}]
+            tool_choice = client.chat.completions.create(
+                messages=messages, model="gpt-4o", tools=[{"type": "function"}]
+            )
+            answer = client.chat.completions.create(messages=messages, model="gpt-4o")
+            stream = client.chat.completions.create(
+                messages=messages, model="gpt-4o", stream=True
+            )
+            chunks = [chunk.choices[0].delta.content for chunk in stream]
+        tool_call = tool_choice.choices[0].message.tool_calls[0]
+        self.assertEqual(tool_call.function.name, "search")
+        self.assertTrue(answer.choices[0].message.content)
+        self.assertTrue(all(chunks))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from channel_prefetch import SlackInfoRefresher, fetch_slack_info
+
+
+def response(status_code, data):
+    mock = MagicMock()
+    mock.status_code = status_code
+    mock.json.return_value = data
+    return mock
+
+
+class TestFetchSlackInfo(unittest.TestCase):
+
+    def setUp(self):
+        self.provider = MagicMock()
+        self.provider.format_response.side_effect = lambda r: (r.json(), True)
+
+    def test_fetches_in_parallel(self):
+        started = threading.Barrier(2, timeout=5)
+
+        def call_api(url):
+            started.wait()
+            return response(
+                200,
+                {"data": [{"integration_type": "slack", "source": "workspace"}]},
+            )
+
+        def iter_documents(params, prefetch=False):
+            started.wait()
+            yield {"integration_type": "slack", "name": "general", "size": 10}
+            yield {"integration_type": "drive", "name": "notes"}
+
+        self.provider.call_api.side_effect = call_api
+        self.provider.iter_documents.side_effect = iter_documents
+
+        info = fetch_slack_info(self.provider)
+
+        self.assertEqual(info["slack_integration"]["source"], "workspace")
+        self.assertEqual(info["slack_channels"], [{"name": "general"}])
+
+    @patch("channel_prefetch.LIST_CHANNELS_LIMIT", 2)
+    def test_channel_listing_limited(self):
+        read = []
+
+        def iter_documents(params, prefetch=False):
+            for index in range(10):
+                read.append(index)
+                yield {"integration_type": "slack", "name": f"channel {index}"}
+
+        self.provider.call_api.return_value = response(
+            200, {"data": [{"integration_type": "slack"}]}
+        )
+        self.provider.iter_documents.side_effect = iter_documents
+        info = fetch_slack_info(self.provider)
+        self.assertEqual(
+            info["slack_channels"], [{"name": "channel 0"}, {"name": "channel 1"}]
+        )
+        self.assertEqual(read, [0, 1])
+
+    def test_no_slack_integration(self):
+        self.provider.call_api.return_value = response(
+            200, {"data": [{"integration_type": "drive"}]}
+        )
+        self.provider.iter_documents.return_value = iter([])
+        self.assertEqual(
+            fetch_slack_info(self.provider),
+            {"slack_integration": None, "slack_channels": []},
+        )
+
+    def test_rejected_token(self):
+        self.provider.call_api.return_value = response(401, {})
+        self.provider.iter_documents.return_value = iter([])
+        self.assertIsNone(fetch_slack_info(self.provider))
+
+
+class TestSlackInfoRefresher(unittest.TestCase):
+
+    def setUp(self):
+        self.refresher = SlackInfoRefresher(
+            interval=60, max_stale=600, idle_timeout=1800, start=False
+        )
+        self.version = 0
+
+    def load(self):
+        self.version += 1
+        return {"version": self.version}
+
+    def wait_for_version(self, version):
+        deadline = time.time() + 5
+        while self.version < version and time.time() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.05)
+
+    def test_miss_then_fresh(self):
+        self.assertEqual(self.refresher.snapshot("user", self.load), {"version": 1})
+        self.assertEqual(self.refresher.snapshot("user", self.load), {"version": 1})
+        stats = self.refresher.stats()
+        self.assertEqual((stats["misses"], stats["fresh"]), (1, 1))
+        self.assertEqual(stats["users"], 1)
+
+    def test_stale_while_revalidate(self):
+        self.refresher.snapshot("user", self.load)
+        later = time.time() + 120
+        self.assertEqual(
+            self.refresher.snapshot("user", self.load, now=later), {"version": 1}
+        )
+        self.wait_for_version(2)
+        self.assertEqual(self.refresher.snapshot("user", self.load), {"version": 2})
+        self.assertEqual(self.refresher.stats()["stale"], 1)
+
+    def test_too_stale_waits(self):
+        self.refresher.snapshot("user", self.load)
+        later = time.time() + 3600
+        self.assertEqual(
+            self.refresher.snapshot("user", self.load, now=later), {"version": 2}
+        )
+
+    def test_failed_revalidation_keeps_snapshot(self):
+        self.refresher.snapshot("user", self.load)
+
+        def failing():
+            raise Exception("down")
+
+        later = time.time() + 120
+        self.assertEqual(
+            self.refresher.snapshot("user", failing, now=later), {"version": 1}
+        )
+        deadline = time.time() + 5
+        while not self.refresher.stats()["refresh_errors"] and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.refresher.stats()["refresh_errors"], 1)
+        self.assertEqual(self.refresher.stats()["users"], 1)
+
+    def test_rejected_token_forgets_user(self):
+        self.assertIsNone(self.refresher.snapshot("user", lambda: None))
+        self.assertEqual(self.refresher.stats()["users"], 0)
+
+    def test_refresh_due(self):
+        self.refresher.snapshot("active", self.load)
+        self.refresher.snapshot("idle", self.load, now=time.time() - 3600)
+        self.assertEqual(self.refresher.refresh_due(now=time.time() + 40), 1)
+        self.wait_for_version(3)
+        self.assertEqual(self.refresher.snapshot("active", self.load), {"version": 3})
+        self.assertEqual(self.refresher.stats()["users"], 1)
+
+    def test_forget(self):
+        self.refresher.snapshot("user", self.load)
+        self.refresher.forget("user")
+        self.assertEqual(self.refresher.stats()["users"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
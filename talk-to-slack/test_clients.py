@@ -0,0 +1,88 @@
+import asyncio
+import threading
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import clients
+from clients import ProviderRegistry
+
+
+class TestProviderRegistry(unittest.TestCase):
+
+    def test_reuse(self):
+        registry = ProviderRegistry(max_size=2)
+        create = MagicMock(side_effect=lambda: object())
+        first = registry.get("token", create)
+        self.assertIs(registry.get("token", create), first)
+        self.assertEqual(create.call_count, 1)
+        self.assertEqual(registry.stats()["hits"], 1)
+
+    def test_evicts_least_recently_used(self):
+        registry = ProviderRegistry(max_size=2)
+        a = registry.get("a", object)
+        registry.get("b", object)
+        registry.get("a", object)
+        registry.get("c", object)
+        self.assertIs(registry.get("a", object), a)
+        stats = registry.stats()
+        self.assertEqual((stats["size"], stats["evictions"]), (2, 1))
+
+    def test_concurrent_first_use_shares_one(self):
+        registry = ProviderRegistry()
+        barrier = threading.Barrier(8, timeout=5)
+        results = []
+
+        def get():
+            barrier.wait()
+            results.append(registry.get("token", object))
+
+        threads = [threading.Thread(target=get) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(result) for result in results}), 1)
+
+    def test_forget(self):
+        registry = ProviderRegistry()
+        first = registry.get("token", object)
+        registry.forget("token")
+        self.assertIsNot(registry.get("token", object), first)
+
+    def test_disabled(self):
+        self.assertIsNone(clients.create_provider_registry(0))
+
+
+class TestOpenAIClient(unittest.TestCase):
+
+    @patch("clients._client", None)
+    @patch("clients.OpenAI")
+    def test_shared(self, mock_openai):
+        self.assertIs(clients.get_openai_client(), clients.get_openai_client())
+        mock_openai.assert_called_once()
+
+
+class TestAsyncClients(unittest.TestCase):
+
+    @patch("clients._async_clients", None)
+    @patch("clients.http_pool.create_async_client")
+    @patch("clients.AsyncOpenAI")
+    def test_shared_per_loop(self, mock_openai, mock_create_client):
+        mock_openai.return_value.close = AsyncMock()
+        mock_create_client.return_value.aclose = AsyncMock()
+
+        async def get_twice():
+            first = clients.get_async_clients()
+            self.assertIs(clients.get_async_clients(), first)
+            return first
+
+        first = asyncio.run(get_twice())
+        second = asyncio.run(get_twice())
+        self.assertIsNot(first, second)
+        self.assertEqual(mock_openai.call_count, 2)
+        asyncio.run(clients.close_async_clients())
+        mock_create_client.return_value.aclose.assert_awaited_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
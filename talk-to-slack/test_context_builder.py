@@ -0,0 +1,126 @@
+import unittest
+
+from context_builder import (
+    ContextBuilder,
+    Passage,
+    count_tokens,
+    deduplicate,
+    extract_passages,
+    rank,
+    truncate_to_tokens,
+)
+
+SEARCH_RESPONSE = {
+    "data": [
+        {
+            "chunk_id": "1",
+            "document": {
+                "id": 1,
+                "name": "release-notes",
+                "modified_time": "2024-05-01T10:00:00Z",
+                "integration": {"id": 9, "document_stats": {"total_size": 1}},
+            },
+            "matched_content": "The release was moved to June because QA found a blocker.",
+            "distance": 0.71,
+        },
+        {
+            "chunk_id": "2",
+            "document": {"id": 2, "name": "general"},
+            "matched_content": "The release was moved to June because QA found a blocker.",
+            "distance": 0.69,
+        },
+        {
+            "chunk_id": "3",
+            "document": {"id": 3, "name": "planning"},
+            "matched_content": "Budget review happens every quarter.",
+            "distance": 0.85,
+        },
+    ],
+    "message": "ok",
+    "code": None,
+}
+
+
+class TestTokenizer(unittest.TestCase):
+
+    def test_count_tokens(self):
+        self.assertGreater(count_tokens("hello world, again"), 2)
+        self.assertEqual(count_tokens(""), 0)
+
+    def test_truncate_to_tokens(self):
+        text = "one two three four five six"
+        truncated = truncate_to_tokens(text, 3)
+        self.assertTrue(text.startswith(truncated))
+        self.assertLessEqual(count_tokens(truncated), 3)
+        self.assertEqual(truncate_to_tokens(text, 0), "")
+
+
+class TestExtraction(unittest.TestCase):
+
+    def test_search_response(self):
+        passages = extract_passages(SEARCH_RESPONSE)
+        self.assertEqual(len(passages), 3)
+        self.assertEqual(passages[0].source, "release-notes")
+        self.assertEqual(passages[0].timestamp, "2024-05-01T10:00:00Z")
+        self.assertEqual(passages[0].score, 0.71)
+
+    def test_discussion_response(self):
+        passages = extract_passages(
+            {
+                "discussion_content": [
+                    {"user_name": "ana", "text": "deploy is done", "timestamp": "t1"}
+                ],
+                "thread_contents": {"t1": [{"user_name": "bo", "text": "thanks"}]},
+            }
+        )
+        self.assertEqual(
+            [(p.source, p.text) for p in passages],
+            [("ana", "deploy is done"), ("bo", "thanks")],
+        )
+
+    def test_other_response_compact_json(self):
+        passages = extract_passages({"name": "Ana", "email": "a@b.c"})
+        self.assertEqual(passages[0].text, '{"name":"Ana","email":"a@b.c"}')
+
+
+class TestRankAndDeduplicate(unittest.TestCase):
+
+    def test_rank_by_score(self):
+        passages = rank(extract_passages(SEARCH_RESPONSE))
+        self.assertEqual([p.score for p in passages], [0.85, 0.71, 0.69])
+
+    def test_deduplicate_overlapping(self):
+        passages = deduplicate(
+            [
+                Passage("alpha beta gamma delta epsilon zeta eta theta"),
+                Passage("Alpha beta gamma delta epsilon zeta eta"),
+                Passage("something else entirely"),
+            ]
+        )
+        self.assertEqual(len(passages), 2)
+
+
+class TestContextBuilder(unittest.TestCase):
+
+    def test_build(self):
+        builder = ContextBuilder(token_budget=1000)
+        text, report = builder.build("When is the release?", [SEARCH_RESPONSE])
+        self.assertTrue(text.startswith("Knowledge source: Rememberizer\n"))
+        self.assertIn("[release-notes | 2024-05-01T10:00:00Z]", text)
+        self.assertEqual(text.count("QA found a blocker"), 1)
+        self.assertNotIn("document_stats", text)
+        self.assertLess(text.index("Budget review"), text.index("QA found"))
+        self.assertEqual(report["passages"], 2)
+        self.assertGreater(report["tokens_saved"], 0)
+        self.assertEqual(builder.stats()["requests"], 1)
+
+    def test_budget(self):
+        builder = ContextBuilder(token_budget=12)
+        text, report = builder.build("When is the release?", [SEARCH_RESPONSE])
+        self.assertLessEqual(report["tokens_after"], 12)
+        self.assertIn("Budget review", text)
+        self.assertNotIn("QA found a blocker.", text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,162 @@
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from conversation import Conversation, ConversationStore, summarizer
+from response_cache import MemoryBackend
+
+
+def _turn(index, words=100):
+    return f"question {index}", " ".join(["word"] * words)
+
+
+class TestConversation(unittest.TestCase):
+
+    def setUp(self):
+        self.chat = Conversation("id")
+
+    def test_retrievals_reused(self):
+        self.assertIsNone(self.chat.retrieval("search", "GET", {"q": "billing"}))
+        self.chat.remember("search", "GET", {"q": "billing"}, {"data": ["a"]})
+        self.assertEqual(
+            self.chat.retrieval("search", "GET", {"q": " billing "}), {"data": ["a"]}
+        )
+        self.assertEqual((self.chat.fetched, self.chat.reused), (1, 1))
+
+    def test_stale_and_failed_retrievals_not_reused(self):
+        self.chat.remember("search", "GET", {"q": "a"}, {"data": ["a"]})
+        later = time.time() + 3600
+        self.assertIsNone(self.chat.retrieval("search", "GET", {"q": "a"}, now=later))
+        self.chat.remember("search", "GET", {"q": "b"}, {"error": "search failed"})
+        self.assertIsNone(self.chat.retrieval("search", "GET", {"q": "b"}))
+
+    def test_turn_records_calls(self):
+        self.chat.remember("search", "GET", {"q": "a"}, {"data": ["a"]})
+        self.chat.add_turn("question", "answer")
+        self.assertEqual(self.chat.last_calls(), [("search", "GET", {"q": "a"})])
+        self.assertEqual(
+            [message["role"] for message in self.chat.history_messages()],
+            ["user", "assistant"],
+        )
+
+    def test_compact_summarizes_oldest_turns(self):
+        for index in range(6):
+            self.chat.add_turn(*_turn(index))
+        summarize = MagicMock(return_value="they discussed billing")
+        self.chat.compact(summarize, budget=300)
+
+        folded = summarize.call_args.args[1]
+        self.assertEqual(folded[0]["question"], "question 0")
+        self.assertEqual(self.chat.turns[-1]["question"], "question 5")
+        self.assertGreaterEqual(len(self.chat.turns), 2)
+        self.assertLessEqual(self.chat.history_tokens(), 300)
+        self.assertEqual(self.chat.summarized, len(folded))
+        self.assertIn("Summary", self.chat.history_messages()[0]["content"])
+
+    def test_compact_evicts_when_summary_fails(self):
+        for index in range(6):
+            self.chat.add_turn(*_turn(index))
+        self.chat.compact(MagicMock(side_effect=Exception("down")), budget=300)
+        self.assertEqual(self.chat.summary, "")
+        self.assertGreater(self.chat.evicted, 0)
+
+    def test_under_budget_untouched(self):
+        self.chat.add_turn(*_turn(0, words=5))
+        summarize = MagicMock()
+        self.chat.compact(summarize, budget=300)
+        summarize.assert_not_called()
+
+    def test_summarizer(self):
+        client = MagicMock()
+        client.chat.completions.create.return_value.choices[0].message.content = "s"
+        self.assertEqual(
+            summarizer(client)("", [{"question": "q", "answer": "a"}]), "s"
+        )
+        prompt = client.chat.completions.create.call_args.kwargs["messages"][1]
+        self.assertIn("User: q\nAssistant: a", prompt["content"])
+
+
+class TestConversationStore(unittest.TestCase):
+
+    def test_round_trip_and_stats(self):
+        store = ConversationStore(MemoryBackend())
+        chat = store.get("id")
+        chat.remember("search", "GET", {"q": "a"}, {"data": ["a"]})
+        chat.add_turn("question", "answer")
+        store.save(chat)
+
+        chat = store.get("id")
+        self.assertEqual(chat.turns[0]["answer"], "answer")
+        self.assertEqual(chat.retrieval("search", "GET", {"q": "a"}), {"data": ["a"]})
+        store.save(chat)
+        stats = store.stats()
+        self.assertEqual(
+            (stats["retrievals_fetched"], stats["retrievals_reused"]), (1, 1)
+        )
+        self.assertEqual(stats["reuse_rate"], 0.5)
+
+        store.delete("id")
+        self.assertEqual(store.get("id").turns, [])
+
+    def test_concurrent_saves_keep_both_turns(self):
+        store = ConversationStore(MemoryBackend())
+        first, second = store.get("id"), store.get("id")
+        first.remember("search", "GET", {"q": "a"}, {"data": ["a"]})
+        first.add_turn("first", "answer")
+        second.remember("search", "GET", {"q": "b"}, {"data": ["b"]})
+        second.add_turn("second", "answer")
+        store.save(first)
+        store.save(second)
+
+        chat = store.get("id")
+        self.assertEqual([turn["question"] for turn in chat.turns], ["first", "second"])
+        self.assertEqual(chat.retrieval("search", "GET", {"q": "a"}), {"data": ["a"]})
+        self.assertEqual(chat.retrieval("search", "GET", {"q": "b"}), {"data": ["b"]})
+
+    def test_compaction_runs_after_save(self):
+        store = ConversationStore(MemoryBackend(), budget=300)
+        chat = store.get("id")
+        for index in range(2):
+            chat.add_turn(*_turn(index))
+        self.assertIsNone(store.save(chat))
+
+        def summarize(summary, turns):
+            # Another worker answers a question while the summary is being written.
+            worker = ConversationStore(store.backend, budget=10000)
+            late = worker.get("id")
+            late.add_turn("late", "answer")
+            worker.save(late)
+            return "they discussed billing"
+
+        chat = store.get("id")
+        chat.add_turn(*_turn(2))
+        store.save(chat, summarize).result()
+
+        chat = store.get("id")
+        self.assertEqual(chat.summary, "they discussed billing")
+        self.assertEqual(chat.turns[-2]["question"], "question 2")
+        self.assertEqual(chat.turns[-1]["question"], "late")
+        self.assertEqual(chat.folded + len(chat.turns), 4)
+        self.assertGreater(store.stats()["turns_summarized"], 0)
+
+    def test_compaction_dropped_when_turns_moved(self):
+        store = ConversationStore(MemoryBackend(), budget=300)
+        chat = store.get("id")
+        for index in range(6):
+            chat.add_turn(*_turn(index))
+        store.save(chat)
+
+        def summarize(summary, turns):
+            # Another worker compacts the same turns first.
+            store.compact("id")
+            return "stale summary"
+
+        store.compact("id", summarize)
+        chat = store.get("id")
+        self.assertEqual(chat.summary, "")
+        self.assertEqual(chat.turns[-1]["question"], "question 5")
+        self.assertEqual(store.stats()["turns_evicted"], chat.folded)
+
+
+if __name__ == "__main__":
+    unittest.main()
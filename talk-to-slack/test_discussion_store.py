@@ -0,0 +1,107 @@
+import os
+import tempfile
+import unittest
+
+from discussion_store import (
+    DiscussionStore,
+    parse_timestamp,
+    resolve_window,
+    subtract_ranges,
+)
+
+DAY = 24 * 3600
+
+
+class TestHelpers(unittest.TestCase):
+
+    def test_parse_timestamp(self):
+        self.assertEqual(parse_timestamp("1700000000.5"), 1700000000.5)
+        self.assertEqual(parse_timestamp("1970-01-02T00:00:00Z"), DAY)
+        self.assertEqual(parse_timestamp("1970-01-02T00:00:00"), DAY)
+        self.assertIsNone(parse_timestamp("yesterday"))
+        self.assertIsNone(parse_timestamp(None))
+
+    def test_resolve_window_defaults(self):
+        self.assertEqual(resolve_window({}, now=10 * DAY), (3 * DAY, 10 * DAY))
+
+    def test_resolve_window_from_is_most_recent(self):
+        window = resolve_window(
+            {"from": "1970-01-05T00:00:00Z", "to": "1970-01-03T00:00:00Z"},
+            now=10 * DAY,
+        )
+        self.assertEqual(window, (2 * DAY, 4 * DAY))
+
+    def test_resolve_window_clamped_to_now(self):
+        self.assertEqual(
+            resolve_window({"from": str(20 * DAY)}, now=10 * DAY)[1], 10 * DAY
+        )
+
+    def test_subtract_ranges(self):
+        self.assertEqual(subtract_ranges(0, 10, []), [(0, 10)])
+        self.assertEqual(subtract_ranges(0, 10, [(2, 4), (6, 12)]), [(0, 2), (4, 6)])
+        self.assertEqual(subtract_ranges(3, 5, [(0, 10)]), [])
+
+
+class TestDiscussionStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = DiscussionStore(os.path.join(self.tmpdir.name, "store.sqlite3"))
+        self.fetched = []
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def fetch(self, start, end):
+        self.fetched.append((start, end))
+        messages = [
+            {"ts": str(ts), "text": f"message {ts}"}
+            for ts in range(int(start), int(end) + 1, 10)
+        ]
+        threads = {messages[0]["ts"]: [{"ts": str(start + 1), "text": "reply"}]}
+        return {"discussion_content": messages, "thread_contents": threads}, True
+
+    def test_fetches_only_missing_ranges(self):
+        first, success = self.store.get("user", 1, 100, 200, self.fetch)
+        self.assertTrue(success)
+        self.assertEqual(len(first["discussion_content"]), 11)
+        self.assertEqual(first["thread_contents"]["100"][0]["text"], "reply")
+
+        self.store.get("user", 1, 150, 300, self.fetch)
+        self.assertEqual(self.fetched, [(100, 200), (200, 300)])
+        self.assertEqual(self.store.watermark("user", 1), 300)
+
+        result, _ = self.store.get("user", 1, 120, 160, self.fetch)
+        self.assertEqual(len(self.fetched), 2)
+        self.assertEqual(
+            [message["ts"] for message in result["discussion_content"]],
+            ["120", "130", "140", "150", "160"],
+        )
+        self.assertEqual(self.store.stats()["queries_served_locally"], 1)
+
+    def test_scopes_are_isolated(self):
+        self.store.get("user", 1, 100, 200, self.fetch)
+        self.store.get("other", 1, 100, 200, self.fetch)
+        self.assertEqual(len(self.fetched), 2)
+
+    def test_failed_fetch_not_recorded(self):
+        data, success = self.store.get(
+            "user", 1, 100, 200, lambda start, end: ({"error": "boom"}, False)
+        )
+        self.assertFalse(success)
+        self.assertEqual(data, {"error": "boom"})
+        self.assertIsNone(self.store.watermark("user", 1))
+
+    def test_payload_without_timestamps_spans_window(self):
+        self.store.add(
+            "user", 2, 100, 200, {"discussion_content": "line one\nline two"}
+        )
+        result = self.store.query("user", 2, 150, 160)
+        self.assertEqual(result["discussion_content"], ["line one\nline two"])
+        self.assertEqual(
+            self.store.query("user", 2, 300, 400)["discussion_content"], []
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
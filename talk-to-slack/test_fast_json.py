@@ -0,0 +1,45 @@
+import datetime
+import unittest
+from unittest.mock import MagicMock
+
+import fast_json
+
+
+class TestFastJson(unittest.TestCase):
+
+    def test_round_trip_json(self):
+        data = {"name": "café", "values": [1, 2.5, None, True]}
+        encoded = fast_json.dumps(data, backend="json")
+        self.assertEqual(encoded, '{"name":"café","values":[1,2.5,null,true]}')
+        self.assertEqual(fast_json.loads(encoded.encode("utf-8"), backend="json"), data)
+
+    def test_unknown_types_as_str(self):
+        day = datetime.date(2024, 5, 1)
+        self.assertIn("2024-05-01", fast_json.dumps({"day": day}, backend="json"))
+
+    @unittest.skipIf(fast_json.orjson is None, "orjson not installed")
+    def test_backends_agree(self):
+        data = {"text": "ünïcode", "items": [{"a": 1}, {"b": [None, False]}]}
+        self.assertEqual(
+            fast_json.dumps(data, backend="orjson"),
+            fast_json.dumps(data, backend="json"),
+        )
+        raw = fast_json.dumps(data).encode("utf-8")
+        self.assertEqual(
+            fast_json.loads(raw, backend="orjson"), fast_json.loads(raw, backend="json")
+        )
+
+    def test_decode_response(self):
+        response = MagicMock()
+        response.content = b'{"data": [1]}'
+        self.assertEqual(fast_json.decode_response(response), {"data": [1]})
+        response.json.assert_not_called()
+
+    def test_decode_response_without_body(self):
+        response = MagicMock()
+        response.json.return_value = {"data": "test"}
+        self.assertEqual(fast_json.decode_response(response), {"data": "test"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import http_pool
+import requests
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path == "/slow":
+            time.sleep(1)
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestHttpPool(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}/"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        http_pool.pool_stats.reset()
+
+    def test_get_session_is_shared(self):
+        self.assertIs(http_pool.get_session(), http_pool.get_session())
+
+    def test_connection_reused(self):
+        session = http_pool.create_session()
+        for _ in range(3):
+            self.assertEqual(session.get(self.url).json(), {"ok": True})
+        session.close()
+        stats = http_pool.stats()
+        self.assertEqual(stats["requests"], 3)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hits"], 2)
+
+    def test_keep_alive_disabled(self):
+        session = http_pool.create_session(keep_alive=False)
+        for _ in range(2):
+            session.get(self.url)
+        session.close()
+        self.assertEqual(http_pool.stats()["misses"], 2)
+
+    def test_default_timeout(self):
+        session = http_pool.create_session(timeout=(1, 2))
+        self.assertEqual(session.timeout, (1, 2))
+
+    def test_deadline_caps_timeout(self):
+        self.assertEqual(http_pool.capped_timeout((1, 2)), (1, 2))
+        with http_pool.deadline(0.5):
+            connect, read = http_pool.capped_timeout((1, 30))
+            self.assertLessEqual(read, 0.5)
+            self.assertLessEqual(connect, 0.5)
+        with http_pool.deadline(0):
+            with self.assertRaises(requests.Timeout):
+                http_pool.capped_timeout((1, 30))
+
+    def test_deadline_ends_slow_call(self):
+        session = http_pool.create_session()
+        started = time.monotonic()
+        with http_pool.deadline(0.2):
+            with self.assertRaises(requests.Timeout):
+                session.get(self.url + "slow")
+        self.assertLess(time.monotonic() - started, 0.9)
+        session.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,232 @@
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+import requests
+from constants import REMEMBERIZER_MEMORIZE_ENDPOINT
+from ingest import (
+    chunk_document,
+    content_hash,
+    read_documents,
+    read_journal,
+    run_ingest,
+    split_content,
+)
+from provider import RememberizerSourceProvider
+from rate_limiter import RateLimiter
+
+
+def _response(status_code, content=b""):
+    response = MagicMock()
+    response.status_code = status_code
+    response.content = content
+    return response
+
+
+class TestMemorizeBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.provider = RememberizerSourceProvider("token", MagicMock())
+        self.running = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def post(self, url, params={}, method="get", retried=False):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(0.02)
+        with self.lock:
+            self.running -= 1
+        return _response(201, b'{"id": 1}')
+
+    def test_memorize(self):
+        with patch.object(
+            RememberizerSourceProvider, "call_api", return_value=_response(201)
+        ) as mock_call_api:
+            data, success = self.provider.memorize({"name": "a", "content": "b"})
+        self.assertTrue(success)
+        self.assertEqual(data, {})
+        mock_call_api.assert_called_once_with(
+            REMEMBERIZER_MEMORIZE_ENDPOINT,
+            params={"name": "a", "content": "b"},
+            method="post",
+            retried=False,
+            json_body=True,
+        )
+
+    def test_memorize_sends_json_body(self):
+        sent = []
+
+        def send(adapter, request, **kwargs):
+            sent.append(request)
+            response = requests.Response()
+            response.status_code = 201
+            response._content = b'{"id": 1}'
+            response.request = request
+            return response
+
+        provider = RememberizerSourceProvider("token", requests.Session())
+        with patch.object(requests.adapters.HTTPAdapter, "send", send):
+            data, success = provider.memorize({"name": "a", "content": "b & c"})
+        self.assertTrue(success)
+        self.assertEqual(sent[0].url, REMEMBERIZER_MEMORIZE_ENDPOINT)
+        self.assertEqual(sent[0].headers["Content-Type"], "application/json")
+        self.assertEqual(json.loads(sent[0].body), {"name": "a", "content": "b & c"})
+
+    def test_bounded_concurrency_and_lazy_reads(self):
+        read = []
+
+        def chunks():
+            for index in range(8):
+                read.append(index)
+                # Chunks are only read as slots free up.
+                self.assertLessEqual(len(read) - len(results), 3)
+                yield index, f"note {index}", "content"
+
+        results = []
+        with patch.object(
+            RememberizerSourceProvider, "call_api", side_effect=self.post
+        ):
+            for result in self.provider.memorize_batch(chunks(), concurrency=2):
+                results.append(result)
+        self.assertEqual(sorted(result["id"] for result in results), list(range(8)))
+        self.assertLessEqual(self.peak, 2)
+
+    @patch("provider.time.sleep")
+    def test_retries_transient_failures(self, mock_sleep):
+        responses = [
+            requests.ConnectionError("reset"),
+            _response(503, b'{"detail": "busy"}'),
+            _response(201),
+        ]
+        with patch.object(
+            RememberizerSourceProvider, "call_api", side_effect=responses
+        ):
+            results = list(self.provider.memorize_batch([(1, "a", "b")]))
+        self.assertEqual(results, [{"id": 1, "name": "a", "attempts": 3}])
+        self.assertEqual([call.args[0] for call in mock_sleep.call_args_list], [0.5, 1])
+
+    @patch("provider.time.sleep")
+    def test_gives_up(self, mock_sleep):
+        with patch.object(
+            RememberizerSourceProvider,
+            "call_api",
+            return_value=_response(400, b'{"detail": "bad"}'),
+        ):
+            results = list(self.provider.memorize_batch([(1, "a", "b")]))
+        self.assertEqual(results[0]["attempts"], 1)
+        self.assertIn("HTTP 400", results[0]["error"])
+
+        with patch.object(
+            RememberizerSourceProvider, "call_api", return_value=_response(500)
+        ):
+            results = list(self.provider.memorize_batch([(1, "a", "b")], max_retries=2))
+        self.assertEqual(results[0]["attempts"], 3)
+
+    @patch("provider.time.sleep")
+    def test_open_circuit_does_not_abort_ingest(self, mock_sleep):
+        self.provider.rate_limiter = RateLimiter(failure_threshold=2, reset_timeout=30)
+        self.provider.session.post.return_value = _response(503)
+        chunks = [(index, f"note {index}", "content") for index in range(10)]
+        results = list(self.provider.memorize_batch(chunks, concurrency=2))
+        self.assertEqual(len(results), 10)
+        self.assertTrue(all("error" in result for result in results))
+        self.assertTrue(any("Circuit open" in result["error"] for result in results))
+        # Rejected attempts wait for the circuit's reset timeout.
+        self.assertTrue(any(call.args[0] > 20 for call in mock_sleep.call_args_list))
+
+    @patch("provider.time.sleep")
+    def test_unexpected_exception_becomes_error(self, mock_sleep):
+        with patch.object(
+            RememberizerSourceProvider, "call_api", side_effect=ValueError("bad")
+        ):
+            results = list(self.provider.memorize_batch([(1, "a", "b")]))
+        self.assertEqual(
+            results, [{"id": 1, "name": "a", "attempts": 1, "error": "bad"}]
+        )
+
+
+class TestIngest(unittest.TestCase):
+
+    def test_split_content(self):
+        self.assertEqual(split_content("a\n\nb\n\n\n\nc", 100), ["a\n\nb\n\nc"])
+        self.assertEqual(
+            split_content("aaaa\n\nbbbb\n\ncc", 10), ["aaaa\n\nbbbb", "cc"]
+        )
+        self.assertEqual(split_content("x" * 25, 10), ["x" * 10, "x" * 10, "x" * 5])
+        self.assertEqual(split_content("  \n\n", 10), [])
+
+    def test_chunk_document(self):
+        self.assertEqual(chunk_document("note", "short", 10), [("note", "short")])
+        self.assertEqual(
+            chunk_document("note", "aaaa\n\nbbbb\n\ncc", 10),
+            [("note (1/2)", "aaaa\n\nbbbb"), ("note (2/2)", "cc")],
+        )
+
+    def test_read_documents(self):
+        with tempfile.TemporaryDirectory() as directory:
+            os.makedirs(os.path.join(directory, "notes"))
+            with open(os.path.join(directory, "notes", "b.txt"), "w") as file:
+                file.write("transcript")
+            with open(os.path.join(directory, "a.jsonl"), "w") as file:
+                file.write('{"name": "first", "content": "one"}\n\n')
+                file.write('{"content": "two"}\n')
+            with open(os.path.join(directory, ".hidden"), "w") as file:
+                file.write("skip")
+            documents = list(read_documents([directory]))
+        self.assertEqual(
+            [content for _, content in documents], ["one", "two", "transcript"]
+        )
+        self.assertEqual(documents[0][0], "first")
+        self.assertTrue(documents[1][0].endswith("a.jsonl:3"))
+
+    def test_run_ingest_dedupes_and_resumes(self):
+        provider = MagicMock()
+        submitted = []
+
+        def memorize_batch(chunks, **kwargs):
+            for chunk_id, name, content in chunks:
+                submitted.append(content)
+                if content == "bad":
+                    yield {"id": chunk_id, "name": name, "attempts": 4, "error": "down"}
+                else:
+                    yield {"id": chunk_id, "name": name, "attempts": 1}
+
+        provider.memorize_batch.side_effect = memorize_batch
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "journal.jsonl")
+            with open(path, "w") as journal:
+                entry = {"hash": content_hash("old"), "status": "memorized"}
+                journal.write(json.dumps(entry) + "\n")
+                journal.write('{"hash": "ab')
+            done = read_journal(path)
+            self.assertEqual(done, {content_hash("old")})
+
+            journal = io.StringIO()
+            documents = [("a", "old"), ("b", "new"), ("c", "new"), ("d", "bad")]
+            report = run_ingest(provider, iter(documents), journal, done=done)
+
+        self.assertEqual(submitted, ["new", "bad"])
+        entries = [json.loads(line) for line in journal.getvalue().splitlines()]
+        self.assertEqual(
+            [(entry["name"], entry["status"]) for entry in entries],
+            [("b", "memorized"), ("d", "error")],
+        )
+        self.assertEqual(entries[0]["hash"], content_hash("new"))
+        self.assertEqual(report["documents"], 4)
+        self.assertEqual(report["skipped"], 1)
+        self.assertEqual(report["duplicates"], 1)
+        self.assertEqual(report["memorized"], 1)
+        self.assertEqual(report["errors"], 1)
+        self.assertEqual(report["retries"], 3)
+        self.assertIn("documents_per_second", report)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,184 @@
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+import local_index
+from context_builder import Passage
+from local_index import LocalIndex, recall
+
+TOPICS = [
+    "deploy",
+    "billing",
+    "onboarding",
+    "pricing",
+    "migration",
+    "escalation",
+    "release",
+    "roadmap",
+]
+
+
+def search_response(*texts):
+    return {
+        "data": [
+            {"matched_content": text, "document": {"name": "notes"}, "distance": 0.9}
+            for text in texts
+        ]
+    }
+
+
+class TestLocalIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def make_index(self, **kwargs):
+        kwargs.setdefault("mode", "fallback")
+        return LocalIndex(self.tmpdir.name, dim=256, **kwargs)
+
+    def test_search_returns_nearest_chunk(self):
+        index = self.make_index()
+        index.add_response(
+            "user",
+            search_response(
+                "the backend is deployed with kubernetes every friday",
+                "billing invoices are sent on the first of the month",
+            ),
+        )
+        results = index.search("user", "how is the backend deployed", n=1)
+        self.assertEqual(
+            results[0]["matched_content"],
+            "the backend is deployed with kubernetes every friday",
+        )
+        self.assertEqual(results[0]["document"]["name"], "notes")
+        self.assertEqual(index.search("other", "backend deployed"), [])
+
+    def test_duplicates_skipped_and_persisted(self):
+        index = self.make_index()
+        self.assertEqual(index.add("user", [Passage("alpha"), Passage("beta")]), 2)
+        self.assertEqual(index.add("user", [Passage("alpha")]), 0)
+        reopened = self.make_index()
+        self.assertEqual(reopened.size, 2)
+        self.assertEqual(
+            reopened.search("user", "alpha", 1)[0]["matched_content"], "alpha"
+        )
+
+    def test_shared_between_processes(self):
+        # Two instances on one path stand in for two gunicorn workers.
+        first, second = self.make_index(), self.make_index()
+        self.assertEqual(first.add("user", [Passage("alpha from first")]), 1)
+        self.assertEqual(second.add("user", [Passage("beta from second")]), 1)
+        self.assertEqual(self.make_index().size, 2)
+
+        # The first grows the matrix past the second's mapping and retrains.
+        first.add("user", [Passage(f"gamma note {i}") for i in range(1100)])
+        first.wait_for_training()
+        self.assertGreater(len(first._vectors), len(second._vectors))
+        results = second.search("user", "gamma note 1050", 3)
+        self.assertIn("gamma note 1050", [item["matched_content"] for item in results])
+        self.assertEqual(
+            second.search("user", "alpha from first", 1)[0]["matched_content"],
+            "alpha from first",
+        )
+
+    def test_grows_and_trains_ivf(self):
+        index = self.make_index(nlist=8, nprobe=8)
+        passages = [
+            Passage(f"{topic} note number {i} about the {topic} project")
+            for i in range(60)
+            for topic in TOPICS
+        ]
+        index.add("user", passages)
+        index.wait_for_training()
+        self.assertGreater(index.size, 256)
+        self.assertEqual(len(index.centroids), 8)
+        self.assertGreaterEqual(len(index._vectors), index.size)
+        results = index.search("user", "note number 7 about the billing project", 3)
+        self.assertIn("billing note number 7", results[0]["matched_content"])
+
+    def test_training_runs_off_the_request_path(self):
+        index = self.make_index(nlist=8, nprobe=8)
+        started, finish = threading.Event(), threading.Event()
+        kmeans = local_index._kmeans
+
+        def slow_kmeans(*args, **kwargs):
+            started.set()
+            finish.wait(5)
+            return kmeans(*args, **kwargs)
+
+        with patch("local_index._kmeans", slow_kmeans):
+            index.add("user", [Passage(f"billing note {i}") for i in range(300)])
+            self.assertTrue(started.wait(5))
+            # add returned while k-means runs; the index still answers, unlisted.
+            self.assertIsNone(index.centroids)
+            self.assertEqual(index.add("user", [Passage("billing note late")]), 1)
+            self.assertEqual(
+                index.search("user", "billing note 42", 1)[0]["matched_content"],
+                "billing note 42",
+            )
+            finish.set()
+            index.wait_for_training()
+        self.assertEqual(len(index.centroids), 8)
+        # The chunk added during training was listed with the new centroids too.
+        (unlisted,) = index._conn.execute(
+            "SELECT COUNT(*) FROM chunks WHERE list_id = -1"
+        ).fetchone()
+        self.assertEqual(unlisted, 0)
+
+    def test_fallback_answers_when_remote_fails(self):
+        index = self.make_index()
+        index.add_response("user", search_response("the release was delayed by qa"))
+        arguments = {"q": "why was the release delayed", "n": 3}
+        local, answer = index.lookup("user", arguments)
+        self.assertIsNone(answer)
+        data, success = index.resolve(
+            "user", arguments, local, {"error": "down"}, False
+        )
+        self.assertTrue(success)
+        self.assertEqual(
+            data["data"][0]["matched_content"], "the release was delayed by qa"
+        )
+        self.assertEqual(index.stats()["fallbacks"], 1)
+
+    def test_local_first_fills_from_remote(self):
+        index = self.make_index(mode="local_first", min_score=0.3)
+        index.add_response("user", search_response("pricing changes start in may"))
+        arguments = {"q": "pricing changes start in may", "n": 2}
+        local, answer = index.lookup("user", arguments)
+        self.assertIsNone(answer)
+
+        remote = search_response(
+            "pricing changes start in may", "the pricing page is being redesigned"
+        )
+        data, success = index.resolve("user", arguments, local, remote, True)
+        self.assertTrue(success)
+        self.assertEqual(
+            [item["matched_content"] for item in data["data"]],
+            ["pricing changes start in may", "the pricing page is being redesigned"],
+        )
+        # Ranked per source, not by the incomparable raw scores.
+        self.assertEqual([item["distance"] for item in data["data"]], [1.0, 0.5])
+        self.assertEqual(data["data"][1]["source_distance"], 0.9)
+        self.assertEqual(index.stats()["recall"], 0.5)
+
+        _, answer = index.lookup("user", {"q": "pricing changes may", "n": 1})
+        self.assertIsNotNone(answer)
+        self.assertEqual(index.stats()["served_locally"], 1)
+
+    def test_invalid_mode(self):
+        with self.assertRaises(Exception):
+            self.make_index(mode="sometimes")
+
+    def test_recall(self):
+        local = [{"matched_content": "a"}, {"matched_content": "b"}]
+        remote = [{"matched_content": "a"}, {"matched_content": "c"}]
+        self.assertEqual(recall(local, remote), 0.5)
+        self.assertIsNone(recall(local, []))
+
+
+if __name__ == "__main__":
+    unittest.main()
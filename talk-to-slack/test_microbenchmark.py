@@ -0,0 +1,34 @@
+import unittest
+from unittest.mock import patch
+
+from microbenchmark import discussion_payload, main, search_payload
+from results import parse_results
+
+
+class TestPayloads(unittest.TestCase):
+
+    def test_payloads_parse(self):
+        self.assertEqual(len(parse_results(search_payload(3, 50))), 3)
+        self.assertEqual(len(parse_results(discussion_payload(8, 20))), 8 + 2 * 3)
+
+
+class TestMain(unittest.TestCase):
+
+    @patch("sys.stdout")
+    def test_report(self, _):
+        report = main(["--matches", "5", "--messages", "8", "--repeat", "2"])
+        self.assertEqual(
+            [payload["name"] for payload in report["payloads"]],
+            ["search", "discussion"],
+        )
+        for payload in report["payloads"]:
+            self.assertIn("json", payload["decode_us"])
+            self.assertLess(
+                payload["prompt_bytes"]["results_render"],
+                payload["prompt_bytes"]["dict_str"],
+            )
+            self.assertGreater(payload["retained_bytes"]["results"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,18 +1,37 @@
+import tempfile
+import threading
+import time
 import unittest
 from unittest.mock import MagicMock, patch
 
+import http_pool
+from constants import (
+    REMEMBERIZER_DISCUSSION_CONTENT_ENDPOINT,
+    REMEMBERIZER_DOCUMENT_CONTENTS_ENDPOINT,
+    REMEMBERIZER_DOCUMENTS_ENDPOINT,
+)
+from context_builder import ContextBuilder
+from conversation import Conversation
+from local_index import LocalIndex
 from provider import (
     FUNCTION_MAPPING,
     RememberizerSourceProvider,
     generate_extra_knowledge_message,
 )
+from rate_limiter import RateLimiter
+from response_cache import MemoryBackend, ResponseCache
+from router import RouteDecision
+from semantic_cache import SemanticCache
+from single_flight import SingleFlight
+from speculation import SpeculativeSearch
 
 
 class TestRememberizerSourceProvider(unittest.TestCase):
 
     def setUp(self):
         self.access_token = "test_access_token"
-        self.provider = RememberizerSourceProvider(self.access_token)
+        self.session = MagicMock()
+        self.provider = RememberizerSourceProvider(self.access_token, self.session)
         self.mock_response = MagicMock()
         self.mock_response.json.return_value = {"data": "test"}
         self.mock_response.status_code = 200
@@ -20,26 +39,60 @@ class TestRememberizerSourceProvider(unittest.TestCase):
     def test_initialization(self):
         self.assertEqual(self.provider.access_token, self.access_token)
 
-    @patch("provider.requests.get")
-    def test_call_api_get(self, mock_get):
-        mock_get.return_value = self.mock_response
+    @patch("provider.http_pool.get_session")
+    def test_initialization_uses_shared_session(self, mock_get_session):
+        provider = RememberizerSourceProvider(self.access_token)
+        self.assertIs(provider.session, mock_get_session.return_value)
+
+    def test_call_api_get(self):
+        self.session.get.return_value = self.mock_response
         response = self.provider.call_api("http://test.url", method="get")
         self.assertEqual(response, self.mock_response)
-        mock_get.assert_called_once_with(
+        self.session.get.assert_called_once_with(
             "http://test.url",
             headers={"Authorization": f"Bearer {self.access_token}"},
             params={},
             verify=False,
         )
 
-    @patch("provider.requests.post")
-    def test_call_api_post(self, mock_post):
-        mock_post.return_value = self.mock_response
+    @patch("provider.time.sleep")
+    def test_call_api_retries_with_rate_limiter(self, mock_sleep):
+        throttled = MagicMock(status_code=429, headers={"Retry-After": "1"})
+        unavailable = MagicMock(status_code=503, headers={})
+        self.session.get.side_effect = [throttled, unavailable, self.mock_response]
+        self.provider.rate_limiter = RateLimiter(max_attempts=3)
+
+        response = self.provider.call_api("http://test.url/search/")
+
+        self.assertIs(response, self.mock_response)
+        self.assertEqual(self.session.get.call_count, 3)
+        self.assertGreaterEqual(
+            max(call.args[0] for call in mock_sleep.call_args_list), 1
+        )
+
+        self.session.get.side_effect = [unavailable]
+        response = self.provider.call_api("http://test.url/search/", retried=True)
+        self.assertIs(response, unavailable)
+
+    @patch("provider.time.sleep")
+    def test_call_api_no_retry_past_deadline(self, mock_sleep):
+        throttled = MagicMock(status_code=429, headers={"Retry-After": "2"})
+        self.session.get.side_effect = [throttled, self.mock_response]
+        self.provider.rate_limiter = RateLimiter(max_attempts=3)
+
+        with http_pool.deadline(1):
+            response = self.provider.call_api("http://test.url/search/")
+
+        self.assertIs(response, throttled)
+        self.assertEqual(self.session.get.call_count, 1)
+
+    def test_call_api_post(self):
+        self.session.post.return_value = self.mock_response
         response = self.provider.call_api(
             "http://test.url", method="post", params={"key": "value"}
         )
         self.assertEqual(response, self.mock_response)
-        mock_post.assert_called_once_with(
+        self.session.post.assert_called_once_with(
             "http://test.url",
             headers={"Authorization": f"Bearer {self.access_token}"},
             data={"key": "value"},
@@ -60,7 +113,7 @@ class TestRememberizerSourceProvider(unittest.TestCase):
     def test_responses_to_text(self):
         user_message = "Test message"
         response = {"data": "test"}
-        expected_text = "Knowledge source: Rememberizer\n\tUser: Test message\n\tResponse: {'data': 'test'}\n\n"
+        expected_text = 'Knowledge source: Rememberizer\n\tUser: Test message\n\tResponse: {"data":"test"}\n\n'
         self.assertEqual(
             self.provider.responses_to_text(user_message, response), expected_text
         )
@@ -75,6 +128,80 @@ class TestRememberizerSourceProvider(unittest.TestCase):
             FUNCTION_MAPPING["search"][2], params={"q": "test query"}
         )
 
+    @patch.object(RememberizerSourceProvider, "call_api")
+    def test_search_cached(self, mock_call_api):
+        mock_call_api.return_value = self.mock_response
+        self.provider.cache = ResponseCache(MemoryBackend())
+        for _ in range(2):
+            response, success = self.provider.search({"q": "test query"})
+            self.assertTrue(success)
+            self.assertEqual(response, {"data": "test"})
+        mock_call_api.assert_called_once()
+
+    @patch.object(RememberizerSourceProvider, "call_api")
+    def test_search_semantic_cache(self, mock_call_api):
+        mock_call_api.return_value = self.mock_response
+        self.provider.semantic_cache = SemanticCache(threshold=0.9)
+        self.provider.search({"q": "What did the team decide about the release?"})
+        response, success = self.provider.search(
+            {"q": "what did the team decide about the release"}
+        )
+        self.assertTrue(success)
+        self.assertEqual(response, {"data": "test"})
+        mock_call_api.assert_called_once()
+
+    @patch.object(RememberizerSourceProvider, "call_api")
+    def test_search_failure_not_cached(self, mock_call_api):
+        self.mock_response.status_code = 500
+        mock_call_api.return_value = self.mock_response
+        self.provider.cache = ResponseCache(MemoryBackend())
+        for _ in range(2):
+            self.provider.search({"q": "test query"})
+        self.assertEqual(mock_call_api.call_count, 2)
+
+    @patch.object(RememberizerSourceProvider, "call_api")
+    def test_search_local_index_fallback(self, mock_call_api):
+        self.mock_response.json.return_value = {
+            "data": [{"matched_content": "the release moved to friday"}]
+        }
+        mock_call_api.return_value = self.mock_response
+        with tempfile.TemporaryDirectory() as path:
+            self.provider.local_index = LocalIndex(path, dim=256, mode="fallback")
+            self.provider.search({"q": "when is the release", "n": 1})
+
+            mock_call_api.side_effect = ConnectionError("down")
+            response, success = self.provider.search(
+                {"q": "when is the release", "n": 1}
+            )
+
+        self.assertTrue(success)
+        self.assertEqual(
+            response["data"][0]["matched_content"], "the release moved to friday"
+        )
+
+    @patch.object(RememberizerSourceProvider, "call_api")
+    def test_concurrent_identical_calls_coalesced(self, mock_call_api):
+        def slow_call(*args, **kwargs):
+            time.sleep(0.2)
+            return self.mock_response
+
+        mock_call_api.side_effect = slow_call
+        self.provider.single_flight = SingleFlight()
+        threads = [
+            threading.Thread(
+                target=self.provider.get_discussion_content,
+                args=({"discussion_id": 7, "from": "2024-01-02", "to": "2024-01-01"},),
+            )
+            for _ in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        mock_call_api.assert_called_once()
+        self.assertEqual(self.provider.single_flight.stats()["saved"], 2)
+
     @patch.object(RememberizerSourceProvider, "call_api")
     def test_get_account(self, mock_call_api):
         mock_call_api.return_value = self.mock_response
@@ -94,14 +221,132 @@ class TestRememberizerSourceProvider(unittest.TestCase):
             params={"integration_type": "slack"},
         )
 
+    @patch.object(RememberizerSourceProvider, "call_api")
+    def test_get_discussion_content_integration_type(self, mock_call_api):
+        mock_call_api.return_value = self.mock_response
+        self.provider.get_discussion_content(
+            {"discussion_id": 123, "integration_type": "teams"}
+        )
+        mock_call_api.assert_called_once_with(
+            FUNCTION_MAPPING["get_discussion_content"][2].format(123),
+            params={"integration_type": "teams"},
+        )
+
+    def test_search_fans_out_to_sources(self):
+        sources = MagicMock()
+        sources.search.return_value = ({"data": [], "sources": {}}, True)
+        provider = RememberizerSourceProvider(self.access_token, sources=sources)
+        response, success = provider.search({"q": "launch"})
+        self.assertTrue(success)
+        sources.search.assert_called_once_with(provider, {"q": "launch"})
+
+    @patch.object(RememberizerSourceProvider, "call_api")
+    def test_get_discussion_content_uses_store(self, mock_call_api):
+        account = MagicMock()
+        account.status_code = 200
+        account.json.return_value = {"id": 42}
+        contents = MagicMock()
+        contents.status_code = 200
+        contents.json.return_value = {
+            "discussion_content": [{"ts": "1700000000", "text": "hello"}]
+        }
+        mock_call_api.side_effect = [account, contents]
+        self.provider.discussion_store = MagicMock()
+        self.provider.discussion_store.get.side_effect = (
+            lambda scope, discussion_id, start, end, fetch: fetch(start, end)
+        )
+
+        response, success = self.provider.get_discussion_content(
+            {
+                "discussion_id": 123,
+                "from": "2023-11-15T00:00:00Z",
+                "to": "2023-11-14T00:00:00Z",
+            }
+        )
+
+        self.assertTrue(success)
+        scope, discussion_id, start, end, _ = (
+            self.provider.discussion_store.get.call_args.args
+        )
+        self.assertEqual((scope, discussion_id), ("account:42", 123))
+        self.assertLess(start, end)
+        mock_call_api.assert_called_with(
+            FUNCTION_MAPPING["get_discussion_content"][2].format(123),
+            params={
+                "from": "2023-11-15T00:00:00+00:00",
+                "to": "2023-11-14T00:00:00+00:00",
+                "integration_type": "slack",
+            },
+        )
+
     @patch.object(RememberizerSourceProvider, "call_api")
     def test_list_channels(self, mock_call_api):
         mock_call_api.return_value = self.mock_response
         response, success = self.provider.list_channels({})
         self.assertTrue(success)
-        self.assertEqual(response, {"data": "test"})
+        self.assertEqual(response, {"count": 0, "results": []})
         mock_call_api.assert_called_once_with(
-            FUNCTION_MAPPING["list_channels"][2], params={}
+            FUNCTION_MAPPING["list_channels"][2], params={"page_size": 100}
+        )
+
+    def _page(self, results, next_url=None):
+        response = MagicMock()
+        response.status_code = 200
+        response.json.return_value = {"results": results, "next": next_url}
+        return response
+
+    @patch.object(RememberizerSourceProvider, "call_api")
+    def test_list_channels_all_pages(self, mock_call_api):
+        mock_call_api.side_effect = [
+            self._page([{"name": "a"}], "http://next/2"),
+            self._page([{"name": "b"}]),
+        ]
+        response, success = self.provider.list_channels({})
+        self.assertTrue(success)
+        self.assertEqual(response["count"], 2)
+        mock_call_api.assert_called_with("http://next/2", params={})
+
+    @patch.object(RememberizerSourceProvider, "call_api")
+    def test_list_channels_failure(self, mock_call_api):
+        self.mock_response.status_code = 401
+        mock_call_api.return_value = self.mock_response
+        response, success = self.provider.list_channels({})
+        self.assertFalse(success)
+        self.assertIn("error", response)
+
+    @patch.object(RememberizerSourceProvider, "call_api")
+    def test_iter_documents_lazy_with_prefetch(self, mock_call_api):
+        mock_call_api.side_effect = [
+            self._page([{"id": 1}, {"id": 2}], "http://next/2"),
+            self._page([{"id": 3}], "http://next/3"),
+            self._page([{"id": 4}]),
+        ]
+        documents = self.provider.iter_documents(
+            {"integration_type": "slack"}, page_size=2, prefetch=True
+        )
+        self.assertEqual(next(documents), {"id": 1})
+        mock_call_api.assert_any_call(
+            REMEMBERIZER_DOCUMENTS_ENDPOINT,
+            params={"integration_type": "slack", "page_size": 2},
+        )
+        self.assertEqual([document["id"] for document in documents], [2, 3, 4])
+        self.assertEqual(mock_call_api.call_count, 3)
+
+    @patch.object(RememberizerSourceProvider, "call_api")
+    def test_iter_document_contents(self, mock_call_api):
+        pages = []
+        for content, end in (("first", 20), ("second", 40), ("last", 45)):
+            response = MagicMock()
+            response.status_code = 200
+            response.json.return_value = {"content": content, "end_chunk": end}
+            pages.append(response)
+        mock_call_api.side_effect = pages
+
+        contents = list(self.provider.iter_document_contents(7, prefetch=True))
+        self.assertEqual(contents, ["first", "second", "last"])
+        mock_call_api.assert_called_with(
+            REMEMBERIZER_DOCUMENT_CONTENTS_ENDPOINT.format(7),
+            params={"start_chunk": 40, "end_chunk": 60},
         )
 
     @patch.object(RememberizerSourceProvider, "search")
@@ -145,6 +390,216 @@ class TestRememberizerSourceProvider(unittest.TestCase):
             extra_knowledge="extra content", request_type="GET"
         )
 
+    def _tool_call(self, name, arguments):
+        tool_call = MagicMock()
+        tool_call.function.name = name
+        tool_call.function.arguments = arguments
+        return tool_call
+
+    def test_handle_runs_all_tool_calls_in_order(self):
+        mock_client = MagicMock()
+        mock_response = MagicMock()
+        mock_response.choices = [MagicMock()]
+        mock_response.choices[0].message.tool_calls = [
+            self._tool_call("search", '{"q": "test query"}'),
+            self._tool_call("unknown", "{}"),
+            self._tool_call("get_discussion_content", '{"discussion_id": 1}'),
+        ]
+        mock_client.chat.completions.create.return_value = mock_response
+        started = threading.Barrier(2, timeout=2)
+
+        def call_function(function_name, arguments):
+            started.wait()
+            return {"function": function_name}
+
+        with patch.object(self.provider, "call_function", side_effect=call_function):
+            result = self.provider.handle("Test message", mock_client)
+
+        first = result.index('{"function":"search"}')
+        second = result.index('{"function":"get_discussion_content"}')
+        self.assertLess(first, second)
+        self.assertTrue(result.startswith("Below are some extra knowledge"))
+
+    def test_handle_reuses_conversation_retrievals(self):
+        mock_client = MagicMock()
+        mock_response = MagicMock()
+        mock_response.choices = [MagicMock()]
+        mock_response.choices[0].message.tool_calls = [
+            self._tool_call("search", '{"q": "billing"}'),
+        ]
+        mock_client.chat.completions.create.return_value = mock_response
+        chat = Conversation("id")
+
+        with patch.object(
+            self.provider, "call_function", return_value={"data": "billing notes"}
+        ) as mock_call_function:
+            self.provider.handle("Who owns billing?", mock_client, conversation=chat)
+            chat.add_turn("Who owns billing?", "Alice")
+            result = self.provider.handle(
+                "When was that decided?", mock_client, conversation=chat
+            )
+
+        mock_call_function.assert_called_once()
+        self.assertIn("billing notes", result)
+        prompt = mock_client.chat.completions.create.call_args.kwargs["messages"]
+        self.assertEqual(
+            [message["content"] for message in prompt[1:]],
+            ["Who owns billing?", "Alice", "When was that decided?"],
+        )
+
+    def test_discussion_call_remembered_and_replayed(self):
+        self.session.get.return_value = self.mock_response
+        chat = Conversation("id")
+        calls = [
+            (
+                "get_discussion_content",
+                "GET",
+                {"discussion_id": "C1", "integration_type": "slack", "from": "2024"},
+            )
+        ]
+        self.provider.retrieve(calls, conversation=chat)
+        self.assertEqual(
+            self.session.get.call_args.args[0],
+            REMEMBERIZER_DISCUSSION_CONTENT_ENDPOINT.format("C1"),
+        )
+        self.assertEqual(calls[0][2]["discussion_id"], "C1")
+
+        self.provider.retrieve(calls, conversation=chat)
+        self.assertEqual(self.session.get.call_count, 1)
+        self.assertEqual(chat.reused, 1)
+
+        chat.add_turn("What happened in C1?", "Nothing")
+        self.assertEqual(chat.last_calls(), calls + calls)
+        # Once the stored retrieval is stale the replayed call fetches again.
+        with patch("conversation.time.time", return_value=time.time() + 3600):
+            responses = self.provider.retrieve(chat.last_calls()[:1], chat)
+        self.assertEqual(responses, [{"data": "test"}])
+        self.assertEqual(self.session.get.call_count, 2)
+        self.assertEqual(
+            self.session.get.call_args.args[0],
+            REMEMBERIZER_DISCUSSION_CONTENT_ENDPOINT.format("C1"),
+        )
+
+    def test_handle_follow_up_without_tool_calls_reuses_context(self):
+        mock_client = MagicMock()
+        mock_client.chat.completions.create.return_value.choices = [MagicMock()]
+        mock_client.chat.completions.create.return_value.choices[
+            0
+        ].message.tool_calls = None
+        chat = Conversation("id")
+        chat.remember("search", "GET", {"q": "billing"}, {"data": "billing notes"})
+        chat.add_turn("Who owns billing?", "Alice")
+
+        with patch.object(self.provider, "call_function") as mock_call_function:
+            result = self.provider.handle(
+                "Summarize that", mock_client, conversation=chat
+            )
+
+        mock_call_function.assert_not_called()
+        self.assertIn("billing notes", result)
+
+    def test_handle_local_route_skips_tool_choice(self):
+        mock_client = MagicMock()
+        self.provider.router = MagicMock()
+        self.provider.router.route.return_value = RouteDecision(
+            "search", {"q": "Test message", "n": 5}, 0.9, "classifier"
+        )
+        with patch.object(
+            self.provider, "call_function", return_value={"data": "test"}
+        ) as mock_call_function:
+            result = self.provider.handle("Test message", mock_client)
+
+        mock_client.chat.completions.create.assert_not_called()
+        mock_call_function.assert_called_once_with(
+            "search", {"q": "Test message", "n": 5}
+        )
+        self.assertIn('{"data":"test"}', result)
+
+    def test_handle_low_confidence_falls_back_to_llm(self):
+        mock_client = MagicMock()
+        mock_client.chat.completions.create.return_value.choices = [MagicMock()]
+        mock_client.chat.completions.create.return_value.choices[
+            0
+        ].message.tool_calls = None
+        self.provider.router = MagicMock()
+        self.provider.router.route.return_value = None
+
+        result = self.provider.handle("Test message", mock_client)
+        self.assertEqual(result, "No context provided")
+        mock_client.chat.completions.create.assert_called_once()
+
+    def tool_choice_client(self, name, arguments):
+        mock_client = MagicMock()
+        tool_call = MagicMock()
+        tool_call.function.name = name
+        tool_call.function.arguments = arguments
+        choice = MagicMock()
+        choice.message.tool_calls = [tool_call]
+        mock_client.chat.completions.create.return_value.choices = [choice]
+        return mock_client
+
+    def test_handle_speculative_search_hit(self):
+        self.provider.speculative_search = SpeculativeSearch()
+        mock_client = self.tool_choice_client(
+            "search", '{"q": "When is the launch?", "n": 3}'
+        )
+        with patch.object(
+            self.provider, "call_function", return_value={"data": "launch"}
+        ) as mock_call_function:
+            result = self.provider.handle("when is the launch", mock_client)
+
+        mock_call_function.assert_called_once_with(
+            "search", {"q": "when is the launch", "n": 5}
+        )
+        self.assertIn('{"data":"launch"}', result)
+        self.assertEqual(self.provider.speculative_search.stats()["hits"], 1)
+
+    def test_handle_speculative_search_miss(self):
+        self.provider.speculative_search = SpeculativeSearch()
+        mock_client = self.tool_choice_client("account", "{}")
+        with patch.object(
+            self.provider, "call_function", return_value={"data": "test"}
+        ) as mock_call_function:
+            self.provider.handle("who am I signed in as", mock_client)
+
+        mock_call_function.assert_any_call("get_account", {})
+        self.assertEqual(self.provider.speculative_search.stats()["misses"], 1)
+
+    def test_build_extra_knowledge_with_context_builder(self):
+        self.provider.context_builder = ContextBuilder(token_budget=100)
+        result = self.provider.build_extra_knowledge(
+            "Test message",
+            [("get_account", "GET", {})],
+            [{"name": "Ana", "email": "ana@example.com"}],
+        )
+        self.assertIn('{"name":"Ana","email":"ana@example.com"}', result)
+        self.assertTrue(result.startswith("Below are some extra knowledge"))
+
+    def test_run_tool_calls_timeout(self):
+        release = threading.Event()
+
+        def call_function(function_name, arguments):
+            if function_name == "search":
+                release.wait(2)
+            return {"function": function_name}
+
+        calls = [("search", "GET", {}), ("get_account", "GET", {})]
+        with patch.object(self.provider, "call_function", side_effect=call_function):
+            responses = self.provider.run_tool_calls(calls, timeout=0.1)
+        release.set()
+
+        self.assertEqual(
+            responses, [{"error": "search timed out"}, {"function": "get_account"}]
+        )
+
+    def test_run_tool_calls_error(self):
+        calls = [("search", "GET", {})]
+        with patch.object(
+            self.provider, "call_function", side_effect=ValueError("boom")
+        ):
+            responses = self.provider.run_tool_calls(calls)
+        self.assertEqual(responses, [{"error": "search failed"}])
+
     def test_generate_extra_knowledge_message_get(self):
         extra_knowledge = "Extra knowledge"
         request_type = "GET"
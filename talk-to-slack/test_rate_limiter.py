@@ -0,0 +1,159 @@
+import time
+import unittest
+from email.utils import formatdate
+
+from rate_limiter import (
+    CircuitBreaker,
+    RateLimiter,
+    RateLimiterError,
+    TokenBucket,
+    endpoint_key,
+    parse_retry_after,
+)
+
+URL = (
+    "https://api.rememberizer.ai/api/v1/discussions/42/contents?integration_type=slack"
+)
+
+
+class TestHelpers(unittest.TestCase):
+
+    def test_endpoint_key(self):
+        self.assertEqual(endpoint_key(URL), "/api/v1/discussions/{}/contents")
+        self.assertEqual(
+            endpoint_key("https://host/api/v1/documents/search/"),
+            "/api/v1/documents/search/",
+        )
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after("3"), 3.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after("soon"))
+        now = time.time()
+        self.assertAlmostEqual(
+            parse_retry_after(formatdate(now + 10, usegmt=True), now=now), 10, delta=1
+        )
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_burst_then_rate(self):
+        bucket = TokenBucket(rate=10, burst=2)
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertAlmostEqual(bucket.reserve(), 0.1, delta=0.01)
+        self.assertAlmostEqual(bucket.reserve(), 0.2, delta=0.01)
+
+    def test_max_wait_does_not_take_token(self):
+        bucket = TokenBucket(rate=1, burst=1)
+        bucket.reserve()
+        self.assertIsNone(bucket.reserve(max_wait=0.5))
+        self.assertAlmostEqual(bucket.reserve(), 1, delta=0.01)
+
+    def test_pause_and_adaptive_rate(self):
+        bucket = TokenBucket(rate=10, burst=5)
+        bucket.pause(2)
+        self.assertGreaterEqual(bucket.reserve(), 2)
+        bucket.throttled()
+        self.assertEqual(bucket.rate, 5)
+        bucket.succeeded()
+        self.assertEqual(bucket.rate, 5.5)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_opens_and_recovers(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+        breaker.record(False)
+        self.assertTrue(breaker.allow())
+        breaker.record(False)
+        self.assertEqual(breaker.state, "open")
+        self.assertFalse(breaker.allow())
+
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record(True)
+        self.assertEqual(breaker.state, "closed")
+
+    def test_failed_trial_reopens(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record(False)
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        breaker.record(False)
+        self.assertEqual(breaker.state, "open")
+
+    def test_lost_trial_expires(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record(False)
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        breaker.release()
+        self.assertTrue(breaker.allow())
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.limiter = RateLimiter(
+            rate=100, burst=10, max_wait=5, max_attempts=3, failure_threshold=2
+        )
+
+    def test_retry_policy(self):
+        self.assertIsNone(self.limiter.complete("token", URL, 0, 200))
+        self.assertIsNone(self.limiter.complete("token", URL, 0, 404))
+        self.assertIsNotNone(self.limiter.complete("token", URL, 0, 503))
+        self.assertIsNotNone(self.limiter.complete("token", URL, 0, None))
+        self.assertIsNone(self.limiter.complete("token", URL, 2, 503))
+
+    def test_retry_after_honored(self):
+        delay = self.limiter.complete("token", URL, 0, 429, "2")
+        self.assertGreaterEqual(delay, 2)
+        self.assertGreaterEqual(self.limiter.acquire("token", URL), 1.9)
+        self.assertIsNone(self.limiter.complete("token", URL, 0, 429, "60"))
+        stats = self.limiter.stats()["endpoints"]["/api/v1/discussions/{}/contents"]
+        self.assertEqual(stats["throttled"], 2)
+        self.assertEqual(stats["retries"], 1)
+
+    def test_buckets_per_token(self):
+        self.limiter.complete("token", URL, 0, 429, "2")
+        self.assertEqual(self.limiter.acquire("other", URL), 0)
+
+    def test_circuit_fails_fast(self):
+        for _ in range(2):
+            self.limiter.complete("token", URL, 0, 500)
+        with self.assertRaises(RateLimiterError) as raised:
+            self.limiter.acquire("other", URL)
+        self.assertGreater(raised.exception.retry_after, 0)
+        self.assertIn(
+            'rate_limiter_circuit_open{endpoint="/api/v1/discussions/{}/contents"} 1',
+            self.limiter.render(),
+        )
+
+    def test_max_wait_releases_trial(self):
+        limiter = RateLimiter(max_wait=1, failure_threshold=1, reset_timeout=0.05)
+        limiter.complete("token", URL, 0, 500)
+        time.sleep(0.06)
+        limiter._bucket("token", "/api/v1/discussions/{}/contents").pause(60)
+        with self.assertRaises(RateLimiterError):
+            limiter.acquire("token", URL)
+        # The rejected call did not keep the half-open trial.
+        self.assertEqual(limiter.acquire("other", URL), 0)
+
+    def test_abandon_releases_trial(self):
+        limiter = RateLimiter(failure_threshold=1, reset_timeout=0.05)
+        limiter.complete("token", URL, 0, 500)
+        time.sleep(0.06)
+        limiter.acquire("token", URL)
+        with self.assertRaises(RateLimiterError):
+            limiter.acquire("token", URL)
+        limiter.abandon(URL)
+        self.assertEqual(limiter.acquire("token", URL), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
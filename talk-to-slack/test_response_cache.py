@@ -0,0 +1,118 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from response_cache import (
+    MemoryBackend,
+    ResponseCache,
+    SQLiteBackend,
+    create_cache,
+    make_key,
+    normalize_params,
+)
+
+
+class TestNormalization(unittest.TestCase):
+
+    def test_normalize_params(self):
+        self.assertEqual(
+            normalize_params({"q": "  hello   world ", "n": 3, "from": None}),
+            {"n": 3, "q": "hello world"},
+        )
+
+    def test_make_key(self):
+        self.assertEqual(
+            make_key("token", "search", {"q": "a  b", "n": 3}),
+            make_key("token", "search", {"n": 3, "q": "a b"}),
+        )
+        self.assertNotEqual(
+            make_key("token", "search", {"q": "a"}),
+            make_key("other", "search", {"q": "a"}),
+        )
+
+
+class BackendTests:
+
+    def test_get_set(self):
+        self.backend.set("key", "value", 60)
+        self.assertEqual(self.backend.get("key"), "value")
+        self.assertIsNone(self.backend.get("missing"))
+
+    def test_expiry(self):
+        with patch("response_cache.time.time", return_value=1000):
+            self.backend.set("key", "value", 10)
+        with patch("response_cache.time.time", return_value=1011):
+            self.assertIsNone(self.backend.get("key"))
+
+    def test_lru_eviction_by_size(self):
+        with patch("response_cache.time.time", return_value=1000):
+            self.backend.set("a", "x" * 40, 60)
+        with patch("response_cache.time.time", return_value=1001):
+            self.backend.set("b", "x" * 40, 60)
+        with patch("response_cache.time.time", return_value=1002):
+            self.backend.get("a")
+        with patch("response_cache.time.time", return_value=1003):
+            self.backend.set("c", "x" * 40, 60)
+        with patch("response_cache.time.time", return_value=1004):
+            self.assertIsNotNone(self.backend.get("a"))
+            self.assertIsNone(self.backend.get("b"))
+            self.assertIsNotNone(self.backend.get("c"))
+        self.assertEqual(self.backend.stats(), {"entries": 2, "bytes": 80})
+
+    def test_oversized_value_skipped(self):
+        self.backend.set("key", "x" * 200, 60)
+        self.assertIsNone(self.backend.get("key"))
+
+
+class TestMemoryBackend(BackendTests, unittest.TestCase):
+
+    def setUp(self):
+        self.backend = MemoryBackend(max_bytes=100)
+
+
+class TestSQLiteBackend(BackendTests, unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "cache.sqlite3")
+        self.backend = SQLiteBackend(self.path, max_bytes=100)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_shared_between_instances(self):
+        self.backend.set("key", "value", 60)
+        self.assertEqual(SQLiteBackend(self.path).get("key"), "value")
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = ResponseCache(MemoryBackend(), ttls={"search": 60})
+
+    def test_round_trip_and_stats(self):
+        self.assertIsNone(self.cache.get("token", "search", {"q": "a"}))
+        self.cache.set("token", "search", {"q": "a"}, {"data": [1]})
+        self.assertEqual(self.cache.get("token", "search", {"q": "a"}), {"data": [1]})
+
+        stats = self.cache.stats()
+        self.assertEqual(stats["backend"], "memory")
+        self.assertEqual(stats["hit_rate"], 0.5)
+        self.assertEqual(
+            stats["endpoints"]["search"], {"hits": 1, "misses": 1, "hit_rate": 0.5}
+        )
+
+    def test_endpoint_without_ttl_not_cached(self):
+        self.cache.set("token", "get_discussion_content", {}, {"data": 1})
+        self.assertIsNone(self.cache.get("token", "get_discussion_content", {}))
+
+    def test_create_cache(self):
+        self.assertIsInstance(create_cache("memory").backend, MemoryBackend)
+        self.assertIsNone(create_cache("none"))
+        with self.assertRaises(Exception):
+            create_cache("unknown")
+
+
+if __name__ == "__main__":
+    unittest.main()
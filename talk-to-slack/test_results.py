@@ -0,0 +1,82 @@
+import unittest
+
+from results import (
+    DiscussionMessage,
+    Document,
+    Passage,
+    SearchMatch,
+    parse_results,
+    render_results,
+)
+
+
+class TestParseResults(unittest.TestCase):
+
+    def test_search(self):
+        results = parse_results(
+            {
+                "data": [
+                    {
+                        "document": {"id": 3, "name": "general", "created_time": "t1"},
+                        "matched_content": "Launch is on Friday.",
+                        "distance": 0.8,
+                    }
+                ]
+            }
+        )
+        self.assertEqual(len(results), 1)
+        self.assertIsInstance(results[0], SearchMatch)
+        self.assertEqual(results[0].document_id, 3)
+        self.assertEqual(results[0].score, 0.8)
+        self.assertEqual(results[0].render(), "- [general | t1] Launch is on Friday.")
+
+    def test_discussion(self):
+        results = parse_results(
+            {
+                "discussion_content": [{"user_name": "ana", "text": "hi", "ts": 1}],
+                "thread_contents": {"1.0": [{"user": "bo", "text": "reply"}]},
+            }
+        )
+        self.assertTrue(all(isinstance(r, DiscussionMessage) for r in results))
+        self.assertEqual(
+            [r.render() for r in results], ["- [ana | 1] hi", "- [bo] reply"]
+        )
+        self.assertEqual(results[1].thread, "1.0")
+
+    def test_listing(self):
+        results = parse_results(
+            {"results": [{"id": 5, "name": "roadmap", "integration_type": "slack"}]}
+        )
+        self.assertIsInstance(results[0], Document)
+        self.assertEqual(results[0].document_id, 5)
+        self.assertEqual(results[0].render(), "- [slack] roadmap")
+
+    def test_document_content(self):
+        results = parse_results({"content": "first\n\nsecond"})
+        self.assertEqual([r.text for r in results], ["first", "second"])
+        self.assertIs(type(results[0]), Passage)
+
+    def test_unknown_shape(self):
+        self.assertIsNone(parse_results({"count": 2}))
+        self.assertIsNone(parse_results("text"))
+
+    def test_slots(self):
+        with self.assertRaises(AttributeError):
+            SearchMatch("text").extra = 1
+
+
+class TestRenderResults(unittest.TestCase):
+
+    def test_render_known_shape(self):
+        self.assertEqual(
+            render_results({"discussion_content": "one\ntwo"}), "- one\n- two"
+        )
+
+    def test_render_unknown_shape_compact_json(self):
+        self.assertEqual(
+            render_results({"count": 2, "ok": True}), '{"count":2,"ok":true}'
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+from router import IntentRouter, evaluate, main
+
+
+class TestIntentRouter(unittest.TestCase):
+
+    def setUp(self):
+        self.router = IntentRouter(confidence=0.6, search_n=3)
+
+    def test_rule_list_channels(self):
+        decision = self.router.route("Please list all my Slack channels")
+        self.assertEqual(decision.tool, "list_channels")
+        self.assertEqual(decision.arguments, {})
+        self.assertEqual(decision.source, "rule+classifier")
+        self.assertLess(decision.confidence, 1.0)
+
+    def test_rule_account(self):
+        decision = self.router.route("What email is on my account?")
+        self.assertEqual(decision.tool, "account")
+
+    def test_lexical_rule_hits_not_routed_as_lookups(self):
+        for message in (
+            "Which channels discussed the outage?",
+            "What did people say about the billing bug across all channels?",
+            "What is the refund policy for my account tier customers?",
+            "Who manages the channels partnership program?",
+        ):
+            decision = self.router.route(message)
+            self.assertIn(decision and decision.tool, (None, "search"), message)
+
+    def test_discussion_deferred_to_llm(self):
+        self.assertIsNone(self.router.route("What happened in #general today?"))
+
+    def test_search(self):
+        decision = self.router.route("How do we deploy the backend service?")
+        self.assertEqual(decision.tool, "search")
+        self.assertEqual(
+            decision.arguments, {"q": "How do we deploy the backend service?", "n": 3}
+        )
+        self.assertEqual(decision.source, "classifier")
+
+    def test_low_confidence_deferred(self):
+        router = IntentRouter(confidence=1.01)
+        self.assertIsNone(router.route("How do we deploy the backend service?"))
+        self.assertEqual(router.stats()["deferred"], 1)
+
+    def test_evaluate(self):
+        report = evaluate(
+            self.router,
+            [
+                {"message": "list channels", "tool": "list_channels"},
+                {
+                    "message": "what happened in #random today",
+                    "tool": "get_discussion_content",
+                },
+                {"message": "my account details", "tool": "search"},
+            ],
+        )
+        self.assertEqual(report["total"], 3)
+        self.assertEqual(report["routed"], 2)
+        self.assertEqual(report["accuracy"], 0.5)
+        self.assertEqual(report["confusion"]["get_discussion_content->llm"], 1)
+
+    def test_replay_set(self):
+        replay = os.path.join(os.path.dirname(__file__), "router_replay.jsonl")
+        output = io.StringIO()
+        with redirect_stdout(output):
+            main([replay])
+        report = json.loads(output.getvalue())
+        self.assertGreaterEqual(report["accuracy"], 0.9)
+
+    def test_main_custom_replay(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False) as replay:
+            replay.write(
+                json.dumps({"message": "list channels", "tool": "list_channels"})
+            )
+        output = io.StringIO()
+        with redirect_stdout(output):
+            main([replay.name])
+        os.unlink(replay.name)
+        self.assertEqual(json.loads(output.getvalue())["accuracy"], 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
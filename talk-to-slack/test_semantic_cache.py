@@ -0,0 +1,130 @@
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+from semantic_cache import HashingEmbedder, SemanticCache
+
+
+class TestHashingEmbedder(unittest.TestCase):
+
+    def setUp(self):
+        self.embedder = HashingEmbedder()
+
+    def test_embed_is_normalized_and_deterministic(self):
+        vector = self.embedder.embed("What did the team decide?")
+        self.assertEqual(vector.dtype, np.float32)
+        self.assertAlmostEqual(float(np.linalg.norm(vector)), 1.0, places=5)
+        np.testing.assert_array_equal(
+            vector, HashingEmbedder().embed("What did the team decide?")
+        )
+
+    def test_paraphrase_closer_than_other_question(self):
+        query = self.embedder.embed("What did the team decide about the release date?")
+        paraphrase = self.embedder.embed("what did the team decide on the release date")
+        other = self.embedder.embed("Who owns the billing service?")
+        self.assertGreater(float(query @ paraphrase), float(query @ other))
+
+    def test_empty_text(self):
+        self.assertFalse(self.embedder.embed("").any())
+
+
+class TestSemanticCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = SemanticCache(threshold=0.9, max_entries=2, max_users=2, ttl=60)
+        self.cache.set(
+            "token",
+            {"q": "What did the team decide about the release date?", "n": 5},
+            {"data": 1},
+        )
+
+    def test_paraphrase_hit(self):
+        data = self.cache.get(
+            "token", {"q": "what did the team decide on the release date", "n": 3}
+        )
+        self.assertEqual(data, {"data": 1})
+        self.assertEqual(self.cache.stats()["hits"], 1)
+
+    def test_unrelated_miss(self):
+        self.assertIsNone(
+            self.cache.get("token", {"q": "Who owns the billing service?"})
+        )
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+    def test_larger_n_miss(self):
+        self.assertIsNone(
+            self.cache.get(
+                "token",
+                {"q": "What did the team decide about the release date?", "n": 10},
+            )
+        )
+
+    def test_per_user_isolation(self):
+        self.assertIsNone(
+            self.cache.get(
+                "other", {"q": "What did the team decide about the release date?"}
+            )
+        )
+
+    def test_expiry(self):
+        with patch("semantic_cache.time.time", return_value=10**10):
+            self.assertIsNone(
+                self.cache.get(
+                    "token", {"q": "What did the team decide about the release date?"}
+                )
+            )
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+    def test_entry_eviction(self):
+        self.cache.set("token", {"q": "deploy failures last week"}, {"data": 2})
+        self.cache.set("token", {"q": "who is on call tonight"}, {"data": 3})
+        self.assertEqual(self.cache.stats()["entries"], 2)
+        self.assertIsNone(
+            self.cache.get(
+                "token", {"q": "What did the team decide about the release date?"}
+            )
+        )
+        self.assertEqual(
+            self.cache.get("token", {"q": "who is on call tonight"}), {"data": 3}
+        )
+
+    def test_user_eviction(self):
+        self.cache.set("user-2", {"q": "a question"}, {"data": 2})
+        self.cache.set("user-3", {"q": "a question"}, {"data": 3})
+        self.assertEqual(self.cache.stats()["users"], 2)
+        self.assertIsNone(
+            self.cache.get(
+                "token", {"q": "What did the team decide about the release date?"}
+            )
+        )
+
+    def test_result_is_a_copy(self):
+        query = {"q": "What did the team decide about the release date?"}
+        self.cache.get("token", query)["data"] = "changed"
+        self.assertEqual(self.cache.get("token", query), {"data": 1})
+
+    def test_stored_value_is_a_copy(self):
+        query = {"q": "Who owns the billing service?"}
+        data = {"matched_chunks": [{"text": "Ana"}]}
+        self.cache.set("token", query, data)
+        data["matched_chunks"].append({"text": "Ben"})
+        self.assertEqual(
+            self.cache.get("token", query), {"matched_chunks": [{"text": "Ana"}]}
+        )
+
+    def test_matrix_grows_lazily(self):
+        cache = SemanticCache(max_entries=100)
+        cache.set("token", {"q": "first question"}, {"data": 0})
+        index = next(iter(cache._users.values()))
+        self.assertEqual(index.vectors.shape[0], 8)
+        for number in range(30):
+            cache.set(
+                "token", {"q": f"question number {number} about topic {number}"}, {}
+            )
+        self.assertEqual(index.size, 31)
+        self.assertEqual(index.vectors.shape[0], 32)
+        self.assertEqual(cache.get("token", {"q": "first question"}), {"data": 0})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import unittest
+
+from flask import Flask, session
+from redis_store import RedisBackend, RedisClient, StandInRedis
+from response_cache import MemoryBackend
+from session_store import ServerSideSessionInterface
+
+
+def _app(backend):
+    app = Flask(__name__)
+    app.secret_key = "test"
+    app.session_interface = ServerSideSessionInterface(backend)
+
+    @app.route("/set/<value>")
+    def set_value(value):
+        session["value"] = value
+        return "ok"
+
+    @app.route("/get")
+    def get_value():
+        return session.get("value", "")
+
+    @app.route("/clear")
+    def clear():
+        session.clear()
+        return "ok"
+
+    return app
+
+
+class TestServerSideSessions(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = MemoryBackend()
+        self.app = _app(self.backend)
+        self.client = self.app.test_client()
+
+    def sid(self):
+        cookie = self.client.get_cookie("session")
+        return cookie.value if cookie else None
+
+    def test_only_id_in_cookie(self):
+        self.client.get("/set/secret-token")
+        self.assertNotIn("secret-token", self.sid())
+        self.assertIn("secret-token", self.backend.get(self.sid()))
+        self.assertEqual(self.client.get("/get").text, "secret-token")
+
+    def test_unmodified_session_not_written(self):
+        self.client.get("/set/a")
+        self.client.get("/get")
+        self.assertEqual(self.app.session_interface.stats()["saved"], 1)
+
+    def test_clear_revokes(self):
+        self.client.get("/set/a")
+        sid = self.sid()
+        self.client.get("/clear")
+        self.assertIsNone(self.backend.get(sid))
+        self.assertIsNone(self.sid())
+
+    def test_unknown_id_not_adopted(self):
+        self.client.set_cookie("session", "planted")
+        self.client.get("/set/a")
+        self.assertNotEqual(self.sid(), "planted")
+        self.assertIsNone(self.backend.get("planted"))
+
+    def test_shared_between_apps(self):
+        self.client.get("/set/a")
+        other = _app(self.backend).test_client()
+        other.set_cookie("session", self.sid())
+        self.assertEqual(other.get("/get").text, "a")
+
+
+class TestRedisBackend(unittest.TestCase):
+
+    def test_round_trip_and_expiry(self):
+        with StandInRedis() as server:
+            backend = RedisBackend(server.url, prefix="session:")
+            backend.set("sid", '{"value": "a"}', 1)
+            self.assertEqual(backend.get("sid"), '{"value": "a"}')
+            self.assertEqual(backend.stats(), {"keys": 1})
+            backend.delete("sid")
+            self.assertIsNone(backend.get("sid"))
+
+            backend.set("sid", "b", 1)
+            time.sleep(1.1)
+            self.assertIsNone(backend.get("sid"))
+
+    def test_url_credentials(self):
+        with StandInRedis() as server:
+            url = server.url.replace("redis://", "redis://default:p%40ss@")
+            client = RedisClient(url)
+            self.assertEqual(client.execute("PING"), "PONG")
+            self.assertEqual(server.server.store.auth, (b"default", b"p@ss"))
+
+        with StandInRedis() as server:
+            url = server.url.replace("redis://", "redis://:secret@")
+            RedisClient(url).execute("PING")
+            self.assertEqual(server.server.store.auth, (b"secret",))
+
+    @unittest.skipUnless(shutil.which("openssl"), "needs the openssl command")
+    def test_rediss_over_tls(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cert = os.path.join(directory, "cert.pem")
+            key = os.path.join(directory, "key.pem")
+            subprocess.run(
+                ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes"]
+                + ["-keyout", key, "-out", cert, "-days", "1"]
+                + ["-subj", "/CN=127.0.0.1"],
+                check=True,
+                capture_output=True,
+            )
+            with StandInRedis(tls=(cert, key)) as server:
+                self.assertTrue(server.url.startswith("rediss://"))
+                # A self-signed certificate fails verification unless it is off.
+                with self.assertRaises(OSError):
+                    RedisClient(server.url).execute("PING")
+                backend = RedisBackend(
+                    server.url,
+                    prefix="session:",
+                    client=RedisClient(server.url, tls_verify=False),
+                )
+                backend.set("sid", "a", 60)
+                self.assertEqual(backend.get("sid"), "a")
+
+    def test_clear_only_prefix(self):
+        with StandInRedis() as server:
+            sessions = RedisBackend(server.url, prefix="session:")
+            other = RedisBackend(server.url, prefix="other:")
+            sessions.set("a", "1", 60)
+            other.set("a", "2", 60)
+            sessions.clear()
+            self.assertIsNone(sessions.get("a"))
+            self.assertEqual(other.get("a"), "2")
+
+    def test_sessions_on_redis(self):
+        with StandInRedis() as server:
+            client = _app(RedisBackend(server.url, prefix="session:")).test_client()
+            client.get("/set/a")
+            self.assertEqual(client.get("/get").text, "a")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from single_flight import SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def setUp(self):
+        self.flight = SingleFlight()
+        self.calls = 0
+
+    def slow_fetch(self):
+        self.calls += 1
+        time.sleep(0.2)
+        return {"data": ["result"]}, True
+
+    def run_threads(self, target, count=5):
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(target()))
+            for _ in range(count)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_calls_share_one_fetch(self):
+        results = self.run_threads(
+            lambda: self.flight.do("token", "search", {"q": "x"}, self.slow_fetch)
+        )
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [({"data": ["result"]}, True)] * 5)
+        self.assertIsNot(results[0][0], results[1][0])
+        stats = self.flight.stats()
+        self.assertEqual((stats["calls"], stats["saved"]), (1, 4))
+        self.assertEqual(stats["endpoints"]["search"]["saved"], 4)
+        self.assertEqual(stats["in_flight"], 0)
+
+    def test_different_keys_not_shared(self):
+        self.run_threads(
+            lambda: self.flight.do(
+                "token", "search", {"q": threading.get_ident()}, self.slow_fetch
+            ),
+            count=3,
+        )
+        self.assertEqual(self.calls, 3)
+
+    def test_sequential_calls_not_shared(self):
+        for _ in range(2):
+            self.flight.do("token", "search", {"q": "x"}, lambda: ({}, True))
+        self.assertEqual(self.flight.stats()["calls"], 2)
+
+    def test_exception_shared(self):
+        def failing():
+            time.sleep(0.2)
+            raise ConnectionError("down")
+
+        def call():
+            try:
+                return self.flight.do("token", "search", {}, failing)
+            except ConnectionError as ex:
+                return str(ex)
+
+        self.assertEqual(self.run_threads(call, count=3), ["down"] * 3)
+
+    def test_async_tasks_share_one_fetch(self):
+        async def fetch():
+            self.calls += 1
+            await asyncio.sleep(0.1)
+            return {"data": []}, True
+
+        async def main():
+            return await asyncio.gather(
+                *(self.flight.do_async("token", "account", {}, fetch) for _ in range(4))
+            )
+
+        self.assertEqual(asyncio.run(main()), [({"data": []}, True)] * 4)
+        self.assertEqual(self.calls, 1)
+
+    def test_async_task_joins_thread_call(self):
+        leader = threading.Thread(
+            target=self.flight.do, args=("token", "search", {}, self.slow_fetch)
+        )
+        leader.start()
+        time.sleep(0.05)
+
+        async def follow():
+            return await self.flight.do_async("token", "search", {}, None)
+
+        self.assertEqual(asyncio.run(follow()), ({"data": ["result"]}, True))
+        leader.join()
+        self.assertEqual(self.flight.stats()["saved"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,219 @@
+import asyncio
+import threading
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import http_pool
+from sources import (
+    CommonKnowledgeSource,
+    LocalIndexSource,
+    RememberizerSource,
+    SourceRegistry,
+    create_source_registry,
+    within_budget,
+)
+
+
+def match(document_id, name, integration_type, content, distance):
+    return {
+        "document": {
+            "id": document_id,
+            "name": name,
+            "integration": {"integration_type": integration_type},
+        },
+        "matched_content": content,
+        "distance": distance,
+    }
+
+
+SEARCH = {
+    "data": [
+        match(1, "general", "slack", "launch is on Monday", 0.9),
+        match(2, "Q3 plan", "google_drive", "launch plan for Q3", 0.7),
+        match(3, "Handbook", "common_knowledge", "launches need sign-off", 0.8),
+    ]
+}
+
+
+class SlowSource:
+    name = "slow"
+    timeout = 0.05
+    budget = 1000
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def fetch(self, provider, query, n):
+        self.release.wait(5)
+        return [match(9, "late", "slack", "too late", 1.0)]
+
+    async def fetch_async(self, provider, query, n):
+        await asyncio.sleep(5)
+
+
+class TestSources(unittest.TestCase):
+
+    def setUp(self):
+        self.provider = MagicMock()
+        self.provider.search_rememberizer.return_value = (SEARCH, True)
+        self.provider.get_common_knowledge.return_value = (
+            [{"name": "Company handbook", "document_ids": [3]}],
+            True,
+        )
+        self.provider.scope.return_value = "account:1"
+        self.provider.local_index.search.return_value = [
+            {"document": {"name": "notes"}, "matched_content": "local", "distance": 0.6}
+        ]
+
+    def test_rememberizer_source_filters_integration_type(self):
+        items = RememberizerSource("google_drive").fetch(self.provider, "launch", 5)
+        self.assertEqual(
+            [item["document"]["name"] for item in items],
+            ["rememberizer:google_drive / Q3 plan"],
+        )
+        self.provider.search_rememberizer.assert_called_once_with(
+            {"q": "launch", "n": 5}
+        )
+        self.assertEqual(len(RememberizerSource().fetch(self.provider, "launch", 5)), 3)
+
+    def test_common_knowledge_source(self):
+        items = CommonKnowledgeSource().fetch(self.provider, "launch", 5)
+        self.assertEqual(
+            [item["document"]["name"] for item in items],
+            ["Company handbook / Handbook"],
+        )
+
+    def test_local_index_source(self):
+        items = LocalIndexSource().fetch(self.provider, "launch", 5)
+        self.provider.local_index.search.assert_called_once_with(
+            "account:1", "launch", 5
+        )
+        self.assertEqual(items[0]["document"]["name"], "local_index / notes")
+        self.provider.local_index = None
+        self.assertEqual(LocalIndexSource().fetch(self.provider, "launch", 5), [])
+
+    def test_within_budget(self):
+        items = [
+            {"matched_content": "short", "distance": 0.5},
+            {"matched_content": "word " * 50, "distance": 0.9},
+        ]
+        self.assertEqual(within_budget(items, 10), [items[0]])
+        self.assertEqual(within_budget(items, 1000), [items[1], items[0]])
+
+    def test_search_merges_by_score(self):
+        registry = SourceRegistry(
+            [
+                RememberizerSource("slack"),
+                RememberizerSource("google_drive"),
+                CommonKnowledgeSource(),
+            ]
+        )
+        data, success = registry.search(self.provider, {"q": "launch", "n": 5})
+        self.assertTrue(success)
+        self.assertFalse(data["partial"])
+        self.assertEqual(
+            [item["matched_content"] for item in data["data"]],
+            ["launch is on Monday", "launches need sign-off", "launch plan for Q3"],
+        )
+        self.assertEqual(data["sources"]["common_knowledge"]["results"], 1)
+        self.assertEqual(registry.stats()["rememberizer:slack"]["calls"], 1)
+
+    def test_search_drops_duplicates(self):
+        registry = SourceRegistry([RememberizerSource(), RememberizerSource("slack")])
+        data, _ = registry.search(self.provider, {"q": "launch"})
+        self.assertEqual(len(data["data"]), 3)
+
+    def test_slow_source_returns_partial(self):
+        slow = SlowSource()
+        registry = SourceRegistry([slow, RememberizerSource("slack")])
+        try:
+            data, success = registry.search(self.provider, {"q": "launch", "n": 5})
+        finally:
+            slow.release.set()
+        self.assertTrue(success)
+        self.assertTrue(data["partial"])
+        self.assertEqual(data["sources"]["slow"], {"status": "timeout"})
+        self.assertEqual(len(data["data"]), 1)
+        self.assertEqual(registry.stats()["slow"]["timeouts"], 1)
+
+    @patch("sources._source_slots", threading.BoundedSemaphore(1))
+    def test_saturated_sources_fail_fast(self):
+        slow = SlowSource()
+        registry = SourceRegistry([slow, RememberizerSource("slack")])
+        try:
+            data, success = registry.search(self.provider, {"q": "launch", "n": 5})
+            # The abandoned fetch still holds the only slot.
+            busy, _ = registry.search(self.provider, {"q": "launch", "n": 5})
+        finally:
+            slow.release.set()
+        self.assertFalse(success)
+        self.assertEqual(data["sources"]["rememberizer:slack"], {"status": "busy"})
+        self.assertEqual(busy["sources"]["slow"], {"status": "busy"})
+        self.assertEqual(registry.stats()["rememberizer:slack"]["busy"], 2)
+
+    def test_fetch_runs_under_source_deadline(self):
+        left = []
+
+        class DeadlineSource(SlowSource):
+            name = "deadline"
+
+            def fetch(self, provider, query, n):
+                left.append(http_pool.time_left())
+                return []
+
+        SourceRegistry([DeadlineSource()]).search(self.provider, {"q": "launch"})
+        self.assertTrue(0 < left[0] <= DeadlineSource.timeout)
+        self.assertIsNone(http_pool.time_left())
+
+    def test_failed_sources(self):
+        self.provider.search_rememberizer.return_value = ({"error": "down"}, False)
+        registry = SourceRegistry([RememberizerSource()])
+        data, success = registry.search(self.provider, {"q": "launch"})
+        self.assertFalse(success)
+        self.assertEqual(data["sources"]["rememberizer"], {"status": "error"})
+        self.assertEqual(registry.stats()["rememberizer"]["errors"], 1)
+
+    def test_search_async(self):
+        provider = MagicMock()
+        provider.search_rememberizer = AsyncMock(return_value=(SEARCH, True))
+        slow = SlowSource()
+        registry = SourceRegistry([RememberizerSource("google_drive"), slow])
+        data, success = asyncio.run(
+            registry.search_async(provider, {"q": "launch", "n": 5})
+        )
+        self.assertTrue(success)
+        self.assertTrue(data["partial"])
+        self.assertEqual(
+            [item["matched_content"] for item in data["data"]], ["launch plan for Q3"]
+        )
+
+    def test_search_async_cancelled_source(self):
+        class CancelledSource(SlowSource):
+            name = "cancelled"
+
+            async def fetch_async(self, provider, query, n):
+                raise asyncio.CancelledError()
+
+        provider = MagicMock()
+        provider.search_rememberizer = AsyncMock(return_value=(SEARCH, True))
+        registry = SourceRegistry([CancelledSource(), RememberizerSource("slack")])
+        data, success = asyncio.run(registry.search_async(provider, {"q": "launch"}))
+        self.assertTrue(success)
+        self.assertEqual(data["sources"]["cancelled"], {"status": "error"})
+        self.assertEqual(len(data["data"]), 1)
+
+    def test_create_source_registry(self):
+        self.assertIsNone(create_source_registry(""))
+        registry = create_source_registry(
+            "rememberizer:slack, common_knowledge,local_index"
+        )
+        self.assertEqual(
+            [source.name for source in registry.sources],
+            ["rememberizer:slack", "common_knowledge", "local_index"],
+        )
+        with self.assertRaises(Exception):
+            create_source_registry("wiki")
+
+
+if __name__ == "__main__":
+    unittest.main()
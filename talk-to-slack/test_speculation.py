@@ -0,0 +1,85 @@
+import asyncio
+import threading
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+
+from speculation import SpeculativeSearch, similarity
+
+
+class TestSimilarity(unittest.TestCase):
+
+    def test_similarity(self):
+        self.assertEqual(similarity("When is the launch?", "when is the LAUNCH"), 1.0)
+        self.assertAlmostEqual(similarity("launch date", "launch plan"), 1 / 3)
+        self.assertEqual(similarity("", "launch"), 0.0)
+
+
+class TestSpeculation(unittest.TestCase):
+
+    def setUp(self):
+        self.speculator = SpeculativeSearch(n=5, min_similarity=0.5, timeout=5)
+        self.provider = MagicMock()
+        self.provider.call_function.return_value = {"data": "launch"}
+
+    def test_match(self):
+        speculation = self.speculator.start(self.provider, "when is the launch")
+        calls = [
+            ("get_account", "GET", {}),
+            ("search", "GET", {"q": "launch", "n": 3}),
+            ("search", "GET", {"q": "when is the launch", "n": 3}),
+        ]
+        self.assertEqual(speculation.match(calls), 2)
+        self.assertIsNone(
+            speculation.match([("search", "GET", {"q": "when is the launch", "n": 10})])
+        )
+        speculation.discard()
+
+    def test_claim_hit(self):
+        speculation = self.speculator.start(self.provider, "when is the launch")
+        claimed = speculation.claim([("search", "GET", {"q": "When is the launch?"})])
+
+        self.assertEqual(claimed, (0, {"data": "launch"}))
+        self.provider.call_function.assert_called_once_with(
+            "search", {"q": "when is the launch", "n": 5}
+        )
+        self.assertEqual(speculation.outcome, "hits")
+        self.assertGreaterEqual(speculation.saved, 0)
+        stats = self.speculator.stats()
+        self.assertEqual((stats["started"], stats["hits"]), (1, 1))
+        self.assertEqual(stats["hit_rate"], 1.0)
+
+    def test_claim_miss_discards(self):
+        release = threading.Event()
+        self.provider.call_function.side_effect = lambda *args: release.wait(2)
+        speculation = self.speculator.start(self.provider, "when is the launch")
+
+        self.assertIsNone(speculation.claim([("get_account", "GET", {})]))
+        release.set()
+        self.assertEqual(speculation.outcome, "misses")
+        speculation.discard()
+        self.assertEqual(self.speculator.stats()["misses"], 1)
+
+    def test_failed_search_falls_back(self):
+        self.provider.call_function.side_effect = Exception("down")
+        speculation = self.speculator.start(self.provider, "when is the launch")
+
+        self.assertIsNone(speculation.claim([("search", "GET", {"q": "the launch"})]))
+        self.assertEqual(self.speculator.stats()["failures"], 1)
+
+    def test_claim_async(self):
+        self.provider.call_function = AsyncMock(return_value={"data": "launch"})
+
+        async def run():
+            speculation = self.speculator.start_async(
+                self.provider, "when is the launch"
+            )
+            return await speculation.claim_async(
+                [("search", "GET", {"q": "when is the launch"})]
+            )
+
+        self.assertEqual(asyncio.run(run()), (0, {"data": "launch"}))
+        self.assertEqual(self.speculator.stats()["hits"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,206 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from redis_store import StandInRedis
+from token_manager import (
+    MemoryTokenStore,
+    RedisTokenStore,
+    SQLiteTokenStore,
+    TokenManager,
+    expires_at,
+)
+
+
+def _token_response(access_token, refresh_token="rotated", expires_in=3600):
+    response = MagicMock()
+    response.status_code = 200
+    response.json.return_value = {
+        "access_token": access_token,
+        "refresh_token": refresh_token,
+        "expires_in": expires_in,
+    }
+    return response
+
+
+class TestTokenManager(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = SQLiteTokenStore(os.path.join(self.directory.name, "tokens.db"))
+        self.manager = TokenManager(self.store, token_url="http://token", margin=60)
+        patcher = patch("token_manager.http_pool.get_session")
+        self.post = patcher.start().return_value.post
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.directory.cleanup)
+
+    def login(self, expires_in):
+        return self.manager.save(
+            {
+                "access_token": "old",
+                "refresh_token": "refresh",
+                "expires_in": expires_in,
+            }
+        )
+
+    def test_expires_at(self):
+        self.assertEqual(expires_at({"expires_in": 60}, now=100), 160)
+        self.assertIsNone(expires_at({}))
+
+    def test_valid_token_not_refreshed(self):
+        token_id = self.login(3600)
+        self.assertEqual(self.manager.access_token(token_id), "old")
+        self.post.assert_not_called()
+
+    def test_unknown_login(self):
+        self.assertIsNone(self.manager.access_token("missing"))
+
+    def test_stored_access_token_not_refreshed(self):
+        token_id = self.login(-1)
+        self.assertEqual(self.manager.stored_access_token(token_id), "old")
+        self.assertIsNone(self.manager.stored_access_token("missing"))
+        self.post.assert_not_called()
+
+    def test_refreshed_before_expiry(self):
+        token_id = self.login(30)
+        self.post.return_value = _token_response("new")
+        self.assertEqual(self.manager.access_token(token_id), "new")
+        self.assertEqual(self.post.call_args.kwargs["data"]["refresh_token"], "refresh")
+        self.assertEqual(self.store.get(token_id)["refresh_token"], "rotated")
+        self.assertEqual(self.manager.access_token(token_id), "new")
+        self.assertEqual(self.post.call_count, 1)
+        self.assertEqual(self.manager.stats()["refreshes"], 1)
+
+    def test_concurrent_refreshes_collapse(self):
+        token_id = self.login(-1)
+
+        def slow_post(*args, **kwargs):
+            time.sleep(0.2)
+            return _token_response("new")
+
+        self.post.side_effect = slow_post
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(self.manager.access_token(token_id))
+            )
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ["new"] * 5)
+        self.assertEqual(self.post.call_count, 1)
+
+    def test_other_worker_refresh_shared(self):
+        token_id = self.login(30)
+        other = TokenManager(self.store, token_url="http://token", margin=60)
+        # Another worker holds the lease: the still-valid token keeps being used.
+        self.assertTrue(self.store.claim(token_id, time.time(), 60, 15))
+        self.assertEqual(other.access_token(token_id), "old")
+        self.store.put(token_id, "new", "rotated", time.time() + 3600)
+        self.assertEqual(other.access_token(token_id), "new")
+        self.post.assert_not_called()
+
+    def test_failed_refresh_keeps_valid_token(self):
+        token_id = self.login(30)
+        self.post.return_value.status_code = 400
+        self.assertEqual(self.manager.access_token(token_id), "old")
+        self.assertIsNone(self.store.get(token_id)["refresh_lease"])
+        self.assertEqual(self.manager.stats()["refresh_failures"], 1)
+
+    def test_failed_refresh_of_expired_token(self):
+        token_id = self.login(-1)
+        self.post.side_effect = ConnectionError("down")
+        self.assertIsNone(self.manager.access_token(token_id))
+
+    def test_memory_store_lease(self):
+        store = MemoryTokenStore()
+        store.put("id", "old", "refresh", time.time() + 30)
+        self.assertFalse(store.claim("id", time.time(), 10, 15))
+        self.assertTrue(store.claim("id", time.time(), 60, 15))
+        self.assertFalse(store.claim("id", time.time(), 60, 15))
+        store.release("id")
+        self.assertTrue(store.claim("id", time.time(), 60, 15))
+
+
+class TestRedisTokenStore(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandInRedis().__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+        self.store = RedisTokenStore(self.server.url)
+        # A second dyno: its own connection to the same server.
+        self.other = RedisTokenStore(self.server.url)
+
+    def test_round_trip(self):
+        self.store.put("id", "old", "refresh", 1000.0)
+        self.assertEqual(
+            self.other.get("id"),
+            {
+                "access_token": "old",
+                "refresh_token": "refresh",
+                "expires_at": 1000.0,
+                "refresh_lease": None,
+            },
+        )
+        self.assertEqual(self.store.stats(), {"tokens": 1})
+        self.other.delete("id")
+        self.assertIsNone(self.store.get("id"))
+
+    def test_lease_shared_across_dynos(self):
+        self.store.put("id", "old", "refresh", time.time() + 30)
+        self.assertFalse(self.store.claim("id", time.time(), 10, 15))
+        self.assertTrue(self.store.claim("id", time.time(), 60, 15))
+        self.assertFalse(self.other.claim("id", time.time(), 60, 15))
+        self.assertGreater(self.other.get("id")["refresh_lease"], time.time())
+        self.store.release("id")
+        self.assertTrue(self.other.claim("id", time.time(), 60, 15))
+        # Storing the refreshed token drops the lease.
+        self.other.put("id", "new", "rotated", time.time() + 30)
+        self.assertIsNone(self.store.get("id")["refresh_lease"])
+
+    def test_lease_runs_out(self):
+        self.store.put("id", "old", "refresh", time.time() + 30)
+        self.assertTrue(self.store.claim("id", time.time(), 60, 0.1))
+        time.sleep(0.2)
+        self.assertTrue(self.other.claim("id", time.time(), 60, 15))
+
+    @patch("token_manager.http_pool.get_session")
+    def test_concurrent_refreshes_across_dynos(self, get_session):
+        post = get_session.return_value.post
+
+        def slow_post(*args, **kwargs):
+            time.sleep(0.1)
+            return _token_response("new")
+
+        post.side_effect = slow_post
+        token_id = TokenManager(self.store).save(
+            {"access_token": "old", "refresh_token": "refresh", "expires_in": -1}
+        )
+        managers = [
+            TokenManager(store, margin=60) for store in (self.store, self.other)
+        ]
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda manager=manager: results.append(
+                    manager.access_token(token_id)
+                )
+            )
+            for manager in managers
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ["new", "new"])
+        self.assertEqual(post.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
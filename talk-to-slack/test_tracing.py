@@ -0,0 +1,144 @@
+import contextvars
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+from tracing import StageMetrics, Tracer, UsageMeter, cached_tokens, to_otlp
+
+
+class _Exporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+
+class TestTracer(unittest.TestCase):
+
+    def setUp(self):
+        self.exporter = _Exporter()
+        self.tracer = Tracer(exporter=self.exporter)
+
+    def test_nested_spans(self):
+        with self.tracer.span("ask") as root:
+            with self.tracer.span("tool_choice", model="gpt-4o") as child:
+                child.set_usage(MagicMock(prompt_tokens=12, completion_tokens=3))
+        inner, outer = self.exporter.spans
+        self.assertIs(outer, root)
+        self.assertEqual(inner.trace_id, root.trace_id)
+        self.assertEqual(inner.parent_id, root.span_id)
+        self.assertIsNone(root.parent_id)
+        self.assertEqual(inner.attributes["prompt_tokens"], 12)
+        self.assertEqual([name for name, _ in root.stages], ["tool_choice"])
+        self.assertGreaterEqual(root.duration, inner.duration)
+
+    def test_error_recorded(self):
+        with self.assertRaises(ValueError):
+            with self.tracer.span("call_api"):
+                raise ValueError("boom")
+        self.assertEqual(self.exporter.spans[0].error, "ValueError: boom")
+        self.assertIn(
+            'ask_stage_errors_total{stage="call_api"} 1', self.tracer.metrics.render()
+        )
+
+    def test_context_propagates_to_threads(self):
+        def work():
+            with self.tracer.span("tool.search"):
+                pass
+
+        with self.tracer.span("handle") as root:
+            thread = threading.Thread(
+                target=contextvars.copy_context().run, args=(work,)
+            )
+            thread.start()
+            thread.join()
+        self.assertEqual(self.exporter.spans[0].parent_id, root.span_id)
+
+
+class TestUsageMeter(unittest.TestCase):
+
+    def test_cached_tokens(self):
+        usage = MagicMock(prompt_tokens_details={"cached_tokens": 1024})
+        self.assertEqual(cached_tokens(usage), 1024)
+        usage = MagicMock(prompt_tokens_details=MagicMock(cached_tokens=256))
+        self.assertEqual(cached_tokens(usage), 256)
+        self.assertIsNone(cached_tokens(MagicMock(prompt_tokens_details=None)))
+
+    def test_record(self):
+        meter = UsageMeter()
+        meter.record(
+            "tool_choice",
+            MagicMock(
+                prompt_tokens=2000,
+                completion_tokens=20,
+                prompt_tokens_details={"cached_tokens": 1536},
+            ),
+        )
+        meter.record(
+            "tool_choice",
+            MagicMock(
+                prompt_tokens=2000, completion_tokens=20, prompt_tokens_details=None
+            ),
+        )
+        meter.record("answer_completion", MagicMock(prompt_tokens=None))
+        stats = meter.stats()
+        self.assertEqual(list(stats), ["tool_choice"])
+        self.assertEqual(stats["tool_choice"]["requests"], 2)
+        self.assertEqual(stats["tool_choice"]["cache_hits"], 1)
+        self.assertAlmostEqual(stats["tool_choice"]["cached_rate"], 1536 / 4000)
+
+    def test_span_records_cached_tokens(self):
+        exporter = _Exporter()
+        with Tracer(exporter=exporter).span("answer_completion") as span:
+            span.set_usage(
+                MagicMock(
+                    prompt_tokens=1200,
+                    completion_tokens=10,
+                    prompt_tokens_details={"cached_tokens": 1024},
+                )
+            )
+        self.assertEqual(exporter.spans[0].attributes["cached_tokens"], 1024)
+
+
+class TestExport(unittest.TestCase):
+
+    def test_prometheus_histogram(self):
+        tracer = Tracer(metrics=StageMetrics(buckets=(0.1, 1)))
+        with tracer.span("parse_response") as span:
+            span.set("payload_bytes", 2048)
+        text = tracer.metrics.render()
+        self.assertIn(
+            'ask_stage_duration_seconds_bucket{stage="parse_response",le="0.1"} 1',
+            text,
+        )
+        self.assertIn(
+            'ask_stage_duration_seconds_count{stage="parse_response"} 1', text
+        )
+        self.assertIn(
+            'ask_stage_payload_bytes_total{stage="parse_response"} 2048', text
+        )
+
+    def test_otlp_json(self):
+        exporter = _Exporter()
+        tracer = Tracer(exporter=exporter)
+        with tracer.span("ask"):
+            with tracer.span("call_api", status_code=200):
+                pass
+        body = to_otlp(exporter.spans, service_name="test")
+        resource = body["resourceSpans"][0]
+        self.assertEqual(
+            resource["resource"]["attributes"][0]["value"], {"stringValue": "test"}
+        )
+        child, root = resource["scopeSpans"][0]["spans"]
+        self.assertEqual(child["parentSpanId"], root["spanId"])
+        self.assertNotIn("parentSpanId", root)
+        self.assertEqual(len(root["traceId"]), 32)
+        self.assertEqual(
+            child["attributes"], [{"key": "status_code", "value": {"intValue": "200"}}]
+        )
+        self.assertEqual(child["status"], {"code": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,419 @@
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+import http_pool
+from constants import REMEMBERIZER_TOKEN_ENDPOINT
+from redis_store import REDIS_URL, RedisBackend
+from single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+TOKEN_STORE_BACKEND = os.environ.get("TOKEN_STORE_BACKEND", "none")
+TOKEN_STORE_PATH = os.environ.get("TOKEN_STORE_PATH", "token_store.sqlite3")
+# Refresh access tokens this many seconds before they expire.
+TOKEN_REFRESH_MARGIN = float(os.environ.get("TOKEN_REFRESH_MARGIN", "300"))
+# How long one worker may hold a refresh before another may take it over.
+TOKEN_REFRESH_LEASE = float(os.environ.get("TOKEN_REFRESH_LEASE", "15"))
+# Drop logins whose tokens have not been refreshed for this many seconds.
+TOKEN_STORE_TTL = float(os.environ.get("TOKEN_STORE_TTL", str(30 * 24 * 3600)))
+REMEMBERIZER_CLIENT_ID = os.environ.get("REMEMBERIZER_CLIENT_ID")
+REMEMBERIZER_CLIENT_SECRET = os.environ.get("REMEMBERIZER_CLIENT_SECRET")
+
+
+def expires_at(tokens, now=None):
+    """
+    Returns: the epoch expiry of a token endpoint response, or None if it has none
+    """
+    expires_in = tokens.get("expires_in")
+    if expires_in is None:
+        return None
+    return (now if now is not None else time.time()) + float(expires_in)
+
+
+def _due(record, now, margin):
+    return (
+        record["refresh_token"] is not None
+        and record["expires_at"] is not None
+        and record["expires_at"] - margin <= now
+    )
+
+
+class MemoryTokenStore:
+    """
+    In-process token store, for a single worker.
+    """
+
+    name = "memory"
+
+    def __init__(self):
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def get(self, token_id):
+        with self._lock:
+            record = self._tokens.get(token_id)
+            return dict(record) if record is not None else None
+
+    def put(self, token_id, access_token, refresh_token, expires_at):
+        now = time.time()
+        with self._lock:
+            self._tokens[token_id] = {
+                "access_token": access_token,
+                "refresh_token": refresh_token,
+                "expires_at": expires_at,
+                "refresh_lease": None,
+                "updated_at": now,
+            }
+            for stale in [
+                key
+                for key, record in self._tokens.items()
+                if record["updated_at"] < now - TOKEN_STORE_TTL
+            ]:
+                del self._tokens[stale]
+
+    def delete(self, token_id):
+        with self._lock:
+            self._tokens.pop(token_id, None)
+
+    def claim(self, token_id, now, margin, lease):
+        """
+        Take the refresh lease if the token is due and nobody else holds it.
+        Returns: True if the caller must refresh
+        """
+        with self._lock:
+            record = self._tokens.get(token_id)
+            if record is None or not _due(record, now, margin):
+                return False
+            if record["refresh_lease"] is not None and record["refresh_lease"] > now:
+                return False
+            record["refresh_lease"] = now + lease
+            return True
+
+    def release(self, token_id):
+        with self._lock:
+            record = self._tokens.get(token_id)
+            if record is not None:
+                record["refresh_lease"] = None
+
+    def stats(self):
+        with self._lock:
+            return {"tokens": len(self._tokens)}
+
+
+class SQLiteTokenStore:
+    """
+    File-backed token store that every worker process on the host shares, so a
+    refresh done by one worker is picked up by the others.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path=TOKEN_STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS tokens ("
+                "token_id TEXT PRIMARY KEY, access_token TEXT NOT NULL, "
+                "refresh_token TEXT, expires_at REAL, refresh_lease REAL, "
+                "updated_at REAL NOT NULL)"
+            )
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, token_id):
+        row = (
+            self._connection()
+            .execute(
+                "SELECT access_token, refresh_token, expires_at, refresh_lease "
+                "FROM tokens WHERE token_id = ?",
+                (token_id,),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        return dict(
+            zip(("access_token", "refresh_token", "expires_at", "refresh_lease"), row)
+        )
+
+    def put(self, token_id, access_token, refresh_token, expires_at):
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO tokens VALUES (?, ?, ?, ?, NULL, ?)",
+            (token_id, access_token, refresh_token, expires_at, now),
+        )
+        conn.execute(
+            "DELETE FROM tokens WHERE updated_at < ?", (now - TOKEN_STORE_TTL,)
+        )
+
+    def delete(self, token_id):
+        self._connection().execute("DELETE FROM tokens WHERE token_id = ?", (token_id,))
+
+    def claim(self, token_id, now, margin, lease):
+        cursor = self._connection().execute(
+            "UPDATE tokens SET refresh_lease = ? WHERE token_id = ? "
+            "AND refresh_token IS NOT NULL AND expires_at IS NOT NULL "
+            "AND expires_at - ? <= ? "
+            "AND (refresh_lease IS NULL OR refresh_lease <= ?)",
+            (now + lease, token_id, margin, now, now),
+        )
+        return cursor.rowcount == 1
+
+    def release(self, token_id):
+        self._connection().execute(
+            "UPDATE tokens SET refresh_lease = NULL WHERE token_id = ?", (token_id,)
+        )
+
+    def stats(self):
+        (tokens,) = self._connection().execute("SELECT COUNT(*) FROM tokens").fetchone()
+        return {"tokens": tokens}
+
+
+class RedisTokenStore:
+    """
+    Token store on a Redis-protocol server, shared by every worker on every host or
+    dyno. The refresh lease is a separate key taken with `SET NX PX`, so exactly one
+    worker holds it until it is released or its lease runs out.
+    """
+
+    name = "redis"
+
+    def __init__(self, url=REDIS_URL, client=None):
+        self.tokens = RedisBackend(url, prefix="token:", client=client)
+        self.client = self.tokens.client
+
+    @staticmethod
+    def _lease_key(token_id):
+        return f"token-lease:{token_id}"
+
+    def get(self, token_id):
+        value, lease = self.client.execute(
+            "MGET", f"token:{token_id}", self._lease_key(token_id)
+        )
+        if value is None:
+            return None
+        record = json.loads(value)
+        record["refresh_lease"] = float(lease) if lease is not None else None
+        return record
+
+    def put(self, token_id, access_token, refresh_token, expires_at):
+        record = {
+            "access_token": access_token,
+            "refresh_token": refresh_token,
+            "expires_at": expires_at,
+        }
+        # Logins that are not refreshed for TOKEN_STORE_TTL expire on the server.
+        self.tokens.set(token_id, json.dumps(record), TOKEN_STORE_TTL)
+        self.client.execute("DEL", self._lease_key(token_id))
+
+    def delete(self, token_id):
+        self.client.execute("DEL", f"token:{token_id}", self._lease_key(token_id))
+
+    def claim(self, token_id, now, margin, lease):
+        record = self.get(token_id)
+        if record is None or not _due(record, now, margin):
+            return False
+        taken = self.client.execute(
+            "SET",
+            self._lease_key(token_id),
+            str(now + lease),
+            "NX",
+            "PX",
+            max(int(lease * 1000), 1),
+        )
+        if taken is None:
+            return False
+        # Another worker may have finished its refresh between the read and the SET.
+        record = self.get(token_id)
+        if record is None or not _due(record, now, margin):
+            self.release(token_id)
+            return False
+        return True
+
+    def release(self, token_id):
+        self.client.execute("DEL", self._lease_key(token_id))
+
+    def stats(self):
+        return {"tokens": self.tokens.count()}
+
+
+class TokenManager:
+    """
+    Keeps Rememberizer OAuth tokens server-side, keyed on an opaque token id that is
+    all the session cookie holds, and refreshes access tokens `margin` seconds before
+    they expire. Concurrent refreshes of one login collapse into a single token
+    endpoint call: within a worker through a SingleFlight, across workers through a
+    lease in the store. Callers that lose the race keep using the current access
+    token while it is still valid, and only wait for the refresh once it has expired.
+    """
+
+    def __init__(
+        self,
+        store,
+        token_url=REMEMBERIZER_TOKEN_ENDPOINT,
+        client_id=REMEMBERIZER_CLIENT_ID,
+        client_secret=REMEMBERIZER_CLIENT_SECRET,
+        margin=TOKEN_REFRESH_MARGIN,
+        lease=TOKEN_REFRESH_LEASE,
+    ):
+        self.store = store
+        self.token_url = token_url
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.margin = margin
+        self.lease = lease
+        self._flight = SingleFlight()
+        self._counters = {"refreshes": 0, "refresh_failures": 0, "waits": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def save(self, tokens):
+        """
+        Store the tokens of a token endpoint response.
+        Returns: the token id to keep in the session
+        """
+        token_id = secrets.token_urlsafe(32)
+        self.store.put(
+            token_id,
+            tokens["access_token"],
+            tokens.get("refresh_token"),
+            expires_at(tokens),
+        )
+        return token_id
+
+    def forget(self, token_id):
+        self.store.delete(token_id)
+
+    def access_token(self, token_id):
+        """
+        Returns: a valid access token for the login, refreshing it first if it is
+        about to expire, or None when the login is unknown or cannot be refreshed
+        """
+        record = self.store.get(token_id)
+        if record is None:
+            return None
+        if not _due(record, time.time(), self.margin):
+            return record["access_token"]
+        return self._flight.do(token_id, "refresh", {}, lambda: self._refresh(token_id))
+
+    def stored_access_token(self, token_id):
+        """
+        Returns: the login's current access token as stored, without refreshing it,
+        or None when the login is unknown
+        """
+        record = self.store.get(token_id)
+        return record["access_token"] if record is not None else None
+
+    def _refresh(self, token_id):
+        if not self.store.claim(token_id, time.time(), self.margin, self.lease):
+            return self._await_refresh(token_id)
+        record = self.store.get(token_id)
+        if record is None:
+            return None
+        try:
+            response = http_pool.get_session().post(
+                self.token_url,
+                data={
+                    "grant_type": "refresh_token",
+                    "refresh_token": record["refresh_token"],
+                    "client_id": self.client_id,
+                    "client_secret": self.client_secret,
+                },
+            )
+            if response.status_code != 200:
+                raise Exception(
+                    f"[Token Manager Error] Refresh failed with status "
+                    f"{response.status_code}"
+                )
+            tokens = response.json()
+            self.store.put(
+                token_id,
+                tokens["access_token"],
+                tokens.get("refresh_token") or record["refresh_token"],
+                expires_at(tokens),
+            )
+        except Exception as ex:
+            logger.error(f"Token refresh failed: {ex}")
+            self._count("refresh_failures")
+            self.store.release(token_id)
+            # Retried on the next use while the current token is still valid.
+            if time.time() < record["expires_at"]:
+                return record["access_token"]
+            return None
+        self._count("refreshes")
+        logger.debug("Refreshed access token")
+        return tokens["access_token"]
+
+    def _await_refresh(self, token_id):
+        """
+        Another worker holds the refresh lease (or has just refreshed).
+        """
+        deadline = time.monotonic() + self.lease
+        waited = False
+        while True:
+            record = self.store.get(token_id)
+            if record is None:
+                return None
+            now = time.time()
+            if record["expires_at"] is None or now < record["expires_at"]:
+                return record["access_token"]
+            if (
+                record["refresh_lease"] is None
+                or record["refresh_lease"] <= now
+                or time.monotonic() >= deadline
+            ):
+                return None
+            if not waited:
+                waited = True
+                self._count("waits")
+            time.sleep(0.05)
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        return dict(self.store.stats(), backend=self.store.name, **counters)
+
+
+def create_token_manager(backend=TOKEN_STORE_BACKEND):
+    if backend == "sqlite":
+        return TokenManager(SQLiteTokenStore())
+    if backend == "memory":
+        return TokenManager(MemoryTokenStore())
+    if backend == "redis":
+        return TokenManager(RedisTokenStore())
+    if backend == "none":
+        return None
+    raise Exception(f"[Token Manager Error] Backend not supported: {backend}")
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_token_manager():
+    """
+    Return the process-wide token manager, or None when TOKEN_STORE_BACKEND=none
+    (tokens then stay in the session cookie and are never refreshed).
+    """
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = create_token_manager()
+    return _manager
@@ -0,0 +1,416 @@
+import contextvars
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+
+import http_pool
+
+logger = logging.getLogger(__name__)
+
+TRACING_ENABLED = os.environ.get("TRACING_ENABLED", "true").lower() == "true"
+# Standard OpenTelemetry variables; spans are exported as OTLP/HTTP JSON when set.
+OTEL_EXPORTER_OTLP_ENDPOINT = os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT")
+OTEL_SERVICE_NAME = os.environ.get("OTEL_SERVICE_NAME", "talk-to-slack")
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Numeric span attributes that are also summed per stage on /metrics.
+SUMMED_ATTRIBUTES = (
+    "payload_bytes",
+    "prompt_tokens",
+    "completion_tokens",
+    "cached_tokens",
+    "speculation_saved_ms",
+)
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    __slots__ = (
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "start",
+        "end",
+        "start_ns",
+        "attributes",
+        "error",
+        "stages",
+    )
+
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.start = time.perf_counter()
+        self.start_ns = time.time_ns()
+        self.end = None
+        self.attributes = dict(attributes or {})
+        self.error = None
+        self.stages = []
+
+    @property
+    def duration(self):
+        return (self.end or time.perf_counter()) - self.start
+
+    def set(self, key, value):
+        if value is not None:
+            self.attributes[key] = value
+
+    def fail(self, ex):
+        self.error = f"{type(ex).__name__}: {ex}"
+
+    def set_usage(self, usage):
+        """
+        Record the token counts of an OpenAI completion `usage` object.
+        """
+        for key in ("prompt_tokens", "completion_tokens"):
+            value = getattr(usage, key, None)
+            if isinstance(value, int):
+                self.attributes[key] = value
+        self.set("cached_tokens", cached_tokens(usage))
+        _usage_meter.record(self.name, usage)
+
+
+class _NoopSpan:
+    def __init__(self, name):
+        self.name = name
+
+    def set(self, key, value):
+        pass
+
+    def fail(self, ex):
+        pass
+
+    def set_usage(self, usage):
+        _usage_meter.record(self.name, usage)
+
+
+def cached_tokens(usage):
+    """
+    Returns: the prompt tokens served from the provider's prompt cache, or None
+    when the response does not report them
+    """
+    details = getattr(usage, "prompt_tokens_details", None)
+    if isinstance(details, dict):
+        value = details.get("cached_tokens")
+    else:
+        value = getattr(details, "cached_tokens", None)
+    return value if isinstance(value, int) else None
+
+
+class UsageMeter:
+    """
+    Token usage of OpenAI completions per stage, and the share of prompt tokens
+    the provider served from its prompt cache. Kept even when tracing is disabled.
+    """
+
+    def __init__(self):
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, usage):
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        completion_tokens = getattr(usage, "completion_tokens", None)
+        if not isinstance(prompt_tokens, int):
+            return
+        with self._lock:
+            totals = self._stages.setdefault(
+                stage,
+                {
+                    "requests": 0,
+                    "prompt_tokens": 0,
+                    "completion_tokens": 0,
+                    "cached_tokens": 0,
+                    "cache_hits": 0,
+                },
+            )
+            cached = cached_tokens(usage) or 0
+            totals["requests"] += 1
+            totals["prompt_tokens"] += prompt_tokens
+            if isinstance(completion_tokens, int):
+                totals["completion_tokens"] += completion_tokens
+            totals["cached_tokens"] += cached
+            totals["cache_hits"] += cached > 0
+
+    def stats(self):
+        with self._lock:
+            stages = {name: dict(totals) for name, totals in self._stages.items()}
+        for totals in stages.values():
+            totals["cached_rate"] = (
+                totals["cached_tokens"] / totals["prompt_tokens"]
+                if totals["prompt_tokens"]
+                else 0.0
+            )
+        return stages
+
+
+_usage_meter = UsageMeter()
+
+
+def get_usage_meter():
+    return _usage_meter
+
+
+class StageMetrics:
+    """
+    Per-stage duration histograms, error counts and attribute sums, rendered in the
+    Prometheus text exposition format.
+    """
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, span):
+        with self._lock:
+            stage = self._stages.setdefault(
+                span.name,
+                {
+                    "buckets": [0] * len(self.buckets),
+                    "count": 0,
+                    "sum": 0.0,
+                    "errors": 0,
+                    "totals": {},
+                },
+            )
+            for i, bound in enumerate(self.buckets):
+                if span.duration <= bound:
+                    stage["buckets"][i] += 1
+            stage["count"] += 1
+            stage["sum"] += span.duration
+            stage["errors"] += span.error is not None
+            for key in SUMMED_ATTRIBUTES:
+                value = span.attributes.get(key)
+                if isinstance(value, (int, float)):
+                    stage["totals"][key] = stage["totals"].get(key, 0) + value
+
+    def render(self):
+        lines = [
+            "# HELP ask_stage_duration_seconds Duration of each ask pipeline stage.",
+            "# TYPE ask_stage_duration_seconds histogram",
+        ]
+        with self._lock:
+            stages = {name: dict(stage) for name, stage in self._stages.items()}
+        for name, stage in sorted(stages.items()):
+            for bound, count in zip(self.buckets, stage["buckets"]):
+                lines.append(
+                    f'ask_stage_duration_seconds_bucket{{stage="{name}",le="{bound}"}} '
+                    f"{count}"
+                )
+            lines.append(
+                f'ask_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} '
+                f'{stage["count"]}'
+            )
+            lines.append(
+                f'ask_stage_duration_seconds_sum{{stage="{name}"}} {stage["sum"]:.6f}'
+            )
+            lines.append(
+                f'ask_stage_duration_seconds_count{{stage="{name}"}} {stage["count"]}'
+            )
+        lines += [
+            "# HELP ask_stage_errors_total Ask pipeline stages that raised.",
+            "# TYPE ask_stage_errors_total counter",
+        ]
+        lines += [
+            f'ask_stage_errors_total{{stage="{name}"}} {stage["errors"]}'
+            for name, stage in sorted(stages.items())
+        ]
+        for key in SUMMED_ATTRIBUTES:
+            lines += [
+                f"# HELP ask_stage_{key}_total Sum of {key} per ask pipeline stage.",
+                f"# TYPE ask_stage_{key}_total counter",
+            ]
+            lines += [
+                f'ask_stage_{key}_total{{stage="{name}"}} {stage["totals"][key]}'
+                for name, stage in sorted(stages.items())
+                if key in stage["totals"]
+            ]
+        return "\n".join(lines) + "\n"
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(spans, service_name=OTEL_SERVICE_NAME):
+    """
+    Returns: an OTLP/HTTP JSON `ExportTraceServiceRequest` body for the spans
+    """
+    otlp_spans = []
+    for span in spans:
+        otlp_span = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.start_ns + int(span.duration * 1e9)),
+            "attributes": [
+                {"key": key, "value": _otlp_value(value)}
+                for key, value in span.attributes.items()
+            ],
+            "status": (
+                {"code": 2, "message": span.error} if span.error else {"code": 1}
+            ),
+        }
+        if span.parent_id:
+            otlp_span["parentSpanId"] = span.parent_id
+        otlp_spans.append(otlp_span)
+    return {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": [
+                        {"key": "service.name", "value": {"stringValue": service_name}}
+                    ]
+                },
+                "scopeSpans": [{"scope": {"name": "tracing"}, "spans": otlp_spans}],
+            }
+        ]
+    }
+
+
+class OTLPExporter:
+    """
+    Batches finished spans and posts them to an OpenTelemetry collector
+    (`<endpoint>/v1/traces`) from a background thread. Spans are dropped rather
+    than blocking requests when the queue is full.
+    """
+
+    def __init__(self, endpoint, batch_size=512, interval=5.0, max_queue=4096):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.batch_size = batch_size
+        self.interval = interval
+        self.dropped = 0
+        self.exported = 0
+        self._queue = queue.Queue(max_queue)
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def export(self, span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(
+                        self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                    )
+                except queue.Empty:
+                    break
+            self.flush(batch)
+
+    def flush(self, spans):
+        try:
+            response = http_pool.get_session().post(self.url, json=to_otlp(spans))
+            response.raise_for_status()
+            self.exported += len(spans)
+        except Exception as ex:
+            self.dropped += len(spans)
+            logger.error(f"Trace export failed: {ex}")
+
+
+class Tracer:
+    """
+    Records nested spans. The current span is tracked in a context variable, so
+    spans opened in asyncio tasks, or in threads started with
+    `contextvars.copy_context().run`, become children of the caller's span.
+    """
+
+    def __init__(self, metrics=None, exporter=None):
+        self.metrics = metrics or StageMetrics()
+        self.exporter = exporter
+
+    @contextmanager
+    def span(self, name, **attributes):
+        parent = _current_span.get()
+        span = Span(name, parent, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except Exception as ex:
+            span.fail(ex)
+            raise
+        finally:
+            span.end = time.perf_counter()
+            _current_span.reset(token)
+            self._finish(span, parent)
+
+    def _finish(self, span, parent):
+        self.metrics.record(span)
+        if self.exporter is not None:
+            self.exporter.export(span)
+        if parent is not None:
+            parent.stages.append((span.name, span.duration))
+        elif span.stages:
+            stages = ", ".join(
+                f"{name}={duration:.3f}s" for name, duration in span.stages
+            )
+            logger.debug(
+                f"Trace {span.trace_id} {span.name} {span.duration:.3f}s: {stages}"
+            )
+
+    def stats(self):
+        return {
+            "exporter": self.exporter.url if self.exporter else None,
+            "exported": self.exporter.exported if self.exporter else 0,
+            "dropped": self.exporter.dropped if self.exporter else 0,
+        }
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer():
+    """
+    Return the process-wide tracer, or None when TRACING_ENABLED=false.
+    """
+    global _tracer
+    if not TRACING_ENABLED:
+        return None
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                exporter = None
+                if OTEL_EXPORTER_OTLP_ENDPOINT:
+                    exporter = OTLPExporter(OTEL_EXPORTER_OTLP_ENDPOINT)
+                _tracer = Tracer(exporter=exporter)
+    return _tracer
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Time a stage with the process-wide tracer; a no-op when tracing is disabled.
+    """
+    tracer = get_tracer()
+    if tracer is None:
+        yield _NoopSpan(name)
+        return
+    with tracer.span(name, **attributes) as current:
+        yield current
+
+
+def render_metrics():
+    tracer = get_tracer()
+    return tracer.metrics.render() if tracer else ""